@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from evaluation import MaskStack, MaskStackWriter, evaluate_stacks  # noqa: E402
+from mask_stats import MaskStats  # noqa: E402
+from metrics import MetricsLogger  # noqa: E402
+
+
+def synthetic_masks(frames: int, width: int, height: int, seed: int = 0):
+    """Drifting ellipses for predictions and ground truth, some GT frames empty."""
+    rng = np.random.default_rng(seed)
+    for idx in range(frames):
+        gt = np.zeros((height, width), np.uint8)
+        pred = np.zeros_like(gt)
+        cx, cy = int(width * 0.2 + idx % (width // 2)), height // 2
+        if idx % 17:
+            cv2.ellipse(gt, (cx, cy), (60, 40), 0, 0, 360, 255, -1)
+        jitter = rng.integers(-6, 7, size=2)
+        cv2.ellipse(pred, (cx + int(jitter[0]), cy + int(jitter[1])), (58, 42), 0, 0, 360, 255, -1)
+        yield idx, pred, gt, (cx + int(jitter[0]), cy + int(jitter[1]))
+
+
+def per_frame(frames, width, height):
+    """The logger's per-frame path: IoU on full masks plus cv2.moments on GT."""
+    ious, errors = [], []
+    for _, pred, gt, position in synthetic_masks(frames, width, height):
+        ious.append(MetricsLogger._compute_iou(pred, gt))
+        gt_pos = MaskStats(gt).centroid_int
+        errors.append(
+            np.nan
+            if gt_pos is None
+            else float(np.linalg.norm([position[0] - gt_pos[0], position[1] - gt_pos[1]]))
+        )
+    return np.asarray(ious), np.asarray(errors)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch vs per-frame mask evaluation")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--chunk", type=int, default=64)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reference_iou, reference_error = per_frame(args.frames, args.width, args.height)
+    per_frame_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = {}
+        for packed in (True, False):
+            label = "packed" if packed else "raw"
+            pred_path = os.path.join(workdir, f"pred_{label}.npy")
+            gt_path = os.path.join(workdir, f"gt_{label}.npy")
+            positions = []
+            with MaskStackWriter(pred_path, packed) as preds, MaskStackWriter(gt_path, packed) as gts:
+                for idx, pred, gt, position in synthetic_masks(args.frames, args.width, args.height):
+                    preds.append(idx, pred)
+                    gts.append(idx, gt)
+                    positions.append(position)
+            paths[label] = (pred_path, gt_path, np.asarray(positions))
+
+        print(
+            f"{args.frames} frames at {args.width}x{args.height}: "
+            f"per-frame IoU + centroid {per_frame_seconds:.2f}s"
+        )
+        for label, (pred_path, gt_path, positions) in paths.items():
+            size = os.path.getsize(pred_path) + os.path.getsize(gt_path)
+            start = time.perf_counter()
+            evaluate_stacks(
+                MaskStack.open(pred_path),
+                MaskStack.open(gt_path),
+                positions,
+                args.chunk,
+                boundary=False,
+            )
+            core_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            result = evaluate_stacks(
+                MaskStack.open(pred_path), MaskStack.open(gt_path), positions, args.chunk
+            )
+            seconds = time.perf_counter() - start
+            iou_match = np.array_equal(result["iou"], reference_iou)
+            error_match = np.array_equal(
+                np.isnan(result["centroid_error"]), np.isnan(reference_error)
+            ) and np.array_equal(
+                result["centroid_error"][~np.isnan(reference_error)],
+                reference_error[~np.isnan(reference_error)],
+            )
+            print(
+                f"  batch {label:<6} IoU + centroid {core_seconds:.2f}s, "
+                f"with boundary F {seconds:.2f}s  "
+                f"stacks {size / 2**20:.1f} MiB  "
+                f"IoU identical: {iou_match}  centroid error identical: {error_match}  "
+                f"mean boundary F {np.mean(result['boundary_f']):.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from memory_manager import MemoryManager  # noqa: E402
+
+
+def reference_best_slot(manager: MemoryManager, point) -> int:
+    """The original per-entry Python loop, kept for timing and equivalence."""
+    best_slot, best_score = -1, -np.inf
+    px, py = float(point[0]), float(point[1])
+    for slot in manager._order:
+        cx, cy = manager.centroids[slot]
+        distance = np.linalg.norm([px - cx, py - cy])
+        score = manager.qualities[slot] - 0.002 * distance
+        if score > best_score:
+            best_score, best_slot = score, slot
+    return best_slot
+
+
+def fill(manager: MemoryManager, count: int, canvas: int, rng: np.random.Generator) -> None:
+    mask = np.zeros((canvas, canvas), np.uint8)
+    for idx in range(count):
+        mask[:] = 0
+        center = (int(rng.integers(8, canvas - 8)), int(rng.integers(8, canvas - 8)))
+        cv2.circle(mask, center, int(rng.integers(3, 8)), 255, -1)
+        manager.store(idx, mask, float(rng.uniform(0.3, 1.0)))
+
+
+def time_queries(fn, points: np.ndarray) -> float:
+    start = time.perf_counter()
+    for point in points:
+        fn(point)
+    return (time.perf_counter() - start) / len(points)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MemoryManager.retrieve scoring microbenchmark")
+    parser.add_argument(
+        "--capacities",
+        type=int,
+        nargs="+",
+        default=[25, 1000, 100000],
+        help="Buffer capacities to benchmark (buffer is filled to capacity)",
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Lookups per capacity")
+    parser.add_argument("--canvas", type=int, default=512, help="Square mask size in pixels")
+    parser.add_argument("--cell-size", type=float, default=16.0, help="Grid index cell size")
+    args = parser.parse_args()
+
+    rows: List[Dict[str, float]] = []
+    for capacity in args.capacities:
+        rng = np.random.default_rng(capacity)
+        flat = MemoryManager(capacity=capacity)
+        grid = MemoryManager(capacity=capacity, spatial_index="grid", cell_size=args.cell_size)
+        fill(flat, capacity, args.canvas, np.random.default_rng(capacity))
+        fill(grid, capacity, args.canvas, np.random.default_rng(capacity))
+        points = rng.uniform(0, args.canvas, size=(args.queries, 2))
+        for point in points:
+            expected = reference_best_slot(flat, point)
+            if flat._best_slot(*point) != expected or grid._best_slot_grid(*point) != expected:
+                raise AssertionError(f"retrieve mismatch at capacity {capacity}, point {point}")
+        loop_queries = points[: max(1, min(len(points), 2_000_000 // capacity))]
+        rows.append(
+            {
+                "capacity": capacity,
+                "loop_us": time_queries(lambda p: reference_best_slot(flat, p), loop_queries) * 1e6,
+                "vector_us": time_queries(lambda p: flat._best_slot(*p), points) * 1e6,
+                "grid_us": time_queries(lambda p: grid._best_slot_grid(*p), points) * 1e6,
+            }
+        )
+    print(f"{'capacity':>9} {'loop us':>10} {'vector us':>10} {'grid us':>10}")
+    for row in rows:
+        print(
+            f"{row['capacity']:>9} {row['loop_us']:>10.1f} "
+            f"{row['vector_us']:>10.1f} {row['grid_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from occlusion_handler import MultiObjectTracker  # noqa: E402
+
+
+def synthetic_tracks(num_objects: int, num_frames: int, seed: int = 0) -> np.ndarray:
+    """Noisy constant-velocity centroids, shape (frames, objects, 2)."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 1920, size=(num_objects, 2))
+    # Space objects apart vertically so the gate never confuses neighbours
+    start[:, 1] = np.arange(num_objects) * 120.0
+    velocity = rng.uniform(-4, 4, size=(num_objects, 2))
+    steps = np.arange(num_frames, dtype=np.float64)[:, None, None]
+    noise = rng.normal(0, 0.5, size=(num_frames, num_objects, 2))
+    return start[None] + steps * velocity[None] + noise
+
+
+def _make_cv2_filter() -> cv2.KalmanFilter:
+    kf = cv2.KalmanFilter(4, 2)
+    kf.measurementMatrix = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], np.float32)
+    kf.transitionMatrix = np.array(
+        [[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], np.float32
+    )
+    kf.processNoiseCov = np.eye(4, dtype=np.float32) * 0.03
+    return kf
+
+
+def bench_separate(tracks: np.ndarray) -> float:
+    """Seconds per frame for one cv2.KalmanFilter per object (ids known)."""
+    filters = [_make_cv2_filter() for _ in range(tracks.shape[1])]
+    start = time.perf_counter()
+    for frame in tracks:
+        for kf, (x, y) in zip(filters, frame):
+            kf.predict()
+            kf.correct(np.array([[np.float32(x)], [np.float32(y)]]))
+    return (time.perf_counter() - start) / len(tracks)
+
+
+def bench_batched(tracks: np.ndarray, assignment: str) -> float:
+    """Seconds per frame for MultiObjectTracker including association."""
+    tracker = MultiObjectTracker(max_tracks=tracks.shape[1], assignment=assignment)
+    tracker.update(tracks[0])
+    start = time.perf_counter()
+    for frame in tracks[1:]:
+        tracker.update(frame)
+    return (time.perf_counter() - start) / (len(tracks) - 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Per-frame cost of batched vs per-object Kalman tracking"
+    )
+    parser.add_argument(
+        "--num-objects",
+        type=int,
+        nargs="+",
+        default=[1, 10, 50, 100, 200],
+        help="Object counts to benchmark",
+    )
+    parser.add_argument("--frames", type=int, default=200, help="Frames per run")
+    parser.add_argument(
+        "--assignment",
+        default="greedy",
+        choices=["greedy", "hungarian"],
+        help="Association strategy for MultiObjectTracker",
+    )
+    args = parser.parse_args()
+
+    rows: List[Dict[str, float]] = []
+    for count in args.num_objects:
+        tracks = synthetic_tracks(count, args.frames)
+        rows.append(
+            {
+                "objects": count,
+                "separate_ms": bench_separate(tracks) * 1e3,
+                "batched_ms": bench_batched(tracks, args.assignment) * 1e3,
+            }
+        )
+    print(f"{'objects':>8} {'separate ms':>12} {'batched ms':>11} {'speedup':>8}")
+    for row in rows:
+        print(
+            f"{row['objects']:>8} {row['separate_ms']:>12.3f} "
+            f"{row['batched_ms']:>11.3f} {row['separate_ms'] / row['batched_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from memory_manager import MemoryManager  # noqa: E402
+from metrics import MetricsLogger  # noqa: E402
+from occlusion_handler import KalmanTracker  # noqa: E402
+from pipeline import _track_frame  # noqa: E402
+from quality_controller import QualityController  # noqa: E402
+from renderer import OverlayRenderer  # noqa: E402
+from sam2_model import SAM2Predictor  # noqa: E402
+
+
+def synthetic_clip(frames: int, width: int, height: int, radius: int):
+    """A green disc crossing a dark frame, hidden for the middle fifth; yields (frame, gt)."""
+    background = np.full((height, width, 3), 30, dtype=np.uint8)
+    for idx in range(frames):
+        frame = background.copy()
+        cx = int(radius * 2 + (width - radius * 4) * idx / max(frames - 1, 1))
+        cy = int(height / 2 + height / 6 * np.sin(idx / 15.0))
+        gt = np.zeros((height, width), np.uint8)
+        cv2.circle(gt, (cx, cy), radius, 255, -1)
+        if not 2 * frames // 5 < idx < 3 * frames // 5:
+            cv2.circle(frame, (cx, cy), radius, (0, 255, 0), -1)
+        yield frame, gt
+
+
+def run(clip, packed: bool, measure_memory: bool = False):
+    """Predict, track, log and render every frame; per-stage seconds and allocated bytes."""
+    predictor = SAM2Predictor(packed=packed, verbose=False)
+    components = dict(
+        quality_controller=QualityController(),
+        tracker=KalmanTracker(packed=packed),
+        memory_manager=MemoryManager(capacity=25),
+        metrics_logger=MetricsLogger(),
+    )
+    renderer = OverlayRenderer()
+    seconds = {"predict": 0.0, "track": 0.0, "render": 0.0}
+    peak_bytes = []
+    if measure_memory:
+        tracemalloc.start()
+    for idx, (frame, gt) in enumerate(clip):
+        frame = frame.copy()
+        if measure_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        prediction = predictor.predict(frame, idx)
+        predicted = time.perf_counter()
+        _, _, mask, position, status, quality = _track_frame(
+            frame, idx, gt, predictor, prediction=prediction, **components
+        )
+        tracked = time.perf_counter()
+        renderer.render(frame, idx, mask, position, status, quality)
+        rendered = time.perf_counter()
+        if measure_memory:
+            peak_bytes.append(tracemalloc.get_traced_memory()[1] - base)
+        seconds["predict"] += predicted - start
+        seconds["track"] += tracked - predicted
+        seconds["render"] += rendered - tracked
+    if measure_memory:
+        tracemalloc.stop()
+    payload = prediction[0][0].nbytes
+    memory = components["memory_manager"].footprint()
+    return seconds, peak_bytes, payload, memory, components["metrics_logger"].records
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bit-packed vs dense masks through the tracking loop")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--radius", type=int, default=80)
+    args = parser.parse_args()
+
+    clip = list(synthetic_clip(args.frames, args.width, args.height, args.radius))
+    print(f"{args.frames} frames at {args.width}x{args.height}, radius {args.radius}px (mock predictor)")
+    results = {}
+    for label, packed in (("dense", False), ("packed", True)):
+        seconds, _, payload, memory, records = run(clip, packed)
+        _, peak_bytes, _, _, _ = run(clip, packed, measure_memory=True)
+        results[label] = records
+        per_frame = {stage: value / args.frames * 1000 for stage, value in seconds.items()}
+        total = sum(per_frame.values())
+        print(
+            f"  {label:<6}: {total:6.2f} ms/frame (predict {per_frame['predict']:.2f}, "
+            f"track+quality+memory+IoU {per_frame['track']:.2f}, render {per_frame['render']:.2f}); "
+            f"mask {payload / 1024:7.1f} KiB, memory bank {memory['stored_bytes'] / 1024:7.1f} KiB, "
+            f"peak allocation {np.mean(peak_bytes) / 2**20:6.2f} MiB/frame"
+        )
+    identical = all(
+        (a.status, a.iou, a.centroid_error, a.quality, a.threshold)
+        == (b.status, b.iou, b.centroid_error, b.quality, b.threshold)
+        for a, b in zip(results["dense"], results["packed"])
+    )
+    print(f"  identical metrics: {identical}")
+
+
+if __name__ == "__main__":
+    main()
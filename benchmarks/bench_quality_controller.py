@@ -0,0 +1,165 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from mask_stats import MaskStats  # noqa: E402
+from quality_controller import MultiQualityController, QualityController  # noqa: E402
+
+# Running sums may differ from np.mean in the last bits; decisions must not
+TOLERANCE = 1e-12
+
+
+class WindowedReference:
+    """The previous controller: recomputes ``np.mean`` (or a quantile) over the deques."""
+
+    def __init__(self, window_size=15, min_samples=5, robust=False, quantile=0.5):
+        self.scores = deque(maxlen=window_size)
+        self.areas = deque(maxlen=window_size)
+        self.min_samples = min_samples
+        self.robust = robust
+        self.quantile = quantile
+
+    def evaluate(self, mask, score, stats=None):
+        stats = MaskStats.of(mask, stats)
+        norm_area = float(stats.area) / float(stats.size)
+        self.scores.append(score)
+        self.areas.append(norm_area)
+        if len(self.scores) < self.min_samples:
+            threshold = 0.35
+        else:
+            if self.robust:
+                avg_score = float(np.quantile(self.scores, self.quantile))
+                avg_area = float(np.quantile(self.areas, self.quantile))
+            else:
+                avg_score = float(np.mean(self.scores))
+                avg_area = float(np.mean(self.areas))
+            threshold = max(0.35, min(0.85, 0.5 * avg_score + 0.4 * avg_area))
+        quality = 0.6 * score + 0.4 * norm_area
+        return {"is_reliable": quality >= threshold, "quality": quality, "threshold": threshold}
+
+
+def synthetic_stream(frames: int, tracks: int, size: int, seed: int = 0):
+    """Per-track scores with occasional outliers, and masks of drifting area."""
+    rng = np.random.default_rng(seed)
+    scores = np.clip(rng.normal(0.8, 0.08, size=(frames, tracks)), 0, 1)
+    outliers = rng.random((frames, tracks)) < 0.05
+    scores[outliers] = rng.uniform(0, 0.2, size=outliers.sum())
+    fill = (0.2 + 0.15 * np.sin(np.arange(frames) / 20.0))[:, None] + rng.normal(0, 0.02, (frames, tracks))
+    pixels = np.clip((fill * size * size).astype(int), 0, size * size)
+    masks = np.zeros((frames, tracks, size * size), np.uint8)
+    for idx in range(frames):
+        for track in range(tracks):
+            masks[idx, track, : pixels[idx, track]] = 1
+    return scores, masks.reshape(frames, tracks, size, size)
+
+
+def run_single(controller_cls, scores, masks, **kwargs):
+    """Feed track 0 through one controller; returns thresholds, decisions and seconds."""
+    controller = controller_cls(**kwargs)
+    stats = [MaskStats(mask) for mask in masks[:, 0]]
+    for stat in stats:
+        stat.area  # precompute so only the controller is timed
+    thresholds, reliable = [], []
+    start = time.perf_counter()
+    for idx in range(len(scores)):
+        info = controller.evaluate(masks[idx, 0], float(scores[idx, 0]), stats=stats[idx])
+        thresholds.append(info["threshold"])
+        reliable.append(info["is_reliable"])
+    return np.asarray(thresholds), np.asarray(reliable), time.perf_counter() - start
+
+
+def check_bank(scores, masks, window: int, robust: bool, tracks: int) -> tuple:
+    """``evaluate_many`` vs one ``WindowedReference`` per track on the first ``tracks`` rows."""
+    bank = MultiQualityController(tracks, window_size=window, robust=robust)
+    references = [WindowedReference(window_size=window, robust=robust) for _ in range(tracks)]
+    worst, identical = 0.0, True
+    for idx in range(len(scores)):
+        result = bank.evaluate_many(masks[idx, :tracks], scores[idx, :tracks])
+        for track, reference in enumerate(references):
+            info = reference.evaluate(masks[idx, track], float(scores[idx, track]))
+            worst = max(worst, abs(info["threshold"] - result["threshold"][track]))
+            identical &= bool(info["is_reliable"] == result["is_reliable"][track])
+    return worst, identical
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Running-sum vs windowed quality controller; exits 1 if they disagree"
+    )
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--tracks", type=int, default=64)
+    parser.add_argument("--mask-size", type=int, default=32)
+    parser.add_argument("--windows", type=int, nargs="+", default=[15, 300, 1000])
+    parser.add_argument(
+        "--check-tracks", type=int, default=8, help="Bank rows compared against the reference"
+    )
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    scores, masks = synthetic_stream(args.frames, args.tracks, args.mask_size)
+    print(f"{args.frames} frames, {args.tracks} tracks, {args.mask_size}x{args.mask_size} masks")
+    failures = []
+
+    def check(name: str, max_delta: float, identical: bool) -> None:
+        if max_delta > args.tolerance or not identical:
+            failures.append(f"{name}: max |dthreshold| {max_delta:.1e}, decisions identical {identical}")
+
+    for window in args.windows:
+        for robust in (False, True):
+            kwargs = dict(window_size=window, min_samples=5, robust=robust)
+            ref_thr, ref_rel, ref_s = run_single(WindowedReference, scores, masks, **kwargs)
+            new_thr, new_rel, new_s = run_single(QualityController, scores, masks, **kwargs)
+            label = "median" if robust else "mean"
+            max_delta = float(np.max(np.abs(ref_thr - new_thr)))
+            identical = bool(np.array_equal(ref_rel, new_rel))
+            check(f"QualityController window {window} {label}", max_delta, identical)
+            print(
+                f"  window {window:>5} {label:<6}: windowed {ref_s / args.frames * 1e6:6.1f} us/frame, "
+                f"running {new_s / args.frames * 1e6:6.1f} us/frame ({ref_s / new_s:.1f}x)  "
+                f"max |dthreshold| {max_delta:.1e}  decisions identical: {identical}"
+            )
+            max_delta, identical = check_bank(scores, masks, window, robust, args.check_tracks)
+            check(f"evaluate_many window {window} {label}", max_delta, identical)
+
+        # One vectorized call per frame vs one controller per track
+        controllers = [QualityController(window_size=window) for _ in range(args.tracks)]
+        bank = MultiQualityController(args.tracks, window_size=window)
+        per_track = np.zeros((args.frames, args.tracks))
+        batched = np.zeros_like(per_track)
+        start = time.perf_counter()
+        for idx in range(args.frames):
+            for track, controller in enumerate(controllers):
+                per_track[idx, track] = controller.evaluate(
+                    masks[idx, track], float(scores[idx, track])
+                )["threshold"]
+        loop_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for idx in range(args.frames):
+            batched[idx] = bank.evaluate_many(masks[idx], scores[idx])["threshold"]
+        bank_seconds = time.perf_counter() - start
+        # The bank follows QualityController's operation order, so it must match bit for bit
+        identical = bool(np.array_equal(per_track, batched))
+        check(f"evaluate_many vs QualityController window {window}", 0.0, identical)
+        print(
+            f"  window {window:>5} {args.tracks} tracks: per-track loop "
+            f"{loop_seconds / args.frames * 1e3:.2f} ms/frame, evaluate_many "
+            f"{bank_seconds / args.frames * 1e3:.2f} ms/frame ({loop_seconds / bank_seconds:.1f}x)  "
+            f"identical: {identical}"
+        )
+
+    if failures:
+        print("Equivalence FAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Equivalence checks passed (mean, robust, evaluate_many vs windowed reference)")
+
+
+if __name__ == "__main__":
+    main()
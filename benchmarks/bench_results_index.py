@@ -0,0 +1,108 @@
+import argparse
+import csv
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from results_index import ResultsIndex  # noqa: E402
+from summarize_metrics import summarize  # noqa: E402
+
+FIELDS = ("frame_idx", "status", "quality", "threshold", "norm_area", "iou", "centroid_error")
+
+
+def synthetic_runs(root: str, runs: int, frames: int, seed: int = 0) -> None:
+    """``runs`` run directories over 4 videos x 8 configs, each with one or two occlusions."""
+    rng = np.random.default_rng(seed)
+    for run in range(runs):
+        metrics_dir = os.path.join(root, f"run_{run:05d}", "metrics")
+        os.makedirs(metrics_dir)
+        with open(os.path.join(metrics_dir, "run_config.json"), "w", encoding="utf-8") as handle:
+            json.dump({"video": f"video_{run % 4}.mp4", "config": f"config_{run % 8}"}, handle)
+        occluded = np.zeros(frames, bool)
+        for _ in range(rng.integers(1, 3)):
+            start = int(rng.integers(0, frames - 30))
+            occluded[start : start + int(rng.integers(5, 30))] = True
+        iou = np.where(occluded, rng.uniform(0, 0.3, frames), rng.uniform(0.3, 1.0, frames))
+        with open(os.path.join(metrics_dir, "run_metrics.csv"), "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(FIELDS)
+            for idx in range(frames):
+                writer.writerow(
+                    (
+                        idx,
+                        "Occluded (KF Prediction)" if occluded[idx] else "Tracking",
+                        rng.uniform(0.3, 0.9),
+                        rng.uniform(0.35, 0.6),
+                        rng.uniform(0.01, 0.05),
+                        iou[idx],
+                        rng.uniform(0, 5),
+                    )
+                )
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Results index vs re-parsing every run CSV")
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_results_index_")
+    try:
+        synthetic_runs(root, args.runs, args.frames)
+        run_dirs = sorted(os.path.join(root, name) for name in os.listdir(root))
+        print(f"{args.runs} runs x {args.frames} frames")
+
+        summaries, parse_seconds = timed(lambda: [summarize(run, rescan=True) for run in run_dirs])
+        print(f"  re-parse every CSV (DictReader): {parse_seconds * 1000:9.1f} ms")
+
+        with ResultsIndex(os.path.join(root, "results.db")) as index:
+            counts, first = timed(index.ingest, [root])
+            print(f"  index, first ingest:             {first * 1000:9.1f} ms  {counts}")
+            counts, again = timed(index.ingest, [root])
+            print(f"  index, nothing changed:          {again * 1000:9.1f} ms  {counts}")
+            os.utime(os.path.join(run_dirs[0], "metrics", "run_metrics.csv"))
+            with open(os.path.join(run_dirs[1], "metrics", "run_metrics.csv"), "a") as handle:
+                handle.write(f"{args.frames},Tracking,0.8,0.5,0.02,0.9,1.0\n")
+            counts, changed = timed(index.ingest, [root])
+            print(f"  index, 1 touched + 1 appended:   {changed * 1000:9.1f} ms  {counts}")
+
+            queries = {
+                "group by tag": lambda: index.groups("tag"),
+                "group by video": lambda: index.groups("video"),
+                "group by config": lambda: index.groups("config"),
+                "config x frames 100:199": lambda: index.groups("config", frames=(100, 199)),
+                "video=video_1 by config": lambda: index.groups("config", {"video": "video_1.mp4"}),
+                "IoU p50/p95 by video": lambda: index.percentiles("iou", "video", (50, 95)),
+                "recovery by config": lambda: index.recovery("config"),
+            }
+            for name, query in queries.items():
+                _, seconds = timed(query)
+                print(f"  query {name + ':':<29} {seconds * 1000:9.1f} ms")
+
+            by_tag = {row["tag"]: row for row in index.groups("tag")}
+            worst = max(
+                abs(by_tag[os.path.basename(run)]["mean_iou"] - summary["mean_iou"])
+                for run, summary in zip(run_dirs[2:], summaries[2:])
+            )
+            print(f"  max |mean IoU difference| vs re-parse: {worst:.1e}")
+            assert math.isfinite(worst)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
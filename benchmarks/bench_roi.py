@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from occlusion_handler import KalmanTracker  # noqa: E402
+from pipeline import _evaluate_quality  # noqa: E402
+from prediction_cache import CachedPredictor  # noqa: E402
+from roi import RoiPredictor  # noqa: E402
+from sam2_model import SAM2Predictor  # noqa: E402
+
+
+def synthetic_frames(frames: int, width: int, height: int, radius: int):
+    """A small green disc on grey noise, drifting along a slow sine."""
+    rng = np.random.default_rng(0)
+    background = rng.integers(20, 40, size=(height, width, 1), dtype=np.uint8).repeat(3, axis=2)
+    for idx in range(frames):
+        frame = background.copy()
+        cx = int(radius * 2 + (idx * 7) % (width - radius * 4))
+        cy = int(height / 2 + height / 4 * np.sin(idx / 25.0))
+        cv2.circle(frame, (cx, cy), radius, (0, 255, 0), -1)
+        yield frame, idx
+
+
+def run(predictor, tracker, frames):
+    """Predict + track every frame; returns seconds spent in predict and the masks."""
+    seconds = 0.0
+    masks = []
+    for frame, idx in frames:
+        start = time.perf_counter()
+        predicted, scores = predictor.predict(frame, idx)
+        seconds += time.perf_counter() - start
+        quality = _evaluate_quality(None, predicted[0], scores[0])
+        tracker.update(predicted[0], scores[0], quality, idx, predicted[0].shape)
+        masks.append(np.packbits(predicted[0]))
+    return seconds, masks
+
+
+def run_cached(cache_dir: str, frames):
+    """ROI prediction through a ``CachedPredictor``, as ``--roi --prediction-cache`` stacks it."""
+    tracker = KalmanTracker()
+    cached = CachedPredictor(SAM2Predictor(verbose=False), cache_dir, "bench-roi")
+    roi = RoiPredictor(cached, tracker)
+    _, masks = run(roi, tracker, frames)
+    return roi.roi_stats(), cached.stats(), masks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="ROI-cropped vs full-frame prediction cost; exits 1 if ROI windows "
+        "are skipped or mispredicted behind the prediction cache"
+    )
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--radius", type=int, default=24)
+    args = parser.parse_args()
+
+    frames = list(synthetic_frames(args.frames, args.width, args.height, args.radius))
+    full_seconds, full_masks = run(SAM2Predictor(), KalmanTracker(), frames)
+    tracker = KalmanTracker()
+    roi = RoiPredictor(SAM2Predictor(), tracker)
+    roi_seconds, roi_masks = run(roi, tracker, frames)
+    stats = roi.roi_stats()
+    identical = sum(np.array_equal(a, b) for a, b in zip(full_masks, roi_masks))
+    print(
+        f"{args.frames} frames at {args.width}x{args.height}, radius {args.radius}px "
+        f"(mock predictor)"
+    )
+    print(f"  full frame: {full_seconds / args.frames * 1000:.2f} ms/frame")
+    print(
+        f"  ROI:        {roi_seconds / args.frames * 1000:.2f} ms/frame "
+        f"({full_seconds / roi_seconds:.1f}x), {stats['pixel_fraction']:.2%} of pixels, "
+        f"{stats['full_frames']} full-frame searches, {stats['fallbacks']} fallbacks"
+    )
+    print(f"  identical masks: {identical}/{args.frames}")
+
+    failures = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for run_name in ("cold", "warm"):
+            roi_cached, cache, cached_masks = run_cached(cache_dir, frames)
+            print(
+                f"  ROI + cache ({run_name}): {roi_cached['roi_frames']} windowed searches, "
+                f"{cache['hits']} hits, {cache['misses']} misses"
+            )
+            if roi_cached["roi_frames"] == 0:
+                failures.append(f"{run_name}: no windowed searches")
+            if run_name == "warm" and cache["misses"]:
+                failures.append(f"{run_name}: {cache['misses']} cache misses")
+            if not all(np.array_equal(a, b) for a, b in zip(roi_masks, cached_masks)):
+                failures.append(f"{run_name}: masks differ from uncached ROI")
+    for failure in failures:
+        print(f"FAIL ROI + cache {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sam2_model import SAM2Predictor  # noqa: E402
+
+
+def make_frames(count: int, height: int, width: int, seed: int = 0) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def bench_batch(predictor: SAM2Predictor, frames: List[np.ndarray], batch_size: int) -> float:
+    """Frames per second for encode + decode at ``batch_size`` frames per call."""
+    predictor._embeddings.clear()
+    start = time.perf_counter()
+    for offset in range(0, len(frames), batch_size):
+        chunk = frames[offset : offset + batch_size]
+        predictor.predict_batch(chunk, list(range(offset, offset + len(chunk))))
+    return len(frames) / (time.perf_counter() - start)
+
+
+def bench_reprompt(predictor: SAM2Predictor, frame_idx: int, prompts: int) -> float:
+    """Decoder-only prompts per second on a cached embedding."""
+    start = time.perf_counter()
+    for i in range(prompts):
+        predictor.reprompt(frame_idx, [(10.0 + i, 20.0 + i)])
+    return prompts / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU throughput of the SAM 2 inference backend")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--frames", type=int, default=32, help="Frames per measurement")
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--checkpoint", default=None, help="SAM 2 checkpoint (tiny model if omitted)")
+    parser.add_argument("--model-config", default=None, help="SAM 2 model config name")
+    args = parser.parse_args()
+
+    predictor = SAM2Predictor(
+        model_path=args.checkpoint,
+        mock=False,
+        config=args.model_config,
+        threads=args.threads,
+        embedding_cache=max(args.frames, 1),
+    )
+    frames = make_frames(args.frames, args.height, args.width)
+    predictor.predict_batch(frames[:1], [0])  # warm-up
+
+    rows: List[Dict[str, float]] = []
+    for batch_size in args.batch_sizes:
+        rows.append({"batch": batch_size, "fps": bench_batch(predictor, frames, batch_size)})
+    reprompt_rate = bench_reprompt(predictor, 0, max(args.frames, 16))
+
+    print(f"backend: {predictor.version} ({args.width}x{args.height})")
+    print(f"{'batch':>6} {'frames/s':>10}")
+    for row in rows:
+        print(f"{row['batch']:>6} {row['fps']:>10.1f}")
+    print(f"decoder-only re-prompts/s: {reprompt_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
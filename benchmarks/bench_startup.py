@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+
+def import_seconds(module: str, repeats: int) -> float:
+    """Best-of wall time for a fresh interpreter to import ``module``."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"import {module}"], cwd=SRC, check=True, env=_env()
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def cold_jobs(job_args, jobs: int):
+    """One fresh ``pipeline.py`` process per job: (wall seconds, startup reports)."""
+    walls, reports = [], []
+    for idx in range(jobs):
+        args = job_args(idx)
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(SRC, "pipeline.py")] + args,
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        walls.append(time.perf_counter() - start)
+        report_path = os.path.join(ROOT, "artifacts", args[1], "metrics", "startup_report.json")
+        with open(report_path, encoding="utf-8") as handle:
+            reports.append(json.load(handle))
+    return walls, reports
+
+
+def warm_jobs(job_args, jobs: int):
+    """All jobs through one ``worker.py`` over stdin: (wall seconds, responses)."""
+    worker = subprocess.Popen(
+        [sys.executable, os.path.join(SRC, "worker.py")],
+        cwd=ROOT,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    walls, responses = [], []
+    try:
+        for idx in range(jobs):
+            start = time.perf_counter()
+            worker.stdin.write(json.dumps({"id": idx, "args": job_args(idx)}) + "\n")
+            worker.stdin.flush()
+            response = json.loads(worker.stdout.readline())
+            walls.append(time.perf_counter() - start)
+            if not response["ok"]:
+                raise RuntimeError(response["error"])
+            responses.append(response)
+        worker.stdin.write(json.dumps({"cmd": "shutdown"}) + "\n")
+        worker.stdin.flush()
+    finally:
+        worker.stdin.close()
+        worker.wait()
+    return walls, responses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-process vs warm-worker pipeline start-up")
+    parser.add_argument("--jobs", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per import timing")
+    args = parser.parse_args()
+
+    print("Fresh-interpreter import cost (best of {}):".format(args.repeats))
+    for module in ("numpy", "cv2", "matplotlib.pyplot", "pipeline"):
+        print(f"  import {module:<18} {import_seconds(module, args.repeats) * 1000:7.1f} ms")
+
+    tags = []
+
+    def job_args(idx):
+        tag = f"_bench_startup_{idx}"
+        tags.append(tag)
+        return ["--tag", tag, "--no-plot", "--no-render"]
+
+    try:
+        cold_walls, cold_reports = cold_jobs(job_args, args.jobs)
+        warm_walls, warm_responses = warm_jobs(job_args, args.jobs)
+    finally:
+        for tag in set(tags):
+            shutil.rmtree(os.path.join(ROOT, "artifacts", tag), ignore_errors=True)
+
+    def mean(values):
+        return sum(values) / len(values)
+
+    cold_start = [report["cold_start_seconds"] for report in cold_reports]
+    warm_start = [response["startup"]["cold_start_seconds"] for response in warm_responses]
+    print(f"{args.jobs} short jobs (synthetic clip, --no-plot --no-render):")
+    print(
+        f"  one process per job: {mean(cold_walls) * 1000:7.1f} ms/job wall, "
+        f"{mean(cold_start) * 1000:6.1f} ms to first frame"
+    )
+    print(
+        f"  warm worker:         {mean(warm_walls) * 1000:7.1f} ms/job wall, "
+        f"{mean(warm_start[1:] or warm_start) * 1000:6.1f} ms to first frame after the first job "
+        f"(first job {warm_start[0] * 1000:.1f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from video_io import av, open_writer  # noqa: E402
+from video_loader import VideoLoader  # noqa: E402
+
+
+def write_source(path: str, frames: int, width: int, height: int, fps: float) -> None:
+    """Textured background with a moving disc, so the encoders have real work to do."""
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(
+        rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8), (0, 0), 2
+    )
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for idx in range(frames):
+        frame = background.copy()
+        cv2.circle(frame, (width // 10 + idx * 4 % (width // 2), height // 2), height // 10, (0, 255, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def legacy_decode(path: str, size):
+    """The previous path: read into a fresh array, resize into another one."""
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield cv2.resize(frame, size)
+    finally:
+        cap.release()
+
+
+def loader_decode(path: str, size, backend: str, threads, buffers: int = 2):
+    with VideoLoader(path, size, backend=backend, threads=threads, buffers=buffers) as video:
+        for frame, _, _ in video.stream_frames():
+            yield frame
+
+
+def time_decode(frames) -> tuple:
+    start = time.perf_counter()
+    count = sum(1 for _ in frames)
+    return count, time.perf_counter() - start
+
+
+def time_encode(frames, path: str, fps: float, size, codec: str, backend: str) -> float:
+    writer = open_writer(path, fps, size, codec=codec, backend=backend)
+    start = time.perf_counter()
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Decode and encode throughput of the video I/O backends")
+    parser.add_argument("--video", default=None, help="Source video (default: a synthetic 1080p clip)")
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--threads", type=int, default=None, help="Decoder threads")
+    parser.add_argument(
+        "--codecs", nargs="+", default=["xvid", "mjpg", "ffv1"], help="Encoders to time"
+    )
+    args = parser.parse_args()
+
+    size = (640, 480)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.video
+        if path is None:
+            path = os.path.join(workdir, "source.avi")
+            write_source(path, args.frames, args.width, args.height, 30.0)
+        with VideoLoader(path) as video:
+            source_size, fps = video.source_size(), video.fps() or 30.0
+        print(f"Source {source_size[0]}x{source_size[1]} at {fps:.1f} FPS, resized to {size[0]}x{size[1]}")
+
+        backends = ["opencv"] + (["pyav"] if av is not None else [])
+        decoders = [("legacy (read + resize copy)", lambda: legacy_decode(path, size))]
+        for backend in backends:
+            decoders.append(
+                (f"{backend} (ring buffer)", lambda b=backend: loader_decode(path, size, b, args.threads))
+            )
+        legacy_seconds = None
+        for name, decode in decoders:
+            count, seconds = time_decode(decode())
+            legacy_seconds = legacy_seconds or seconds
+            print(
+                f"  decode {name:<28} {count / seconds:7.1f} FPS "
+                f"({legacy_seconds / seconds:.2f}x legacy)"
+            )
+        if av is None:
+            print("  (PyAV not installed; skipping the pyav backend)")
+
+        frames = [frame.copy() for frame in legacy_decode(path, size)]
+        for backend in backends:
+            for codec in args.codecs:
+                output = os.path.join(workdir, f"out_{backend}_{codec}.{'mkv' if codec == 'ffv1' else 'avi'}")
+                try:
+                    seconds = time_encode(frames, output, fps, size, codec, backend)
+                except (RuntimeError, ValueError) as exc:
+                    print(f"  encode {backend}/{codec:<6} unavailable ({exc})")
+                    continue
+                print(
+                    f"  encode {backend}/{codec:<6}  {len(frames) / seconds:7.1f} FPS, "
+                    f"{os.path.getsize(output) / len(frames) / 1024:.1f} KiB/frame"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, "src"))
+
+from memory_manager import MemoryManager  # noqa: E402
+from occlusion_handler import KalmanTracker  # noqa: E402
+from quality_controller import QualityController  # noqa: E402
+from renderer import OverlayRenderer  # noqa: E402
+from sam2_model import SAM2Predictor  # noqa: E402
+from video_loader import VideoLoader  # noqa: E402
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+STAGES = [
+    "decode",
+    "predict",
+    "quality",
+    "track",
+    "memory_store",
+    "memory_retrieve",
+    "render",
+    "encode",
+]
+DEFAULT_BASELINE = os.path.join(PROJECT_DIR, "benchmarks", "baseline.json")
+
+
+def synthetic_frame(width: int, height: int, objects: int, idx: int) -> np.ndarray:
+    """Green circles moving left to right, one row per object."""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    radius = max(8, height // 24)
+    for obj in range(objects):
+        cx = (50 + idx * 5 + obj * 37) % width
+        cy = int((obj + 1) * height / (objects + 1))
+        cv2.circle(frame, (cx, cy), radius, (0, 255, 0), -1)
+    return frame
+
+
+def write_source(path: str, width: int, height: int, objects: int, frames: int) -> None:
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 20.0, (width, height))
+    for idx in range(frames):
+        writer.write(synthetic_frame(width, height, objects, idx))
+    writer.release()
+
+
+def time_config(
+    width: int, height: int, objects: int, frames: int, warmup: int, workdir: str
+) -> Dict[str, List[float]]:
+    """Per-frame wall times in seconds for every stage of the pipeline hot path."""
+    source = os.path.join(workdir, f"source_{width}x{height}_{objects}.avi")
+    sink = os.path.join(workdir, f"sink_{width}x{height}_{objects}.avi")
+    write_source(source, width, height, objects, frames + warmup)
+
+    predictor = SAM2Predictor(mock=True, max_objects=objects)
+    controller = QualityController()
+    tracker = KalmanTracker()
+    memory = MemoryManager(capacity=25)
+    renderer = OverlayRenderer()
+    writer = cv2.VideoWriter(sink, cv2.VideoWriter_fourcc(*"XVID"), 20.0, (width, height))
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    clock = time.perf_counter
+
+    with VideoLoader(source, resize_dim=(width, height)) as loader:
+        stream = loader.stream_frames()
+        for step in range(frames + warmup):
+            t0 = clock()
+            frame, idx, _ = next(stream)
+            t1 = clock()
+            masks, scores = predictor.predict(frame, idx)
+            t2 = clock()
+            quality_info = controller.evaluate(masks[0], scores[0])
+            t3 = clock()
+            refined, position, status = tracker.update(
+                masks[0], scores[0], quality_info, idx, masks[0].shape
+            )
+            t4 = clock()
+            memory.store(idx, masks[0], quality_info["quality"])
+            t5 = clock()
+            memory.retrieve(position, masks[0].shape)
+            t6 = clock()
+            output = renderer.render(frame, idx, refined, position, status, quality_info)
+            t7 = clock()
+            writer.write(output)
+            t8 = clock()
+            if step < warmup:
+                continue
+            marks = (t0, t1, t2, t3, t4, t5, t6, t7, t8)
+            for stage, start, end in zip(STAGES, marks, marks[1:]):
+                timings[stage].append(end - start)
+    writer.release()
+    return timings
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples) * 1e3
+    mean = float(values.mean())
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": mean,
+        "fps": 1e3 / mean if mean > 0 else float("inf"),
+    }
+
+
+def run_suite(
+    resolutions: List[str], object_counts: List[int], frames: int, warmup: int
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in resolutions:
+            width, height = RESOLUTIONS[name]
+            for objects in object_counts:
+                timings = time_config(width, height, objects, frames, warmup, workdir)
+                stages = {stage: summarize(values) for stage, values in timings.items()}
+                totals = [sum(parts) for parts in zip(*timings.values())]
+                stages["total"] = summarize(totals)
+                results[f"{name}_obj{objects}"] = stages
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    max_regression: float,
+    min_delta_ms: float = 0.0,
+    metric: str = "p50_ms",
+) -> List[Tuple[str, str, float, float]]:
+    """(config, stage, baseline, current) for every stage slower than allowed.
+
+    Slowdowns smaller than ``min_delta_ms`` are ignored so timer noise on
+    sub-millisecond stages does not fail the run.
+    """
+    regressions = []
+    for config, stages in results.items():
+        for stage, stats in stages.items():
+            reference = baseline.get(config, {}).get(stage)
+            if reference is None or reference[metric] <= 0:
+                continue
+            if stats[metric] - reference[metric] < min_delta_ms:
+                continue
+            if stats[metric] > reference[metric] * (1.0 + max_regression / 100.0):
+                regressions.append((config, stage, reference[metric], stats[metric]))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame pipeline hot path")
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        choices=sorted(RESOLUTIONS),
+        default=["480p", "720p", "1080p"],
+    )
+    parser.add_argument("--objects", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--frames", type=int, default=60, help="Timed frames per config")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed frames per config")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=25.0,
+        help="Fail when a stage's p50 is this many percent slower than baseline",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=0.1,
+        help="Ignore p50 slowdowns smaller than this many milliseconds",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Overwrite the baseline with this run instead of comparing",
+    )
+    args = parser.parse_args()
+
+    results = run_suite(args.resolutions, args.objects, args.frames, args.warmup)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "frames": args.frames,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    for config, stages in results.items():
+        print(config)
+        for stage, stats in stages.items():
+            print(
+                f"  {stage:<16} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+                f"p99 {stats['p99_ms']:8.3f} ms  {stats['fps']:9.1f} fps"
+            )
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)["results"]
+    regressions = compare(results, baseline, args.max_regression, args.min_delta_ms)
+    if regressions:
+        print(f"Regressions above {args.max_regression:.0f}% (p50):")
+        for config, stage, before, after in regressions:
+            print(f"  {config}/{stage}: {before:.3f} ms -> {after:.3f} ms")
+        sys.exit(1)
+    print(f"No stage regressed more than {args.max_regression:.0f}% against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+METRICS_CSV = os.path.join("metrics", "run_metrics.csv")
+RUN_CONFIG = os.path.join("metrics", "run_config.json")
+GROUP_COLUMNS = ("tag", "video", "config")
+FRAME_METRICS = ("iou", "centroid_error", "quality", "threshold", "norm_area")
+# Classes stored in the per-frame ``status`` column
+OTHER, TRACKING, OCCLUDED = 0, 1, 2
+# A frame ends an occlusion's recovery once it is tracked with at least this IoU
+RECOVERY_IOU = 0.5
+
+FrameRange = Tuple[Optional[int], Optional[int]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    tag TEXT UNIQUE NOT NULL,
+    csv_path TEXT NOT NULL,
+    video TEXT,
+    config TEXT,
+    settings TEXT,
+    mtime_ns INTEGER,
+    size INTEGER,
+    sha1 TEXT,
+    ingested_at REAL,
+    frames INTEGER,
+    iou_sum REAL,
+    iou_frames INTEGER,
+    error_sum REAL,
+    error_frames INTEGER,
+    quality_sum REAL,
+    threshold_sum REAL,
+    tracking_frames INTEGER,
+    occluded_frames INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_video ON runs (video);
+CREATE INDEX IF NOT EXISTS runs_config ON runs (config);
+CREATE TABLE IF NOT EXISTS columns (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (name, run_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS occlusions (
+    run_id INTEGER NOT NULL,
+    start_frame INTEGER NOT NULL,
+    end_frame INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    recovery_frames INTEGER,
+    mean_iou REAL,
+    PRIMARY KEY (run_id, start_frame)
+) WITHOUT ROWID;
+"""
+# Column blobs are raw arrays sorted by frame: frame_idx is int64, status uint8;
+# FRAME_METRICS and "stage:<name>" timings (ms) are float64 with NaN for empty cells
+_DTYPES = {"frame_idx": np.int64, "status": np.uint8}
+
+
+def discover_runs(paths: Sequence[str]) -> Iterator[Tuple[str, str]]:
+    """(tag, run_dir) for every directory holding ``metrics/run_metrics.csv``.
+
+    Tags are paths relative to the given root, so ``artifacts`` yields
+    ``proposed`` and ``experiments/ablation/<video>/<config>``; a run
+    directory passed directly is tagged with its own name.
+    """
+    for root in paths:
+        root = os.path.normpath(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            # Keyframe and metrics folders never hold nested runs
+            dirnames[:] = sorted(name for name in dirnames if name not in ("frames", "metrics"))
+            if os.path.isfile(os.path.join(dirpath, METRICS_CSV)):
+                tag = os.path.relpath(dirpath, root)
+                if tag == ".":
+                    tag = os.path.basename(os.path.abspath(root))
+                yield tag.replace(os.sep, "/"), dirpath
+
+
+def occlusion_segments(
+    frame_indices: Sequence[int],
+    statuses: Sequence[str],
+    ious: Sequence[Optional[float]],
+    min_iou: float = RECOVERY_IOU,
+) -> List[dict]:
+    """Maximal runs of occluded frames and how long tracking took to recover.
+
+    ``recovery_frames`` counts frames after the occlusion until one is
+    tracked with IoU >= ``min_iou`` (any tracked frame when IoU is unknown):
+    0 means the next frame was already good, None means it never recovered.
+    """
+    recovered_at: List[Optional[int]] = [None] * len(frame_indices)
+    next_good = None
+    for pos in range(len(frame_indices) - 1, -1, -1):
+        iou = ious[pos]
+        if statuses[pos].startswith("Tracking") and (iou is None or iou >= min_iou):
+            next_good = frame_indices[pos]
+        recovered_at[pos] = next_good
+    segments = []
+    start = None
+    for pos, status in enumerate(statuses):
+        occluded = status.startswith("Occluded")
+        if occluded and start is None:
+            start = pos
+        if start is not None and (not occluded or pos == len(statuses) - 1):
+            end = pos - 1 if not occluded else pos
+            good = recovered_at[pos] if not occluded else None
+            known = [iou for iou in ious[start : end + 1] if iou is not None]
+            segments.append(
+                {
+                    "start_frame": frame_indices[start],
+                    "end_frame": frame_indices[end],
+                    "frames": end - start + 1,
+                    "recovery_frames": None if good is None else good - frame_indices[end] - 1,
+                    "mean_iou": sum(known) / len(known) if known else None,
+                }
+            )
+            start = None
+    return segments
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _status_class(status: str) -> int:
+    if status.startswith("Tracking"):
+        return TRACKING
+    if status.startswith("Occluded"):
+        return OCCLUDED
+    return OTHER
+
+
+def _nanmean(values: np.ndarray) -> Optional[float]:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else None
+
+
+class ResultsIndex:
+    """Incremental SQLite index of pipeline and experiment runs.
+
+    Each run's CSV is parsed once; afterwards it is only re-read when its
+    size or mtime changed *and* its SHA-1 differs. Per run the index keeps
+    running sums (whole-run group-bys are one SQL aggregate), each
+    per-frame column and stage timing as a NumPy array blob (frame-range
+    queries and percentiles are vectorised over the selected runs), and
+    the occlusion segments with their recovery latency.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "ResultsIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def ingest(self, paths: Sequence[str], force: bool = False) -> Dict[str, int]:
+        """Add new runs under ``paths``, refresh changed ones, and drop deleted ones."""
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        with self.db:
+            for tag, run_dir in discover_runs(paths):
+                counts[self.ingest_run(tag, run_dir, force=force)] += 1
+            for run_id, csv_path in self.db.execute("SELECT run_id, csv_path FROM runs").fetchall():
+                if not os.path.exists(csv_path):
+                    self._delete(run_id, drop_run=True)
+                    counts["removed"] += 1
+        return counts
+
+    def ingest_run(self, tag: str, run_dir: str, force: bool = False) -> str:
+        csv_path = os.path.abspath(os.path.join(run_dir, METRICS_CSV))
+        info = os.stat(csv_path)
+        row = self.db.execute(
+            "SELECT run_id, mtime_ns, size, sha1 FROM runs WHERE tag = ?", (tag,)
+        ).fetchone()
+        sha1 = None
+        if row is not None and not force:
+            run_id, mtime_ns, size, old_sha1 = row
+            if (mtime_ns, size) == (info.st_mtime_ns, info.st_size):
+                return "unchanged"
+            sha1 = _file_sha1(csv_path)
+            if sha1 == old_sha1:
+                # Touched but identical (e.g. copied): remember the new stat only
+                self.db.execute(
+                    "UPDATE runs SET mtime_ns = ?, size = ? WHERE run_id = ?",
+                    (info.st_mtime_ns, info.st_size, run_id),
+                )
+                return "unchanged"
+        sha1 = sha1 or _file_sha1(csv_path)
+        video = config = settings = None
+        config_path = os.path.join(run_dir, RUN_CONFIG)
+        if os.path.exists(config_path):
+            with open(config_path, encoding="utf-8") as handle:
+                run_config = json.load(handle)
+            video = run_config.get("video")
+            config = run_config.get("config")
+            settings = json.dumps(run_config.get("settings"), sort_keys=True)
+
+        if row is None:
+            run_id = self.db.execute(
+                "INSERT INTO runs (tag, csv_path) VALUES (?, ?)", (tag, csv_path)
+            ).lastrowid
+        else:
+            run_id = row[0]
+            self._delete(run_id)
+        statuses, columns = self._read_csv(csv_path)
+        self.db.executemany(
+            "INSERT INTO columns VALUES (?, ?, ?)",
+            [(run_id, name, array.tobytes()) for name, array in columns.items()],
+        )
+        frame_indices = columns["frame_idx"].tolist()
+        ious = [None if value != value else value for value in columns["iou"].tolist()]
+        segments = occlusion_segments(frame_indices, statuses, ious)
+        self.db.executemany(
+            "INSERT INTO occlusions VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    run_id,
+                    segment["start_frame"],
+                    segment["end_frame"],
+                    segment["frames"],
+                    segment["recovery_frames"],
+                    segment["mean_iou"],
+                )
+                for segment in segments
+            ],
+        )
+        # Python sums in frame order, so whole-run means match summarize_rows exactly
+        ious = [value for value in ious if value is not None]
+        errors = columns["centroid_error"][~np.isnan(columns["centroid_error"])].tolist()
+        self.db.execute(
+            """UPDATE runs SET csv_path = ?, video = ?, config = ?, settings = ?, mtime_ns = ?,
+            size = ?, sha1 = ?, ingested_at = ?, frames = ?, iou_sum = ?, iou_frames = ?,
+            error_sum = ?, error_frames = ?, quality_sum = ?, threshold_sum = ?,
+            tracking_frames = ?, occluded_frames = ? WHERE run_id = ?""",
+            (
+                csv_path,
+                video,
+                config,
+                settings,
+                info.st_mtime_ns,
+                info.st_size,
+                sha1,
+                time.time(),
+                len(frame_indices),
+                sum(ious),
+                len(ious),
+                sum(errors),
+                len(errors),
+                sum(columns["quality"][~np.isnan(columns["quality"])].tolist()),
+                sum(columns["threshold"][~np.isnan(columns["threshold"])].tolist()),
+                int((columns["status"] == TRACKING).sum()),
+                int((columns["status"] == OCCLUDED).sum()),
+                run_id,
+            ),
+        )
+        return "added" if row is None else "updated"
+
+    @staticmethod
+    def _read_csv(csv_path: str) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Statuses and the column arrays stored for a run, sorted by frame."""
+        with open(csv_path, newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            header = next(reader, [])
+            cells = list(zip(*filter(None, reader)))
+        if not cells:
+            cells = [()] * len(header)
+        column = {name: pos for pos, name in enumerate(header)}
+        frame_idx = np.array([int(text) for text in cells[column["frame_idx"]]], np.int64)
+        order = np.argsort(frame_idx, kind="stable")
+        statuses = [cells[column["status"]][pos] for pos in order.tolist()]
+        classes = {status: _status_class(status) for status in set(statuses)}
+        columns = {
+            "frame_idx": frame_idx[order],
+            "status": np.array([classes[status] for status in statuses], np.uint8),
+        }
+        named = [(name, column[name]) for name in FRAME_METRICS] + [
+            (f"stage:{name[len('time_') : -len('_ms')]}", pos)
+            for name, pos in column.items()
+            if name.startswith("time_") and name.endswith("_ms")
+        ]
+        for name, pos in named:
+            values = np.array([float(text) if text else np.nan for text in cells[pos]])
+            columns[name] = values[order]
+        return statuses, columns
+
+    def _delete(self, run_id: int, drop_run: bool = False) -> None:
+        for table in ("columns", "occlusions") + (("runs",) if drop_run else ()):
+            self.db.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+    @staticmethod
+    def _where(filters: Optional[Dict[str, str]]) -> Tuple[List[str], list]:
+        """SQL conditions for glob ``filters`` on tag/video/config."""
+        clauses, params = [], []
+        for name, pattern in (filters or {}).items():
+            if name not in GROUP_COLUMNS:
+                raise ValueError(f"cannot filter on {name!r}")
+            clauses.append(f"COALESCE(r.{name}, '?') GLOB ?")
+            params.append(pattern)
+        return clauses, params
+
+    @staticmethod
+    def _join(clauses: List[str]) -> str:
+        return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    @staticmethod
+    def _group(group_by: str) -> str:
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"cannot group by {group_by!r}")
+        return f"COALESCE(r.{group_by}, '?')"
+
+    def _columns(
+        self,
+        names: Sequence[str],
+        group_by: str,
+        filters: Optional[Dict[str, str]] = None,
+        frames: Optional[FrameRange] = None,
+    ) -> Dict[str, Dict[str, np.ndarray]]:
+        """{group: {column: values}} concatenated over matching runs, cut to ``frames``.
+
+        The ``run_id`` entry holds each value's run; a run without one of
+        ``names`` (e.g. an unprofiled stage) contributes NaN for it.
+        """
+        names = ["frame_idx"] + [name for name in names if name != "frame_idx"]
+        clauses, params = self._where(filters)
+        query = f"SELECT r.run_id, {self._group(group_by)} FROM runs r{self._join(clauses)}"
+        group_of = dict(self.db.execute(query, params).fetchall())
+        # One contiguous primary-key range per column; runs are filtered in Python
+        columns: Dict[str, Dict[int, bytes]] = {
+            name: {
+                run_id: data
+                for run_id, data in self.db.execute(
+                    "SELECT run_id, data FROM columns WHERE name = ?", (name,)
+                )
+                if run_id in group_of
+            }
+            for name in names
+        }
+        members: Dict[str, List[int]] = {}
+        for run_id in columns["frame_idx"]:
+            members.setdefault(group_of[run_id], []).append(run_id)
+        first, last = frames if frames is not None else (None, None)
+        grouped = {}
+        for key in sorted(members):
+            run_ids = members[key]
+            lengths = [len(columns["frame_idx"][run_id]) // 8 for run_id in run_ids]
+            data = {"run_id": np.repeat(np.asarray(run_ids, np.int64), lengths)}
+            for name in names:
+                dtype = _DTYPES.get(name, np.float64)
+                data[name] = np.concatenate(
+                    [
+                        np.frombuffer(columns[name][run_id], dtype)
+                        if run_id in columns[name]
+                        else np.full(length, np.nan)
+                        for run_id, length in zip(run_ids, lengths)
+                    ]
+                )
+            if first is not None or last is not None:
+                frame_idx = data["frame_idx"]
+                keep = np.ones(len(frame_idx), bool)
+                if first is not None:
+                    keep &= frame_idx >= first
+                if last is not None:
+                    keep &= frame_idx <= last
+                data = {name: values[keep] for name, values in data.items()}
+            grouped[key] = data
+        return grouped
+
+    def stages(self) -> List[str]:
+        """Profiled stage names present in the index (``wall`` is a timestamp, not a stage)."""
+        query = "SELECT DISTINCT name FROM columns WHERE name GLOB 'stage:*' ORDER BY 1"
+        names = [row[0][len("stage:") :] for row in self.db.execute(query)]
+        return [name for name in names if name != "wall"]
+
+    def groups(
+        self,
+        group_by: str = "tag",
+        filters: Optional[Dict[str, str]] = None,
+        frames: Optional[FrameRange] = None,
+    ) -> List[dict]:
+        """Frame-weighted aggregates per group, from run sums unless a frame range is given."""
+        names = (
+            group_by,
+            "runs",
+            "frames",
+            "mean_iou",
+            "mean_centroid_error",
+            "mean_quality",
+            "mean_threshold",
+            "tracking_ratio",
+            "occluded_frames",
+        )
+        if frames is None:
+            clauses, params = self._where(filters)
+            query = f"""SELECT {self._group(group_by)}, COUNT(*), SUM(r.frames),
+                SUM(r.iou_sum) / SUM(r.iou_frames), SUM(r.error_sum) / SUM(r.error_frames),
+                SUM(r.quality_sum) / SUM(r.frames), SUM(r.threshold_sum) / SUM(r.frames),
+                CAST(SUM(r.tracking_frames) AS REAL) / SUM(r.frames), SUM(r.occluded_frames)
+                FROM runs r{self._join(clauses)} GROUP BY 1 ORDER BY 1"""
+            return [dict(zip(names, row)) for row in self.db.execute(query, params)]
+        columns = self._columns(
+            ("status", "iou", "centroid_error", "quality", "threshold"), group_by, filters, frames
+        )
+        results = []
+        for key, data in columns.items():
+            status = data["status"]
+            if not status.size:
+                continue
+            row = (
+                key,
+                len(np.unique(data["run_id"])),
+                int(status.size),
+                _nanmean(data["iou"]),
+                _nanmean(data["centroid_error"]),
+                _nanmean(data["quality"]),
+                _nanmean(data["threshold"]),
+                float(np.mean(status == TRACKING)),
+                int(np.count_nonzero(status == OCCLUDED)),
+            )
+            results.append(dict(zip(names, row)))
+        return results
+
+    def percentiles(
+        self,
+        metric: str,
+        group_by: str = "tag",
+        qs: Sequence[float] = (50, 90, 95, 99),
+        filters: Optional[Dict[str, str]] = None,
+        frames: Optional[FrameRange] = None,
+    ) -> List[dict]:
+        """Per-group percentiles of a frame column, or of ``stage:<name>`` timings (ms).
+
+        Linear interpolation between closest ranks, as ``summarize_metrics.percentile``.
+        """
+        if metric not in FRAME_METRICS and not metric.startswith("stage:"):
+            raise ValueError(f"unknown metric {metric!r}")
+        results = []
+        for key, data in self._columns((metric,), group_by, filters, frames).items():
+            values = data[metric][~np.isnan(data[metric])]
+            if not values.size:
+                continue
+            row = {group_by: key, "count": int(values.size)}
+            row.update(zip((f"p{q:g}" for q in qs), np.percentile(values, qs).tolist()))
+            results.append(row)
+        return results
+
+    def _occlusion_where(
+        self, filters: Optional[Dict[str, str]], frames: Optional[FrameRange]
+    ) -> Tuple[str, list]:
+        """Filters plus a frame range on the segment's first occluded frame."""
+        clauses, params = self._where(filters)
+        first, last = frames if frames is not None else (None, None)
+        if first is not None:
+            clauses.append("o.start_frame >= ?")
+            params.append(first)
+        if last is not None:
+            clauses.append("o.start_frame <= ?")
+            params.append(last)
+        return self._join(clauses), params
+
+    def recovery(
+        self,
+        group_by: str = "tag",
+        qs: Sequence[float] = (50, 95),
+        filters: Optional[Dict[str, str]] = None,
+        frames: Optional[FrameRange] = None,
+    ) -> List[dict]:
+        """Occlusion count, length and recovery-latency percentiles (frames) per group."""
+        where, params = self._occlusion_where(filters, frames)
+        query = f"""SELECT {self._group(group_by)}, o.frames, o.recovery_frames
+            FROM occlusions o JOIN runs r USING (run_id){where} ORDER BY 1"""
+        stats: Dict[str, dict] = {}
+        for key, length, latency in self.db.execute(query, params):
+            entry = stats.setdefault(key, {"lengths": [], "latencies": [], "unrecovered": 0})
+            entry["lengths"].append(length)
+            if latency is None:
+                entry["unrecovered"] += 1
+            else:
+                entry["latencies"].append(latency)
+        results = []
+        for key, entry in stats.items():
+            latencies = np.asarray(entry["latencies"], np.float64)
+            row = {
+                group_by: key,
+                "occlusions": len(entry["lengths"]),
+                "mean_length": sum(entry["lengths"]) / len(entry["lengths"]),
+                "unrecovered": entry["unrecovered"],
+                "mean_recovery_frames": float(latencies.mean()) if latencies.size else None,
+                "max_recovery_frames": int(latencies.max()) if latencies.size else None,
+            }
+            for q in qs:
+                row[f"recovery_p{q:g}"] = float(np.percentile(latencies, q)) if latencies.size else None
+            results.append(row)
+        return results
+
+    def segments(
+        self, filters: Optional[Dict[str, str]] = None, frames: Optional[FrameRange] = None
+    ) -> List[dict]:
+        """Every indexed occlusion segment with its recovery latency."""
+        where, params = self._occlusion_where(filters, frames)
+        query = f"""SELECT r.tag, o.start_frame, o.end_frame, o.frames, o.recovery_frames,
+            o.mean_iou FROM occlusions o JOIN runs r USING (run_id){where} ORDER BY r.tag, o.start_frame"""
+        names = ("tag", "start_frame", "end_frame", "frames", "recovery_frames", "mean_iou")
+        return [dict(zip(names, row)) for row in self.db.execute(query, params)]
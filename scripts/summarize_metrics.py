@@ -1,7 +1,9 @@
 import argparse
 import csv
+import json
 import os
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 
 
 def load_metrics(csv_path: str) -> List[Dict[str, str]]:
@@ -13,31 +15,240 @@ def mean(values: List[float]) -> float:
     return sum(values) / len(values) if values else float("nan")
 
 
-def summarize(run_dir: str) -> Dict[str, float]:
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (same convention as numpy's default)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def stage_timings(rows: List[Dict[str, str]]) -> Dict[str, float]:
+    """Per-stage mean/p95 milliseconds and effective FPS from --profile columns."""
+    if not rows:
+        return {}
+    stats: Dict[str, float] = {}
+    stages = [
+        key[len("time_") : -len("_ms")]
+        for key in rows[0]
+        if key.startswith("time_") and key.endswith("_ms") and key != "time_wall_ms"
+    ]
+    for stage in stages:
+        values = [float(row[f"time_{stage}_ms"]) for row in rows if row[f"time_{stage}_ms"]]
+        stats[f"{stage}_mean_ms"] = mean(values)
+        stats[f"{stage}_p95_ms"] = percentile(values, 95)
+    finished = sorted(float(row["time_wall_ms"]) for row in rows if row.get("time_wall_ms"))
+    if len(finished) > 1 and finished[-1] > finished[0]:
+        stats["effective_fps"] = (len(finished) - 1) * 1e3 / (finished[-1] - finished[0])
+    return stats
+
+
+SUMMARY_KEYS = (
+    "mean_iou",
+    "mean_centroid_error",
+    "mean_quality",
+    "mean_threshold",
+    "tracking_ratio",
+)
+
+
+def load_sidecar(csv_path: str) -> Optional[Dict[str, float]]:
+    """Aggregates the streaming logger wrote at close, if still current."""
+    path = os.path.splitext(csv_path)[0] + ".summary.json"
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        sidecar = json.load(handle)
+    return sidecar if sidecar.get("complete") else None
+
+
+def summarize(run_dir: str, rescan: bool = False) -> Dict[str, float]:
     csv_path = os.path.join(run_dir, "metrics", "run_metrics.csv")
-    rows = load_metrics(csv_path)
+    sidecar = None if rescan else load_sidecar(csv_path)
+    if sidecar is not None:
+        summary = {
+            key: value
+            for key, value in sidecar.items()
+            if key in SUMMARY_KEYS or key.endswith("_ms") or key == "effective_fps"
+        }
+    else:
+        summary = summarize_rows(load_metrics(csv_path))
+    cache_path = os.path.join(run_dir, "metrics", "cache_report.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as handle:
+            cache = json.load(handle)
+        summary["cache_hits"] = cache["hits"]
+        summary["cache_misses"] = cache["misses"]
+        summary["cache_hit_rate"] = cache["hit_rate"]
+    startup_path = os.path.join(run_dir, "metrics", "startup_report.json")
+    if os.path.exists(startup_path):
+        with open(startup_path, encoding="utf-8") as handle:
+            startup = json.load(handle)
+        summary["cold_start_seconds"] = startup["cold_start_seconds"]
+        summary["import_seconds"] = startup["import_seconds"]
+    return summary
+
+
+def summarize_rows(rows: List[Dict[str, str]]) -> Dict[str, float]:
     def collect(field: str) -> List[float]:
         return [float(row[field]) for row in rows if row[field]]
     reliable_ratio = sum(1 for row in rows if row.get("status", "").startswith("Tracking")) / len(rows)
-    return {
+    summary = {
         "mean_iou": mean(collect("iou")),
         "mean_centroid_error": mean(collect("centroid_error")),
         "mean_quality": mean(collect("quality")),
         "mean_threshold": mean(collect("threshold")),
         "tracking_ratio": reliable_ratio,
     }
+    summary.update(stage_timings(rows))
+    return summary
+
+
+def _frame_range(text: str):
+    first, _, last = text.partition(":")
+    return (int(first) if first else None, int(last) if last else None)
+
+
+def _print_table(rows: List[Dict[str, object]]) -> None:
+    if not rows:
+        print("  (no matching runs)")
+        return
+    columns = list(rows[0])
+    cells = [
+        [f"{value:.4f}" if isinstance(value, float) else str(value) for value in row.values()]
+        for row in rows
+    ]
+    widths = [
+        max(len(name), *(len(line[pos]) for line in cells)) for pos, name in enumerate(columns)
+    ]
+    print("  " + "  ".join(name.ljust(width) for name, width in zip(columns, widths)))
+    for line in cells:
+        print("  " + "  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def query_index(args: argparse.Namespace) -> dict:
+    """Ingest runs into the results index and print the requested breakdowns."""
+    # Imported lazily: only --index needs sqlite3 and numpy
+    from results_index import RECOVERY_IOU, ResultsIndex
+
+    filters = {
+        name: pattern
+        for name, pattern in (("tag", args.tag), ("video", args.video), ("config", args.config))
+        if pattern is not None
+    }
+    frames = _frame_range(args.frames) if args.frames else None
+    report = {}
+    with ResultsIndex(args.index) as index:
+        if args.runs:
+            started = time.perf_counter()
+            counts = index.ingest(args.runs, force=args.rescan)
+            print(
+                f"Indexed {args.index}: {counts['added']} added, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['removed']} removed "
+                f"({(time.perf_counter() - started) * 1000:.1f} ms)"
+            )
+        started = time.perf_counter()
+        report["groups"] = index.groups(args.group_by, filters, frames)
+        if args.baseline is not None:
+            base = next(
+                (row for row in report["groups"] if row[args.group_by] == args.baseline), None
+            )
+            if base is None:
+                raise SystemExit(f"baseline {args.baseline!r} is not a {args.group_by} group")
+            for row in report["groups"]:
+                for key in ("mean_iou", "tracking_ratio"):
+                    delta = None
+                    if row[key] is not None and base[key] is not None:
+                        delta = row[key] - base[key]
+                    row[f"delta_{key}"] = delta
+        if args.percentiles:
+            metrics = ["iou", "centroid_error"] + [f"stage:{stage}" for stage in index.stages()]
+            report["percentiles"] = {
+                metric: index.percentiles(metric, args.group_by, args.percentiles, filters, frames)
+                for metric in metrics
+            }
+        if args.recovery:
+            report["recovery"] = index.recovery(args.group_by, filters=filters, frames=frames)
+        if args.segments:
+            report["segments"] = index.segments(filters, frames)
+        seconds = time.perf_counter() - started
+
+    print(f"By {args.group_by}" + (f", frames {args.frames}" if args.frames else "") + ":")
+    _print_table(report["groups"])
+    for metric, rows in report.get("percentiles", {}).items():
+        print(f"{metric} percentiles:")
+        _print_table(rows)
+    if "recovery" in report:
+        print(f"Occlusion recovery (frames until tracked with IoU >= {RECOVERY_IOU:g}):")
+        _print_table(report["recovery"])
+    if "segments" in report:
+        print("Occlusion segments:")
+        _print_table(report["segments"])
+    print(f"Queries answered in {seconds * 1000:.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    return report
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Summarize tracking metrics across runs")
     parser.add_argument(
         "runs",
-        nargs="+",
-        help="One or more artifact run directories (e.g., artifacts/proposed)",
+        nargs="*",
+        help="Artifact run directories (e.g., artifacts/proposed); with --index, also roots "
+        "such as artifacts to scan for runs",
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Recompute from the CSV even when a summary sidecar (or index entry) exists",
+    )
+    parser.add_argument(
+        "--index",
+        default=None,
+        help="SQLite results index to update from the given runs, then query "
+        "(e.g. artifacts/results.db)",
+    )
+    parser.add_argument(
+        "--group-by", choices=("tag", "video", "config"), default="tag", help="Index query grouping"
+    )
+    parser.add_argument("--tag", default=None, help="Only runs whose tag matches this glob")
+    parser.add_argument("--video", default=None, help="Only runs whose video matches this glob")
+    parser.add_argument("--config", default=None, help="Only runs whose config matches this glob")
+    parser.add_argument(
+        "--frames", default=None, help="Frame range FIRST:LAST (either end may be empty)"
+    )
+    parser.add_argument(
+        "--baseline", default=None, help="Group to report IoU/tracking-ratio deltas against"
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=float,
+        nargs="*",
+        default=None,
+        help="Per-group percentiles of IoU, centroid error and stage timings (default 50 90 95 99)",
+    )
+    parser.add_argument(
+        "--recovery", action="store_true", help="Per-group occlusion recovery latency breakdown"
+    )
+    parser.add_argument(
+        "--segments", action="store_true", help="List every occlusion segment with its recovery"
     )
+    parser.add_argument("--json", default=None, help="Also write the index query results here")
     args = parser.parse_args()
+    if args.percentiles is not None and not args.percentiles:
+        args.percentiles = [50, 90, 95, 99]
+    if args.index is not None:
+        query_index(args)
+        return
+    if not args.runs:
+        parser.error("give run directories, or --index to query the results index")
     for run in args.runs:
-        stats = summarize(run)
+        stats = summarize(run, rescan=args.rescan)
         print(run)
         for key, value in stats.items():
             print(f"  {key}: {value:.4f}")
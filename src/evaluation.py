@@ -0,0 +1,392 @@
+import argparse
+import csv
+import glob
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import columns_dir, pa, parquet_path, pq, summary_path
+from packed_mask import POPCOUNT as _POPCOUNT, PackedMask
+
+_HEADER_BYTES = 128
+
+
+class MaskStack:
+    """A ``(N, H, W)`` stack of masks, optionally bit-packed along W.
+
+    Unpacked stacks are plain ``.npy`` files. Packed stacks store
+    ``np.packbits(mask > 0, axis=-1)`` as ``(N, H, ceil(W / 8))`` with the
+    true width and frame indices in a ``.json`` sidecar. Both are opened
+    memory-mapped, so evaluation only touches one chunk at a time.
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        width: Optional[int] = None,
+        frame_indices: Optional[Sequence[int]] = None,
+    ):
+        self.data = data
+        self.packed = width is not None
+        self.width = width if width is not None else data.shape[-1]
+        self.height = data.shape[1]
+        self.frame_indices = np.asarray(
+            frame_indices if frame_indices is not None else np.arange(len(data)), dtype=np.int64
+        )
+
+    @classmethod
+    def open(cls, path: str) -> "MaskStack":
+        data = np.load(path, mmap_mode="r")
+        meta_path = os.path.splitext(path)[0] + ".json"
+        if not os.path.exists(meta_path):
+            return cls(data)
+        with open(meta_path, encoding="utf-8") as handle:
+            meta = json.load(handle)
+        return cls(data, width=meta.get("width"), frame_indices=meta.get("frame_indices"))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def packed_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Bit-packed ``(c, H, ceil(W / 8))`` masks for the given stack rows."""
+        block = np.asarray(self.data[rows])
+        return block if self.packed else np.packbits(block > 0, axis=-1)
+
+    def values(self, rows: np.ndarray, y0: int, y1: int, x0: int, x1: int) -> np.ndarray:
+        """Stored mask values of a window of the given rows (bits for packed stacks)."""
+        if self.packed:
+            block = np.asarray(self.data[rows, y0:y1, x0 // 8 : -(-x1 // 8)])
+            return np.unpackbits(block, axis=-1)[:, :, x0 % 8 : x0 % 8 + x1 - x0]
+        return np.asarray(self.data[rows, y0:y1, x0:x1])
+
+
+class MaskStackWriter:
+    """Appends masks frame by frame into a bit-packed (or raw) ``.npy`` stack.
+
+    The ``.npy`` header is reserved up front and rewritten with the final
+    frame count on ``close()``, so frames go straight to disk and the stack
+    can be memory-mapped afterwards. Raw stacks accept any fixed per-frame
+    uint8 shape, e.g. ``(H, W, 3)`` colour frames.
+    """
+
+    def __init__(self, path: str, packed: bool = True):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.packed = packed
+        self.frame_indices: List[int] = []
+        self._shape: Optional[Tuple[int, int]] = None
+        self._handle = open(path, "wb")
+        self._handle.write(b"\0" * _HEADER_BYTES)
+
+    def append(self, frame_idx: int, mask: np.ndarray) -> None:
+        if self._shape is None:
+            self._shape = mask.shape
+        elif mask.shape != self._shape:
+            raise ValueError(f"mask shape {mask.shape} does not match stack {self._shape}")
+        if isinstance(mask, PackedMask):
+            row = mask.packed_rows() if self.packed else mask.unpack()
+        elif self.packed:
+            row = np.packbits(mask > 0, axis=-1)
+        else:
+            row = np.ascontiguousarray(mask, dtype=np.uint8)
+        self._handle.write(row.tobytes())
+        self.frame_indices.append(int(frame_idx))
+
+    def close(self) -> None:
+        if self._handle.closed:
+            return
+        shape = tuple(self._shape or (0, 0))
+        width = shape[1]
+        if self.packed:
+            shape = shape[:-1] + (-(-shape[-1] // 8),)
+        self._handle.seek(0)
+        self._handle.write(_npy_header((len(self.frame_indices),) + shape))
+        self._handle.close()
+        meta = {"frame_indices": self.frame_indices}
+        if self.packed:
+            meta["width"] = width
+        with open(os.path.splitext(self.path)[0] + ".json", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+
+    def __enter__(self) -> "MaskStackWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def _npy_header(shape: Tuple[int, ...]) -> bytes:
+    """A version 1.0 ``.npy`` uint8 header padded to exactly ``_HEADER_BYTES``."""
+    magic = b"\x93NUMPY\x01\x00"
+    text = "{'descr': '|u1', 'fortran_order': False, 'shape': %r, }" % (shape,)
+    padding = _HEADER_BYTES - len(magic) - 2 - len(text) - 1
+    if padding < 0:
+        raise ValueError(f"shape {shape} does not fit the reserved npy header")
+    header = (text + " " * padding + "\n").encode("latin1")
+    return magic + len(header).to_bytes(2, "little") + header
+
+
+def _chunks(total: int, size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, total, size):
+        yield start, min(total, start + size)
+
+
+def _popcount(block: np.ndarray) -> np.ndarray:
+    """Set bits per frame of a (c, H, Wb) packed block."""
+    return _POPCOUNT[block].reshape(len(block), -1).sum(axis=1, dtype=np.int64)
+
+
+def _centroids(
+    block: np.ndarray, x0: int = 0, y0: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Intensity-weighted (area, cx, cy) per frame, as cv2.moments would give.
+
+    ``block`` is a (c, h, w) window whose top-left pixel is (x0, y0).
+    """
+    cols = block.sum(axis=1, dtype=np.int64)
+    rows = block.sum(axis=2, dtype=np.int64)
+    area = cols.sum(axis=1)
+    m10 = cols @ np.arange(x0, x0 + block.shape[2], dtype=np.int64)
+    m01 = rows @ np.arange(y0, y0 + block.shape[1], dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return area, m10 / area, m01 / area
+
+
+def _boundaries(block: np.ndarray, pad: int) -> np.ndarray:
+    """Boundary pixels of a (c, h, w) mask block, frames stacked vertically.
+
+    Frames are separated by ``pad`` empty rows so later dilations by up to
+    ``pad`` pixels never bleed from one frame into the next.
+    """
+    count, height, width = block.shape
+    tall = np.zeros((count, height + pad, width), dtype=np.uint8)
+    tall[:, :height] = block > 0
+    tall = tall.reshape(count * (height + pad), width)
+    eroded = cv2.erode(
+        tall, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_CONSTANT, borderValue=0
+    )
+    return tall - eroded
+
+
+def _window(
+    occupied: np.ndarray, margin: int, height: int, width: int
+) -> Tuple[int, int, int, int]:
+    """Pixel window (y0, y1, x0, x1) around set bytes of a packed (H, Wb) map."""
+    ys = np.flatnonzero(occupied.any(axis=1))
+    xs = np.flatnonzero(occupied.any(axis=0))
+    y0, y1 = max(0, ys[0] - margin), min(height, ys[-1] + 1 + margin)
+    x0, x1 = max(0, xs[0] * 8 - margin), min(width, (xs[-1] + 1) * 8 + margin)
+    return int(y0), int(y1), int(x0), int(x1)
+
+
+def evaluate_stacks(
+    pred: MaskStack,
+    gt: MaskStack,
+    positions: Optional[np.ndarray] = None,
+    chunk_size: int = 64,
+    boundary_tolerance: Optional[int] = None,
+    boundary: bool = True,
+) -> Dict[str, np.ndarray]:
+    """IoU, centroid error and boundary F-measure for every frame in both stacks.
+
+    Frames are matched by frame index. IoU is computed on the packed bits
+    with a popcount table. Centroid error compares ``positions`` (tracker
+    outputs, (N, 2) aligned with ``pred``) to the truncated GT centroid, as
+    the per-frame logger does; without positions the predicted mask centroid
+    is used. Boundary F follows DAVIS with a tolerance of 0.8% of the image
+    diagonal unless ``boundary_tolerance`` is given (``boundary=False`` skips it).
+    """
+    common, pred_rows, gt_rows = np.intersect1d(
+        pred.frame_indices, gt.frame_indices, assume_unique=True, return_indices=True
+    )
+    if boundary_tolerance is None:
+        boundary_tolerance = max(1, int(round(0.008 * np.hypot(gt.height, gt.width))))
+    disk = cv2.getStructuringElement(
+        cv2.MORPH_ELLIPSE, (2 * boundary_tolerance + 1, 2 * boundary_tolerance + 1)
+    )
+    iou = np.empty(len(common))
+    error = np.full(len(common), np.nan)
+    boundary_f = np.ones(len(common)) if boundary else np.full(len(common), np.nan)
+    pad = boundary_tolerance + 1
+    for start, stop in _chunks(len(common), chunk_size):
+        p_rows, g_rows = pred_rows[start:stop], gt_rows[start:stop]
+        p_packed, g_packed = pred.packed_rows(p_rows), gt.packed_rows(g_rows)
+        intersection = _popcount(p_packed & g_packed)
+        union = _popcount(p_packed | g_packed)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            iou[start:stop] = np.where(
+                union == 0, (intersection == 0).astype(np.float64), intersection / union
+            )
+        occupied = (p_packed | g_packed).any(axis=0)
+        if not occupied.any():
+            continue
+        # Everything below only looks at the chunk's union bounding box (+ tolerance)
+        y0, y1, x0, x1 = _window(occupied, pad, gt.height, gt.width)
+        p_block = pred.values(p_rows, y0, y1, x0, x1)
+        g_block = gt.values(g_rows, y0, y1, x0, x1)
+
+        g_area, g_cx, g_cy = _centroids(g_block, x0, y0)
+        if positions is not None:
+            px, py = positions[p_rows, 0], positions[p_rows, 1]
+        else:
+            _, px, py = _centroids(p_block, x0, y0)
+            px, py = np.trunc(px), np.trunc(py)
+        visible = g_area > 0
+        dx = px[visible] - np.trunc(g_cx[visible])
+        dy = py[visible] - np.trunc(g_cy[visible])
+        error[start:stop][visible] = np.sqrt(dx * dx + dy * dy)
+        if not boundary:
+            continue
+
+        p_edge = _boundaries(p_block, pad)
+        g_edge = _boundaries(g_block, pad)
+        p_near = cv2.dilate(p_edge, disk)
+        g_near = cv2.dilate(g_edge, disk)
+        shape = (stop - start, -1)
+        p_total = p_edge.reshape(shape).sum(axis=1, dtype=np.int64)
+        g_total = g_edge.reshape(shape).sum(axis=1, dtype=np.int64)
+        p_hit = (p_edge & g_near).reshape(shape).sum(axis=1, dtype=np.int64)
+        g_hit = (g_edge & p_near).reshape(shape).sum(axis=1, dtype=np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            precision = np.where(p_total > 0, p_hit / p_total, (g_total == 0).astype(float))
+            recall = np.where(g_total > 0, g_hit / g_total, (p_total == 0).astype(float))
+            boundary_f[start:stop] = np.where(
+                precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0
+            )
+    return {"frame_idx": common, "iou": iou, "centroid_error": error, "boundary_f": boundary_f}
+
+
+def summarize_evaluation(result: Dict[str, np.ndarray]) -> Dict[str, float]:
+    def mean(values: np.ndarray) -> float:
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if values.size else float("nan")
+
+    return {
+        "frames": int(len(result["frame_idx"])),
+        "mean_iou": mean(result["iou"]),
+        "mean_centroid_error": mean(result["centroid_error"]),
+        "mean_boundary_f": mean(result["boundary_f"]),
+    }
+
+
+def save_evaluation(path: str, result: Dict[str, np.ndarray]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["frame_idx", "iou", "centroid_error", "boundary_f"])
+        for idx, iou, error, f in zip(
+            result["frame_idx"], result["iou"], result["centroid_error"], result["boundary_f"]
+        ):
+            writer.writerow(
+                [
+                    int(idx),
+                    float(iou),
+                    "" if np.isnan(error) else float(error),
+                    "" if np.isnan(f) else float(f),
+                ]
+            )
+
+
+def merge_into_metrics(csv_path: str, result: Dict[str, np.ndarray]) -> None:
+    """Fill IoU/centroid-error columns of a streamed run from a batch evaluation.
+
+    Rewrites the CSV, the NumPy column chunks, the Parquet file (if the run
+    wrote one) and the summary sidecar so the run looks as if the per-frame
+    loop had computed them. Without pyarrow a Parquet file cannot be
+    rewritten, so it is removed rather than left stale.
+    """
+    lookup = {
+        int(idx): (float(iou), None if np.isnan(error) else float(error))
+        for idx, iou, error in zip(result["frame_idx"], result["iou"], result["centroid_error"])
+    }
+    temp_path = csv_path + ".tmp"
+    with open(csv_path, newline="", encoding="utf-8") as src, open(
+        temp_path, "w", newline="", encoding="utf-8"
+    ) as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        header = next(reader)
+        writer.writerow(header)
+        iou_col, error_col = header.index("iou"), header.index("centroid_error")
+        for row in reader:
+            iou, error = lookup.get(int(row[0]), (None, None))
+            row[iou_col] = "" if iou is None else repr(iou)
+            row[error_col] = "" if error is None else repr(error)
+            writer.writerow(row)
+    os.replace(temp_path, csv_path)
+
+    parquet = parquet_path(csv_path)
+    parquet_writer = None
+    if os.path.exists(parquet) and pq is None:
+        os.remove(parquet)
+        print(f"Removed stale {parquet}: rewriting it with evaluation results requires pyarrow")
+    for chunk_path in sorted(glob.glob(os.path.join(columns_dir(csv_path), "chunk_*.npy"))):
+        table = np.load(chunk_path)
+        for row in table:
+            iou, error = lookup.get(int(row["frame_idx"]), (None, None))
+            row["iou"] = np.nan if iou is None else iou
+            row["centroid_error"] = np.nan if error is None else error
+        np.save(chunk_path, table)
+        if os.path.exists(parquet):
+            # Same chunk-per-row-group layout as MetricsLogger writes
+            arrow = pa.table({name: table[name] for name in table.dtype.names})
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(parquet + ".tmp", arrow.schema)
+            parquet_writer.write_table(arrow)
+    if parquet_writer is not None:
+        parquet_writer.close()
+        os.replace(parquet + ".tmp", parquet)
+
+    sidecar = summary_path(csv_path)
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as handle:
+            summary = json.load(handle)
+        # Same accumulation order as the running logger, so means match exactly
+        ious = [lookup[idx][0] for idx in sorted(lookup)]
+        errors = [lookup[idx][1] for idx in sorted(lookup) if lookup[idx][1] is not None]
+        summary["mean_iou"] = sum(ious) / len(ious) if ious else float("nan")
+        summary["mean_centroid_error"] = sum(errors) / len(errors) if errors else float("nan")
+        summary["mean_boundary_f"] = summarize_evaluation(result)["mean_boundary_f"]
+        with open(sidecar, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Batch-evaluate predicted mask stacks against ground truth"
+    )
+    parser.add_argument("--pred", required=True, help="Predicted mask stack (.npy)")
+    parser.add_argument("--gt", required=True, help="Ground-truth mask stack (.npy)")
+    parser.add_argument(
+        "--positions",
+        default=None,
+        help="Tracker positions (.npy, N x 2) for centroid error; mask centroids otherwise",
+    )
+    parser.add_argument("--chunk", type=int, default=64, help="Frames per vectorized pass")
+    parser.add_argument(
+        "--tolerance", type=int, default=None, help="Boundary match tolerance in pixels"
+    )
+    parser.add_argument("--output", default=None, help="Per-frame results CSV")
+    args = parser.parse_args()
+
+    positions = np.load(args.positions) if args.positions else None
+    result = evaluate_stacks(
+        MaskStack.open(args.pred),
+        MaskStack.open(args.gt),
+        positions=positions,
+        chunk_size=args.chunk,
+        boundary_tolerance=args.tolerance,
+    )
+    if args.output:
+        save_evaluation(args.output, result)
+        print(f"Per-frame evaluation saved to {args.output}")
+    for key, value in summarize_evaluation(result).items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from memory_manager import MemoryManager
+from metrics import MetricsLogger
+from occlusion_handler import KalmanTracker
+from pipeline import _track_frame
+from prediction_cache import CachedPredictor
+from quality_controller import QualityController
+from sam2_model import SAM2Predictor
+from video_loader import VideoLoader
+
+RESULT_FIELDS = [
+    "video",
+    "config",
+    "quality",
+    "memory_capacity",
+    "window_size",
+    "min_samples",
+    "process_noise",
+    "frames",
+    "mean_iou",
+    "mean_centroid_error",
+    "mean_quality",
+    "tracking_ratio",
+    "occluded_frames",
+    "track_seconds",
+]
+
+
+@dataclass(frozen=True)
+class ExperimentConfig:
+    """One ablation setting; ``memory_capacity=0`` disables memory recovery."""
+
+    quality: bool = True
+    memory_capacity: int = 25
+    window_size: int = 15
+    min_samples: int = 5
+    process_noise: float = 0.03
+
+    @property
+    def name(self) -> str:
+        if not self.quality:
+            quality = "q0"
+        else:
+            quality = f"q1_w{self.window_size}_m{self.min_samples}"
+        return f"{quality}_mem{self.memory_capacity}_pn{self.process_noise:g}"
+
+
+def expand_grid(
+    quality: List[bool],
+    memory_capacity: List[int],
+    window_size: List[int],
+    min_samples: List[int],
+    process_noise: List[float],
+) -> List[ExperimentConfig]:
+    """Cartesian product of the axes, skipping settings that cannot differ.
+
+    With quality gating off the controller window is unused, so those
+    combinations collapse into a single config.
+    """
+    configs: Dict[str, ExperimentConfig] = {}
+    for q, mem, window, samples, noise in itertools.product(
+        quality, memory_capacity, window_size, min_samples, process_noise
+    ):
+        if not q:
+            window, samples = ExperimentConfig.window_size, ExperimentConfig.min_samples
+        config = ExperimentConfig(q, mem, window, samples, noise)
+        configs.setdefault(config.name, config)
+    return list(configs.values())
+
+
+class _ConfigRun:
+    """Per-config tracker state fed from the shared decode/predict loop."""
+
+    def __init__(self, config: ExperimentConfig, metrics_path: Optional[str] = None):
+        self.config = config
+        self.tracker = KalmanTracker(process_noise=config.process_noise)
+        self.quality_controller = (
+            QualityController(window_size=config.window_size, min_samples=config.min_samples)
+            if config.quality
+            else None
+        )
+        self.memory_manager = (
+            MemoryManager(capacity=config.memory_capacity) if config.memory_capacity > 0 else None
+        )
+        self.logger = MetricsLogger(path=metrics_path)
+        self.seconds = 0.0
+
+
+def run_video(
+    video_path: str,
+    configs: List[ExperimentConfig],
+    output_dir: Optional[str] = None,
+    predictor_kind: str = "mock",
+    checkpoint: Optional[str] = None,
+    model_config: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> dict:
+    """Decode and predict each frame once, then fan it out to every config.
+
+    Predictions are treated as read-only by the tracker, quality controller
+    and memory manager, so one ``(masks, scores)`` pair is safely shared.
+    Per-config metrics CSVs land in ``output_dir/<config>/metrics`` so
+    ``scripts/summarize_metrics.py`` can read them like pipeline runs.
+    """
+    predictor = SAM2Predictor(
+        model_path=checkpoint, mock=predictor_kind == "mock", config=model_config
+    )
+    if cache_dir is not None:
+        with VideoLoader(video_path) as video:
+            predictor = CachedPredictor(predictor, cache_dir, video.fingerprint())
+    runs = [
+        _ConfigRun(
+            config,
+            None
+            if output_dir is None
+            else os.path.join(output_dir, config.name, "metrics", "run_metrics.csv"),
+        )
+        for config in configs
+    ]
+    shared_seconds = 0.0
+    clock = time.perf_counter
+    with VideoLoader(video_path) as video:
+        frames = video.stream_frames()
+        while True:
+            start = clock()
+            item = next(frames, None)
+            if item is None:
+                break
+            frame, idx, gt_mask = item
+            prediction = predictor.predict(frame, idx)
+            shared_seconds += clock() - start
+            for run in runs:
+                start = clock()
+                _track_frame(
+                    frame=frame,
+                    idx=idx,
+                    gt_mask=gt_mask,
+                    predictor=predictor,
+                    quality_controller=run.quality_controller,
+                    tracker=run.tracker,
+                    memory_manager=run.memory_manager,
+                    metrics_logger=run.logger,
+                    prediction=prediction,
+                )
+                run.seconds += clock() - start
+
+    rows = []
+    for run in runs:
+        run.logger.close()
+        if run.logger.path is not None:
+            # Same layout as pipeline runs, so the results index can group by video/config
+            config_path = os.path.join(os.path.dirname(run.logger.path), "run_config.json")
+            with open(config_path, "w", encoding="utf-8") as handle:
+                json.dump(
+                    {
+                        "video": os.path.basename(video_path),
+                        "config": run.config.name,
+                        "settings": asdict(run.config),
+                    },
+                    handle,
+                    indent=2,
+                )
+        summary = run.logger.summary.as_dict()
+        rows.append(
+            {
+                "config": run.config.name,
+                "quality": int(run.config.quality),
+                "memory_capacity": run.config.memory_capacity,
+                "window_size": run.config.window_size,
+                "min_samples": run.config.min_samples,
+                "process_noise": run.config.process_noise,
+                **{field: summary[field] for field in RESULT_FIELDS if field in summary},
+                "track_seconds": run.seconds,
+            }
+        )
+    return {
+        "video": video_path,
+        "shared_seconds": shared_seconds,
+        "rows": rows,
+        "cache": predictor.stats() if cache_dir is not None else None,
+    }
+
+
+def _run_job(job: tuple) -> dict:
+    return run_video(*job)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run an ablation grid over one or more videos, decoding each once"
+    )
+    parser.add_argument(
+        "--videos",
+        nargs="+",
+        default=["input_video.mp4"],
+        help="Input videos relative to project root (missing files use dummy frames)",
+    )
+    parser.add_argument("--name", default="ablation", help="Results go to artifacts/experiments/<name>")
+    parser.add_argument(
+        "--quality", nargs="+", choices=["on", "off"], default=["on", "off"]
+    )
+    parser.add_argument("--memory-capacity", type=int, nargs="+", default=[25, 0])
+    parser.add_argument("--window-size", type=int, nargs="+", default=[15])
+    parser.add_argument("--min-samples", type=int, nargs="+", default=[5])
+    parser.add_argument("--process-noise", type=float, nargs="+", default=[0.03])
+    parser.add_argument(
+        "--predictor",
+        choices=["mock", "sam2"],
+        default="mock",
+        help="Mask predictor shared by every config",
+    )
+    parser.add_argument("--checkpoint", default=None, help="SAM 2 checkpoint (sam2 predictor)")
+    parser.add_argument("--model-config", default=None, help="SAM 2 model config (sam2 predictor)")
+    parser.add_argument(
+        "--prediction-cache",
+        default=None,
+        help="Reuse predictor outputs from this on-disk cache across runs",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Videos processed concurrently (default: one per video, capped at CPU count)",
+    )
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output_dir = os.path.join(project_dir, "artifacts", "experiments", args.name)
+    configs = expand_grid(
+        [value == "on" for value in args.quality],
+        args.memory_capacity,
+        args.window_size,
+        args.min_samples,
+        args.process_noise,
+    )
+    jobs = []
+    for video in args.videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        jobs.append(
+            (
+                os.path.join(project_dir, video),
+                configs,
+                os.path.join(output_dir, stem),
+                args.predictor,
+                args.checkpoint,
+                args.model_config,
+                args.prediction_cache,
+            )
+        )
+    workers = min(len(jobs), args.workers or os.cpu_count() or 1)
+    print(f"Running {len(configs)} configs x {len(jobs)} videos on {workers} workers")
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_job, jobs))
+    else:
+        results = [_run_job(job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, "results.csv")
+    with open(results_path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            stem = os.path.splitext(os.path.basename(result["video"]))[0]
+            for row in result["rows"]:
+                writer.writerow({"video": stem, **row})
+
+    for result in results:
+        shared = result["shared_seconds"]
+        tracked = sum(row["track_seconds"] for row in result["rows"])
+        print(
+            f"{os.path.basename(result['video'])}: decode+predict {shared:.2f}s once "
+            f"(saved {shared * (len(configs) - 1):.2f}s vs separate runs), "
+            f"tracking {tracked:.2f}s across {len(configs)} configs"
+        )
+        if result["cache"] is not None:
+            print(
+                f"  prediction cache: {result['cache']['hits']} hits, "
+                f"{result['cache']['misses']} misses"
+            )
+        for row in result["rows"]:
+            print(
+                f"  {row['config']:<28} IoU {row['mean_iou']:.4f}  "
+                f"centroid {row['mean_centroid_error']:.2f}px  "
+                f"tracking {row['tracking_ratio']:.2f}"
+            )
+    print(f"Finished in {elapsed:.2f}s. Results saved to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
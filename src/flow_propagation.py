@@ -0,0 +1,237 @@
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from mask_stats import MaskStats
+from packed_mask import mask_window
+
+Window = Tuple[int, int, int, int]
+
+
+class FlowPropagator:
+    """Carries the last reliable mask through an occlusion with sparse optical flow.
+
+    On every reliable frame ``remember`` keeps a grey crop of a window around
+    the mask, which is cheap because feature detection is deferred. When an
+    occlusion starts, corners are detected inside the remembered mask and
+    followed frame to frame with pyramidal Lucas-Kanade. The tracked points
+    fit a similarity (or full affine) transform with RANSAC, and the
+    remembered mask is warped by the accumulated transform.
+
+    All image work happens in a fixed-size window around the object, which
+    moves with the estimated displacement. Each frame's grey window is kept
+    as the previous image for the next frame, so every frame is cropped and
+    converted once. OpenCV's Python binding does not accept prebuilt
+    pyramids for ``calcOpticalFlowPyrLK``, so the window pyramids themselves
+    are built inside the LK call. Points hidden by the
+    occluder fail the LK status or error checks or become RANSAC outliers,
+    so the shape is fitted from the visible part only. When fewer than half
+    of ``max_points`` remain, new corners are seeded inside the currently
+    warped mask, which keeps the fit alive as the object slides further
+    behind the occluder. ``propagate`` returns
+    None when too few points survive, or when the warped mask's centroid
+    strays from the caller's expected position by more than ``max_drift``
+    times the object size (typically points stuck on the occluder's edge).
+    The caller then falls back to its other recovery paths.
+    """
+
+    def __init__(
+        self,
+        model: str = "similarity",
+        max_points: int = 64,
+        min_points: int = 6,
+        margin: float = 0.5,
+        min_margin: int = 16,
+        levels: int = 3,
+        win_size: int = 15,
+        max_error: float = 30.0,
+        ransac_threshold: float = 2.0,
+        max_drift: float = 0.25,
+    ):
+        if model not in ("similarity", "affine"):
+            raise ValueError("model must be 'similarity' or 'affine'")
+        self.model = model
+        self.max_points = max_points
+        self.min_points = min_points
+        self.margin = margin
+        self.min_margin = min_margin
+        self.levels = levels
+        self.win_size = (win_size, win_size)
+        self.max_error = max_error
+        self.ransac_threshold = ransac_threshold
+        self.max_drift = max_drift
+        self.frames = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self._reference = None
+        self._reset_track()
+
+    def _reset_track(self) -> None:
+        self._active = False
+        self._failed = False
+        self._points = None
+        self._previous = None
+        self._window: Optional[Window] = None
+        self._transform = None
+
+    def remember(self, frame: np.ndarray, mask: np.ndarray, stats: Optional[MaskStats] = None) -> None:
+        """Keep the window around a reliable mask as the reference for the next occlusion."""
+        x, y, w, h = MaskStats.of(mask, stats).bbox
+        if w == 0 or h == 0:
+            return
+        window = self._window_around(frame.shape, x + w / 2.0, y + h / 2.0, w, h)
+        wx, wy, ww, wh = window
+        gray = cv2.cvtColor(frame[wy : wy + wh, wx : wx + ww], cv2.COLOR_BGR2GRAY)
+        self._reference = (gray, window, np.array(mask_window(mask, x, y, w, h)), (x, y))
+        self._reset_track()
+
+    def propagate(
+        self,
+        frame: np.ndarray,
+        velocity: Tuple[float, float] = (0.0, 0.0),
+        expected: Optional[Tuple[float, float]] = None,
+    ) -> Optional[np.ndarray]:
+        """Warp the remembered mask into ``frame``; None when flow cannot be trusted."""
+        if self._reference is None or self._failed:
+            return None
+        start = time.perf_counter()
+        self.frames += 1
+        mask = self._step(frame, velocity)
+        if mask is not None and expected is not None and self._drifted(mask, expected):
+            mask = None
+        if mask is None:
+            self.failures += 1
+            self._failed = True
+        self.seconds += time.perf_counter() - start
+        return mask
+
+    def _drifted(self, mask: np.ndarray, expected: Tuple[float, float]) -> bool:
+        centroid = MaskStats(mask).centroid
+        if centroid is None:
+            return True
+        h, w = self._reference[2].shape
+        distance = np.hypot(centroid[0] - expected[0], centroid[1] - expected[1])
+        return distance > self.max_drift * max(w, h)
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "failures": self.failures,
+            "mean_ms": self.seconds / self.frames * 1000.0 if self.frames else 0.0,
+        }
+
+    def _window_around(self, frame_shape, cx: float, cy: float, w: int, h: int) -> Window:
+        height, width = frame_shape[:2]
+        pad = max(self.min_margin, int(self.margin * max(w, h)))
+        ww = min(width, w + 2 * pad)
+        wh = min(height, h + 2 * pad)
+        return self._place(frame_shape, cx, cy, ww, wh)
+
+    @staticmethod
+    def _place(frame_shape, cx: float, cy: float, ww: int, wh: int) -> Window:
+        height, width = frame_shape[:2]
+        x = int(round(min(max(cx - ww / 2.0, 0), width - ww)))
+        y = int(round(min(max(cy - wh / 2.0, 0), height - wh)))
+        return x, y, ww, wh
+
+    def _start(self) -> bool:
+        gray, window, mask_crop, (mx, my) = self._reference
+        wx, wy, ww, wh = window
+        feature_mask = np.zeros_like(gray)
+        h, w = mask_crop.shape
+        feature_mask[my - wy : my - wy + h, mx - wx : mx - wx + w] = mask_crop
+        corners = cv2.goodFeaturesToTrack(
+            gray, self.max_points, 0.01, 3, mask=feature_mask, blockSize=5
+        )
+        if corners is None or len(corners) < self.min_points:
+            return False
+        self._points = corners.reshape(-1, 2) + np.float32([wx, wy])
+        self._previous = gray
+        self._window = window
+        self._transform = np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float64)
+        self._active = True
+        return True
+
+    def _step(self, frame: np.ndarray, velocity: Tuple[float, float]) -> Optional[np.ndarray]:
+        if not self._active and not self._start():
+            return None
+        px, py, ww, wh = self._window
+        vx, vy = velocity
+        window = self._place(frame.shape, px + ww / 2.0 + vx, py + wh / 2.0 + vy, ww, wh)
+        nx, ny = window[0], window[1]
+        gray = cv2.cvtColor(frame[ny : ny + wh, nx : nx + ww], cv2.COLOR_BGR2GRAY)
+
+        prev_local = (self._points - np.float32([px, py])).reshape(-1, 1, 2)
+        guess = (self._points + np.float32([vx, vy]) - np.float32([nx, ny])).reshape(-1, 1, 2)
+        tracked, status, error = cv2.calcOpticalFlowPyrLK(
+            self._previous,
+            gray,
+            prev_local,
+            guess,
+            winSize=self.win_size,
+            maxLevel=self.levels,
+            flags=cv2.OPTFLOW_USE_INITIAL_FLOW,
+        )
+        tracked = tracked.reshape(-1, 2)
+        good = (status.ravel() == 1) & (error.ravel() < self.max_error)
+        good &= (tracked[:, 0] >= 0) & (tracked[:, 0] < ww) & (tracked[:, 1] >= 0) & (tracked[:, 1] < wh)
+        if good.sum() < self.min_points:
+            return None
+        src = self._points[good]
+        dst = tracked[good] + np.float32([nx, ny])
+        estimate = cv2.estimateAffinePartial2D if self.model == "similarity" else cv2.estimateAffine2D
+        step, inliers = estimate(
+            src, dst, method=cv2.RANSAC, ransacReprojThreshold=self.ransac_threshold
+        )
+        if step is None or inliers is None or inliers.sum() < self.min_points:
+            return None
+        inliers = inliers.ravel().astype(bool)
+        self._points = dst[inliers]
+        self._previous = gray
+        self._window = window
+        self._transform = _compose(step, self._transform)
+        mask = self._warp_reference(frame.shape)
+        if mask is not None and len(self._points) < self.max_points // 2:
+            self._replenish(gray, window, mask)
+        return mask
+
+    def _replenish(self, gray: np.ndarray, window: Window, mask: np.ndarray) -> None:
+        wx, wy, ww, wh = window
+        feature_mask = mask[wy : wy + wh, wx : wx + ww].copy()
+        for x, y in self._points - np.float32([wx, wy]):
+            cv2.circle(feature_mask, (int(x), int(y)), 3, 0, -1)
+        corners = cv2.goodFeaturesToTrack(
+            gray, self.max_points - len(self._points), 0.01, 3, mask=feature_mask, blockSize=5
+        )
+        if corners is not None:
+            self._points = np.vstack(
+                [self._points, corners.reshape(-1, 2) + np.float32([wx, wy])]
+            )
+
+    def _warp_reference(self, frame_shape) -> Optional[np.ndarray]:
+        _, _, mask_crop, (mx, my) = self._reference
+        height, width = frame_shape[:2]
+        h, w = mask_crop.shape
+        # Reference crop coordinates -> frame coordinates
+        transform = _compose(self._transform, np.array([[1, 0, mx], [0, 1, my]], np.float64))
+        corners = np.array([[0, 0, 1], [w, 0, 1], [0, h, 1], [w, h, 1]], np.float64) @ transform.T
+        x0 = max(0, int(np.floor(corners[:, 0].min())))
+        y0 = max(0, int(np.floor(corners[:, 1].min())))
+        x1 = min(width, int(np.ceil(corners[:, 0].max())) + 1)
+        y1 = min(height, int(np.ceil(corners[:, 1].max())) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        transform[:, 2] -= (x0, y0)
+        warped = cv2.warpAffine(mask_crop, transform, (x1 - x0, y1 - y0), flags=cv2.INTER_NEAREST)
+        mask = np.zeros((height, width), dtype=mask_crop.dtype)
+        mask[y0:y1, x0:x1] = warped
+        return mask
+
+
+def _compose(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """2x3 affine ``outer`` applied after ``inner``."""
+    result = outer[:, :2] @ inner
+    result[:, 2] += outer[:, 2]
+    return result
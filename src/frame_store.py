@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from evaluation import MaskStack, MaskStackWriter
+
+INDEX_FILE = "index.json"
+FRAMES_FILE = "frames.npy"
+GT_FILE = "gt_masks.npy"
+
+
+class FrameStore:
+    """Decoded frames and bit-packed GT masks, memory-mapped from a store directory.
+
+    ``frames.npy`` is an ``(N, H, W, 3)`` uint8 array and ``gt_masks.npy`` a
+    packed ``MaskStack``; ``index.json`` holds the size, frame rate, source
+    fingerprint and per-frame timestamps. Everything is mapped read-only, so
+    frames are zero-copy views into the OS page cache, shared by every
+    process that opens the same store, and any frame is one index away.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), encoding="utf-8") as handle:
+            self.index = json.load(handle)
+        self.frames = np.load(os.path.join(path, FRAMES_FILE), mmap_mode="r")
+        self.timestamps = np.asarray(self.index["timestamps"], dtype=np.float64)
+        gt_path = self.gt_stack_path(path)
+        self.gt = MaskStack.open(gt_path) if gt_path else None
+        self._gt_rows = (
+            {int(idx): row for row, idx in enumerate(self.gt.frame_indices)} if self.gt else {}
+        )
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        # index.json is written last, so a half-built store is not picked up
+        return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+    @staticmethod
+    def gt_stack_path(path: str) -> Optional[str]:
+        """The store's packed GT stack, usable wherever a ``--gt-stack`` is accepted."""
+        gt_path = os.path.join(path, GT_FILE)
+        return gt_path if FrameStore.is_store(path) and os.path.isfile(gt_path) else None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.index["width"], self.index["height"]
+
+    @property
+    def fps(self) -> Optional[float]:
+        return self.index["fps"]
+
+    @property
+    def fingerprint(self) -> str:
+        return self.index["fingerprint"]
+
+    def frame(self, frame_idx: int) -> np.ndarray:
+        """Read-only view of one frame; copy it before drawing on it."""
+        return self.frames[frame_idx]
+
+    def gt_mask(self, frame_idx: int) -> Optional[np.ndarray]:
+        """Unpacked 0/255 GT mask for ``frame_idx``, or None when the store has none."""
+        row = self._gt_rows.get(frame_idx)
+        if row is None:
+            return None
+        mask = np.unpackbits(self.gt.data[row], axis=-1, count=self.gt.width)
+        mask *= 255
+        return mask
+
+
+def build_store(
+    video_path: str,
+    store_dir: str,
+    resize_dim: Optional[Tuple[int, int]] = (640, 480),
+    gt_path: Optional[str] = None,
+    backend: str = "opencv",
+    threads: Optional[int] = None,
+    fallback_fps: float = 20.0,
+) -> dict:
+    """Decode ``video_path`` once into a frame store at ``store_dir``; returns its index.
+
+    GT comes from ``gt_path`` (a mask stack) when given, otherwise from the
+    loader itself (the synthetic clip provides it). Timestamps are the
+    decoder's presentation times, or ``idx / fps`` when the source has none.
+    """
+    # Imported lazily: video_loader imports this module for its store backend
+    from video_loader import VideoLoader
+
+    os.makedirs(store_dir, exist_ok=True)
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    frames = MaskStackWriter(os.path.join(store_dir, FRAMES_FILE), packed=False)
+    gt = MaskStackWriter(os.path.join(store_dir, GT_FILE))
+    timestamps = []
+    with VideoLoader(video_path, resize_dim, backend=backend, threads=threads, buffers=1) as video:
+        fps = video.fps()
+        fingerprint = video.fingerprint()
+        width, height = video.output_size()
+        for frame, idx, gt_mask in video.stream_frames():
+            frames.append(idx, frame)
+            if gt_path is None and gt_mask is not None:
+                gt.append(idx, gt_mask)
+            timestamp = video.timestamp()
+            timestamps.append(timestamp if timestamp is not None else idx / (fps or fallback_fps))
+    frames.close()
+    if gt_path is not None:
+        stack = MaskStack.open(gt_path)
+        if (stack.width, stack.height) != (width, height):
+            raise ValueError(
+                f"GT stack is {stack.width}x{stack.height} but frames are {width}x{height}"
+            )
+        for row, idx in enumerate(stack.frame_indices):
+            gt.append(int(idx), stack.values(np.array([row]), 0, height, 0, width)[0])
+    gt.close()
+    if not gt.frame_indices:
+        for suffix in (".npy", ".json"):
+            os.remove(os.path.join(store_dir, os.path.splitext(GT_FILE)[0] + suffix))
+
+    index = {
+        "source": os.path.abspath(video_path),
+        "fingerprint": fingerprint,
+        "frames": len(frames.frame_indices),
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "gt_frames": len(gt.frame_indices),
+        "timestamps": timestamps,
+    }
+    with open(index_path, "w", encoding="utf-8") as handle:
+        json.dump(index, handle)
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Decode a video (plus optional GT) once into a memory-mapped frame store"
+    )
+    parser.add_argument("--video", default="input_video.mp4", help="Source video")
+    parser.add_argument("--out", required=True, help="Store directory (pass it as --video later)")
+    parser.add_argument("--gt", default=None, help="Ground-truth mask stack (.npy) to pack in")
+    parser.add_argument(
+        "--keep-source-size",
+        action="store_true",
+        help="Store frames at the source resolution instead of 640x480",
+    )
+    parser.add_argument("--decoder", choices=["opencv", "pyav"], default="opencv")
+    parser.add_argument("--decode-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build_store(
+        args.video,
+        args.out,
+        resize_dim=None if args.keep_source_size else (640, 480),
+        gt_path=args.gt,
+        backend=args.decoder,
+        threads=args.decode_threads,
+    )
+    frames_bytes = os.path.getsize(os.path.join(args.out, FRAMES_FILE))
+    print(
+        f"Stored {index['frames']} frames ({index['width']}x{index['height']}, "
+        f"{frames_bytes / 2**20:.1f} MiB) and {index['gt_frames']} GT masks in {args.out} "
+        f"({time.perf_counter() - started:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
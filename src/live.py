@@ -0,0 +1,261 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from video_loader import VideoLoader
+
+LiveItem = Tuple[np.ndarray, int, Optional[np.ndarray], float]
+
+
+def _parse_source(source: str) -> Union[int, str]:
+    return int(source) if source.isdigit() else source
+
+
+class LiveSource:
+    """Real-time frame feed: a camera index, a stream URL, or a local file replayed at native FPS.
+
+    A reader thread stamps every frame with its capture time and hands it
+    over through a small buffer. When the consumer falls behind, the oldest
+    buffered frame is discarded and counted as dropped, so latency stays
+    bounded instead of growing with a backlog. Files (and the dummy clip when
+    the file is missing) are paced to their frame rate as a camera stand-in.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        resize_dim: Tuple[int, int] = (640, 480),
+        fallback_fps: float = 20.0,
+        buffer_size: int = 1,
+        max_seconds: Optional[float] = None,
+        notify: Optional[Callable[[], None]] = None,
+    ):
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be >= 1")
+        self.source = _parse_source(source)
+        self.resize_dim = resize_dim
+        self.fallback_fps = fallback_fps
+        self.max_seconds = max_seconds
+        # Called from the capture thread after each frame (and at end of stream)
+        self.notify = notify
+        self.fps = fallback_fps
+        self.captured = 0
+        self.dropped = 0
+        self._buffer: Deque[LiveItem] = collections.deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._opened = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_file(self) -> bool:
+        return isinstance(self.source, str) and "://" not in self.source
+
+    def __enter__(self) -> "LiveSource":
+        self._thread = threading.Thread(target=self._read, name="live-capture", daemon=True)
+        self._thread.start()
+        # The frame rate is only known once the capture has been opened
+        self._opened.wait()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._ready:
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __iter__(self) -> Iterator[LiveItem]:
+        while True:
+            with self._ready:
+                while not self._buffer and not self._done and not self._stop.is_set():
+                    self._ready.wait(0.1)
+                if self._buffer:
+                    item = self._buffer.popleft()
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield item
+
+    def poll(self) -> Optional[LiveItem]:
+        """The oldest buffered frame, or None right away when nothing is waiting."""
+        with self._ready:
+            if self._buffer:
+                return self._buffer.popleft()
+            if self._error is not None:
+                raise self._error
+            return None
+
+    @property
+    def finished(self) -> bool:
+        """True once the capture has ended and every buffered frame was taken."""
+        with self._ready:
+            return (self._done or self._stop.is_set()) and not self._buffer
+
+    def _push(self, frame: np.ndarray, idx: int, gt_mask: Optional[np.ndarray]) -> None:
+        with self._ready:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((frame, idx, gt_mask, time.perf_counter()))
+            self.captured += 1
+            self._ready.notify()
+        if self.notify is not None:
+            self.notify()
+
+    def _read(self) -> None:
+        try:
+            if self.is_file:
+                self._replay_file()
+            else:
+                self._read_capture()
+        except BaseException as exc:  # surfaced to the consumer
+            self._error = exc
+        finally:
+            self._opened.set()
+            with self._ready:
+                self._done = True
+                self._ready.notify_all()
+            if self.notify is not None:
+                self.notify()
+
+    def _replay_file(self) -> None:
+        with VideoLoader(self.source, self.resize_dim) as video:
+            self.fps = video.fps() or self.fallback_fps
+            self._opened.set()
+            interval = 1.0 / self.fps
+            started = time.perf_counter()
+            for frame, idx, gt_mask in video.stream_frames():
+                due = started + idx * interval
+                if self.max_seconds is not None and due - started >= self.max_seconds:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                if self._stop.is_set():
+                    break
+                self._push(frame, idx, gt_mask)
+
+    def _read_capture(self) -> None:
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                raise RuntimeError(f"Could not open live source {self.source!r}")
+            # Keep the driver-side queue short so reads return the newest frame
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps and fps > 0 else self.fallback_fps
+            self._opened.set()
+            started = time.perf_counter()
+            idx = 0
+            while not self._stop.is_set():
+                if self.max_seconds is not None and time.perf_counter() - started >= self.max_seconds:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self._push(cv2.resize(frame, self.resize_dim), idx, None)
+                idx += 1
+        finally:
+            cap.release()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_live(
+    source: LiveSource,
+    track: Callable[[Tuple], Any],
+    coast: Callable[[Tuple], Any],
+    sink: Callable[[Any], None],
+    deadline_ms: float,
+    max_coast: int = 10,
+    cost_smoothing: float = 0.2,
+) -> Dict[str, Any]:
+    """Process live frames against a per-frame deadline measured from capture.
+
+    A frame is predicted only if the time it already waited plus the
+    expected predict-and-track cost (an exponential moving average of recent
+    predicted frames) fits in the deadline; otherwise it coasts on the
+    tracker without calling the predictor. After ``max_coast`` consecutive
+    coasted frames one frame is predicted regardless, so the filter is
+    re-anchored and the cost estimate refreshed. End-to-end latency runs
+    from capture to the end of ``sink`` (render and encode included).
+    """
+    deadline = deadline_ms / 1000.0
+    clock = time.perf_counter
+    expected_cost: Optional[float] = None
+    coasting = 0
+    coasted = processed = misses = 0
+    latencies: List[float] = []
+    misses_by_second: Dict[int, int] = collections.defaultdict(int)
+    started = clock()
+    try:
+        for frame, idx, gt_mask, captured in source:
+            item = (frame, idx, gt_mask)
+            waited = clock() - captured
+            # The tracker needs one measurement before it has anything to coast on
+            late = expected_cost is not None and waited + expected_cost > deadline
+            if late and coasting < max_coast:
+                result = coast(item)
+                coasting += 1
+                coasted += 1
+            else:
+                predict_start = clock()
+                result = track(item)
+                cost = clock() - predict_start
+                expected_cost = (
+                    cost
+                    if expected_cost is None
+                    else (1 - cost_smoothing) * expected_cost + cost_smoothing * cost
+                )
+                coasting = 0
+            sink(result)
+            processed += 1
+            latency = clock() - captured
+            latencies.append(latency * 1000.0)
+            if latency > deadline:
+                misses += 1
+                misses_by_second[int(captured - started)] += 1
+    except KeyboardInterrupt:
+        print("Live run interrupted; writing report")
+    finally:
+        source.stop()
+    duration = max(clock() - started, 1e-9)
+    seconds = int(duration) + 1
+    per_second = [misses_by_second.get(second, 0) for second in range(seconds)]
+    return {
+        "source": str(source.source),
+        "source_fps": source.fps,
+        "deadline_ms": deadline_ms,
+        "duration_s": duration,
+        "frames_captured": source.captured,
+        "frames_processed": processed,
+        "frames_dropped": source.dropped,
+        "drop_rate": source.dropped / source.captured if source.captured else 0.0,
+        "frames_coasted": coasted,
+        "coast_rate": coasted / processed if processed else 0.0,
+        "deadline_misses": misses,
+        "misses_per_second": misses / duration,
+        "max_misses_in_one_second": max(per_second) if per_second else 0,
+        "misses_per_second_series": per_second,
+        "latency_ms": {
+            "mean": float(np.mean(latencies)) if latencies else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0,
+        },
+        "expected_predict_ms": (expected_cost or 0.0) * 1000.0,
+    }
@@ -0,0 +1,92 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class MaskStats:
+    """Per-mask statistics computed at most once and shared across components.
+
+    Every property scans the mask the first time it is read and is served from
+    cache afterwards. ``saved`` counts the cache hits, i.e. the full-frame
+    passes that components would otherwise have repeated.
+    """
+
+    __slots__ = ("mask", "saved", "_area", "_moments", "_bbox", "_bool")
+
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.saved = 0
+        self._area = None
+        self._moments = None
+        self._bbox = None
+        self._bool = None
+
+    @classmethod
+    def of(cls, mask: Optional[np.ndarray], stats: Optional["MaskStats"] = None):
+        """Reuse ``stats`` when it describes ``mask``, otherwise build new stats."""
+        if mask is None:
+            return None
+        if stats is not None and stats.mask is mask:
+            return stats
+        if isinstance(mask, MaskStats):
+            # A PackedMask carries its own statistics
+            return mask
+        return cls(mask)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.mask.shape
+
+    @property
+    def size(self) -> int:
+        return self.mask.size
+
+    @property
+    def area(self) -> int:
+        if self._area is None:
+            self._area = int(np.count_nonzero(self.mask))
+        else:
+            self.saved += 1
+        return self._area
+
+    @property
+    def moments(self) -> dict:
+        if self._moments is None:
+            self._moments = cv2.moments(self.mask)
+        else:
+            self.saved += 1
+        return self._moments
+
+    @property
+    def centroid(self) -> Optional[Tuple[float, float]]:
+        """Sub-pixel centroid, or None for an empty mask."""
+        moments = self.moments
+        if moments["m00"] == 0:
+            return None
+        return moments["m10"] / moments["m00"], moments["m01"] / moments["m00"]
+
+    @property
+    def centroid_int(self) -> Optional[Tuple[int, int]]:
+        """Centroid truncated to pixels, as drawn and fed to the tracker."""
+        moments = self.moments
+        if moments["m00"] == 0:
+            return None
+        return int(moments["m10"] / moments["m00"]), int(moments["m01"] / moments["m00"])
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        """Tight (x, y, w, h) box around the non-zero pixels."""
+        if self._bbox is None:
+            self._bbox = cv2.boundingRect(self.mask)
+        else:
+            self.saved += 1
+        return self._bbox
+
+    @property
+    def as_bool(self) -> np.ndarray:
+        if self._bool is None:
+            self._bool = self.mask.astype(bool)
+        else:
+            self.saved += 1
+        return self._bool
@@ -1,61 +1,273 @@
+import math
+from collections import deque
+
 import cv2
 import numpy as np
-from collections import deque
+
+from mask_stats import MaskStats
+from packed_mask import PackedMask
 
 
 class MemoryManager:
-    """Keeps high-quality masks and reinstates them during occlusions."""
+    """Keeps high-quality masks and reinstates them during occlusions.
+
+    Masks are stored as tight bounding-box crops together with their
+    precomputed centroid, area and bbox, so an entry costs roughly the object
+    size rather than a full frame. ``capacity`` bounds the number of entries
+    (oldest evicted first) and the optional ``max_bytes`` bounds the stored
+    crop bytes, evicting the lowest-quality entry first. A ``PackedMask`` is
+    kept as is (its packed window is already the crop) and is recalled as a
+    ``PackedMask``.
+
+    Centroids, qualities and frame indices live in a parallel slot index so
+    ``retrieve`` scores every entry with one vectorized argmax. For very large
+    capacities ``spatial_index="grid"`` additionally buckets centroids into a
+    uniform grid and only scores the cells that can still beat the best match.
+    """
+
+    def __init__(self, capacity=20, max_bytes=None, spatial_index=None, cell_size=64.0):
+        if spatial_index not in (None, "grid"):
+            raise ValueError(f"Unknown spatial index: {spatial_index}")
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.spatial_index = spatial_index
+        self.cell_size = float(cell_size)
 
-    def __init__(self, capacity=20):
-        self.buffer = deque(maxlen=capacity)
+        self.centroids = np.zeros((capacity, 2), np.float64)
+        self.qualities = np.zeros(capacity, np.float64)
+        self.frame_indices = np.full(capacity, -1, np.int64)
+        self.valid = np.zeros(capacity, bool)
+        self._sequence = np.zeros(capacity, np.int64)
+        self._areas = np.zeros(capacity, np.int64)
+        self._patches = [None] * capacity
+        self._bboxes = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._order = deque()
+        self._next_sequence = 0
+        self._cells = {}
+        self._cell_extent = None
+        self._quality_cap = -np.inf
 
-    def store(self, frame_idx, mask, quality):
-        if quality <= 0.0 or mask is None:
+        self.stored_bytes = 0
+        self.peak_bytes = 0
+        self.full_frame_bytes = 0
+        self.stores = 0
+        self.evictions = {"capacity": 0, "budget": 0}
+
+    def __len__(self):
+        return len(self._order)
+
+    def store(self, frame_idx, mask, quality, stats=None):
+        # capacity 0 keeps nothing, as a zero-length deque did
+        if self.capacity == 0 or quality <= 0.0 or mask is None:
             return
-        if np.count_nonzero(mask) == 0:
+        stats = MaskStats.of(mask, stats)
+        area = stats.area
+        if area == 0:
             return
-        moments = cv2.moments(mask)
-        if moments["m00"] == 0:
+        centroid = stats.centroid
+        if centroid is None:
             return
-        centroid = (
-            moments["m10"] / moments["m00"],
-            moments["m01"] / moments["m00"],
-        )
-        self.buffer.append(
-            {
-                "frame_idx": frame_idx,
-                "mask": mask.copy(),
-                "quality": float(quality),
-                "centroid": centroid,
-            }
+        x, y, w, h = stats.bbox
+        if isinstance(mask, PackedMask):
+            patch = mask
+        else:
+            patch = mask[y : y + h, x : x + w].copy()
+
+        if not self._free:
+            self._evict(self._order[0], "capacity")
+        slot = self._free.pop()
+        self.centroids[slot] = centroid
+        self.qualities[slot] = float(quality)
+        self.frame_indices[slot] = frame_idx
+        self.valid[slot] = True
+        self._sequence[slot] = self._next_sequence
+        self._next_sequence += 1
+        self._areas[slot] = area
+        self._patches[slot] = patch
+        self._bboxes[slot] = (x, y, w, h)
+        self._order.append(slot)
+        self._quality_cap = max(self._quality_cap, float(quality))
+        if self.spatial_index == "grid":
+            cell = self._cell_of(centroid)
+            self._cells.setdefault(cell, []).append(slot)
+            self._grow_extent(cell)
+
+        self.stores += 1
+        self.stored_bytes += patch.nbytes
+        self.full_frame_bytes = max(self.full_frame_bytes, stats.size)
+        if self.max_bytes is not None:
+            while self.stored_bytes > self.max_bytes and self._order:
+                self._evict(self._lowest_quality_slot(), "budget")
+        self.peak_bytes = max(self.peak_bytes, self.stored_bytes)
+
+    def _lowest_quality_slot(self):
+        qualities = np.where(self.valid, self.qualities, np.inf)
+        tied = np.flatnonzero(qualities == qualities.min())
+        return int(tied[np.argmin(self._sequence[tied])])
+
+    def _evict(self, slot, reason):
+        if slot == self._order[0]:
+            self._order.popleft()
+        else:
+            self._order.remove(slot)
+        if self.spatial_index == "grid":
+            cell = self._cell_of(self.centroids[slot])
+            members = self._cells[cell]
+            members.remove(slot)
+            if not members:
+                del self._cells[cell]
+        self.stored_bytes -= self._patches[slot].nbytes
+        self._patches[slot] = None
+        self._bboxes[slot] = None
+        self.valid[slot] = False
+        self._free.append(slot)
+        self.evictions[reason] += 1
+
+    def _grow_extent(self, cell):
+        # Bounding box of every cell ever occupied; an upper bound for the scan.
+        if self._cell_extent is None:
+            self._cell_extent = [cell[0], cell[1], cell[0], cell[1]]
+            return
+        extent = self._cell_extent
+        extent[0] = min(extent[0], cell[0])
+        extent[1] = min(extent[1], cell[1])
+        extent[2] = max(extent[2], cell[0])
+        extent[3] = max(extent[3], cell[1])
+
+    def _cell_of(self, point):
+        return (
+            math.floor(point[0] / self.cell_size),
+            math.floor(point[1] / self.cell_size),
         )
 
+    def _score(self, slots, px, py):
+        dx = px - self.centroids[slots, 0]
+        dy = py - self.centroids[slots, 1]
+        return self.qualities[slots] - 0.002 * np.sqrt(dx * dx + dy * dy)
+
+    def _pick(self, slots, scores):
+        """Best (score, slot); ties go to the oldest entry like a sequential scan."""
+        best = scores.max()
+        tied = slots[scores == best]
+        return best, int(tied[np.argmin(self._sequence[tied])])
+
+    def _best_slot(self, px, py):
+        slots = np.flatnonzero(self.valid)
+        return self._pick(slots, self._score(slots, px, py))[1]
+
+    def _best_slot_grid(self, px, py):
+        qx, qy = self._cell_of((px, py))
+        x0, y0, x1, y1 = self._cell_extent
+        max_ring = max(abs(qx - x0), abs(qx - x1), abs(qy - y0), abs(qy - y1))
+        best_score, best_slot = -np.inf, -1
+        for ring in range(max_ring + 1):
+            # Entries in ring r are at least r - 1 cells away from the query.
+            if best_slot >= 0:
+                bound = self._quality_cap - 0.002 * self.cell_size * max(ring - 1, 0)
+                if bound < best_score:
+                    break
+            slots = []
+            for cx in range(qx - ring, qx + ring + 1):
+                for cy in range(qy - ring, qy + ring + 1):
+                    if max(abs(cx - qx), abs(cy - qy)) == ring:
+                        slots.extend(self._cells.get((cx, cy), ()))
+            if not slots:
+                continue
+            slots = np.asarray(slots, np.int64)
+            score, slot = self._pick(slots, self._score(slots, px, py))
+            if score > best_score or (
+                score == best_score and self._sequence[slot] < self._sequence[best_slot]
+            ):
+                best_score, best_slot = score, slot
+        return best_slot
+
     def retrieve(self, predicted_point, frame_shape):
-        if not self.buffer or predicted_point is None:
+        if not self._order or predicted_point is None:
             return None
-        best_entry = None
-        best_score = -np.inf
         px = float(predicted_point[0])
         py = float(predicted_point[1])
-        for entry in self.buffer:
-            cx, cy = entry["centroid"]
-            distance = np.linalg.norm([px - cx, py - cy])
-            score = entry["quality"] - 0.002 * distance
-            if score > best_score:
-                best_score = score
-                best_entry = entry
-        if best_entry is None:
-            return None
-        cx, cy = best_entry["centroid"]
-        dx = px - cx
-        dy = py - cy
-        transform = np.float32([[1, 0, dx], [0, 1, dy]])
-        warped = cv2.warpAffine(
-            best_entry["mask"],
-            transform,
-            (frame_shape[1], frame_shape[0]),
-            flags=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_CONSTANT,
-            borderValue=0,
+        if self.spatial_index == "grid":
+            slot = self._best_slot_grid(px, py)
+        else:
+            slot = self._best_slot(px, py)
+        cx, cy = self.centroids[slot]
+        patch = self._patches[slot]
+        if isinstance(patch, PackedMask):
+            # Binary by construction: the bilinear edge of a sub-pixel shift is thresholded
+            shifted, x0, y0 = self._shift_patch(
+                patch.crop(), self._bboxes[slot], px - cx, py - cy
+            )
+            return PackedMask.from_crop(shifted, x0, y0, frame_shape)
+        return self._paste_shifted(patch, self._bboxes[slot], px - cx, py - cy, frame_shape)
+
+    @staticmethod
+    def _shift_patch(patch, bbox, dx, dy):
+        """Translate a stored crop by (dx, dy); returns the crop and its new top-left.
+
+        Fractional shifts warp only the crop (padded by one pixel) by the
+        sub-pixel remainder, which gives the same bilinear result as warping
+        the full-frame mask.
+        """
+        x, y, w, h = bbox
+        dx = float(np.float32(dx))
+        dy = float(np.float32(dy))
+        ix = math.floor(dx)
+        iy = math.floor(dy)
+        fx = dx - ix
+        fy = dy - iy
+        if fx or fy:
+            padded = cv2.copyMakeBorder(patch, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+            transform = np.float32([[1, 0, fx], [0, 1, fy]])
+            patch = cv2.warpAffine(
+                padded,
+                transform,
+                (w + 3, h + 3),
+                flags=cv2.INTER_LINEAR,
+                borderMode=cv2.BORDER_CONSTANT,
+                borderValue=0,
+            )
+            x -= 1
+            y -= 1
+        return patch, x + ix, y + iy
+
+    @classmethod
+    def _paste_shifted(cls, patch, bbox, dx, dy, frame_shape):
+        """Expand a stored crop into a frame-sized mask translated by (dx, dy)."""
+        height, width = frame_shape[:2]
+        output = np.zeros((height, width), dtype=np.uint8)
+        patch, x0, y0 = cls._shift_patch(patch, bbox, dx, dy)
+        ph, pw = patch.shape
+        dst_x0, dst_y0 = max(x0, 0), max(y0, 0)
+        dst_x1, dst_y1 = min(x0 + pw, width), min(y0 + ph, height)
+        if dst_x1 > dst_x0 and dst_y1 > dst_y0:
+            output[dst_y0:dst_y1, dst_x0:dst_x1] = patch[
+                dst_y0 - y0 : dst_y1 - y0, dst_x0 - x0 : dst_x1 - x0
+            ]
+        return output
+
+    def footprint(self):
+        """Memory-footprint report for the current run."""
+        entries = len(self)
+        index_bytes = sum(
+            array.nbytes
+            for array in (
+                self.centroids,
+                self.qualities,
+                self.frame_indices,
+                self.valid,
+                self._sequence,
+                self._areas,
+            )
         )
-        return warped
+        return {
+            "entries": entries,
+            "stores": self.stores,
+            "stored_bytes": self.stored_bytes,
+            "index_bytes": index_bytes,
+            "peak_bytes": self.peak_bytes,
+            "full_frame_equivalent_bytes": entries * self.full_frame_bytes,
+            "max_bytes": self.max_bytes,
+            "evicted_capacity": self.evictions["capacity"],
+            "evicted_budget": self.evictions["budget"],
+        }
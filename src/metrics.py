@@ -1,28 +1,201 @@
 import csv
+import glob
+import json
 import os
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Tuple
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from mask_stats import MaskStats
+from packed_mask import PackedMask
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; only needed for Parquet output
+    pa = None
+    pq = None
+
+FIELDS = (
+    "frame_idx",
+    "status",
+    "quality",
+    "threshold",
+    "norm_area",
+    "iou",
+    "centroid_error",
+    "mask_passes_saved",
+)
+STATUS_WIDTH = 32
+
 
-@dataclass
 class FrameMetrics:
-    frame_idx: int
-    status: str
-    quality: float
-    threshold: float
-    norm_area: float
-    iou: Optional[float]
-    centroid_error: Optional[float]
+    """One frame's metrics; ``__slots__`` keeps each record to a few pointers."""
 
+    __slots__ = FIELDS + ("stage_ms",)
 
-class MetricsLogger:
-    """Accumulates per-frame metrics and exports plots for the report."""
+    def __init__(
+        self,
+        frame_idx: int,
+        status: str,
+        quality: float,
+        threshold: float,
+        norm_area: float,
+        iou: Optional[float],
+        centroid_error: Optional[float],
+        mask_passes_saved: int = 0,
+        stage_ms: Optional[Dict[str, float]] = None,
+    ):
+        self.frame_idx = frame_idx
+        self.status = status
+        self.quality = quality
+        self.threshold = threshold
+        self.norm_area = norm_area
+        self.iou = iou
+        self.centroid_error = centroid_error
+        self.mask_passes_saved = mask_passes_saved
+        self.stage_ms = stage_ms
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"FrameMetrics({values})"
+
+
+class RunningSummary:
+    """Online aggregates matching ``scripts/summarize_metrics.py`` output."""
+
+    __slots__ = (
+        "frames",
+        "iou_sum",
+        "iou_frames",
+        "error_sum",
+        "error_frames",
+        "quality_sum",
+        "threshold_sum",
+        "tracking_frames",
+        "occluded_frames",
+    )
 
     def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def update(self, record: FrameMetrics) -> None:
+        self.frames += 1
+        if record.iou is not None:
+            self.iou_sum += record.iou
+            self.iou_frames += 1
+        if record.centroid_error is not None:
+            self.error_sum += record.centroid_error
+            self.error_frames += 1
+        self.quality_sum += record.quality
+        self.threshold_sum += record.threshold
+        self.tracking_frames += record.status.startswith("Tracking")
+        self.occluded_frames += record.status.startswith("Occluded")
+
+    def as_dict(self) -> Dict[str, float]:
+        def ratio(total: float, count: int) -> float:
+            return total / count if count else float("nan")
+
+        return {
+            "frames": self.frames,
+            "mean_iou": ratio(self.iou_sum, self.iou_frames),
+            "mean_centroid_error": ratio(self.error_sum, self.error_frames),
+            "mean_quality": ratio(self.quality_sum, self.frames),
+            "mean_threshold": ratio(self.threshold_sum, self.frames),
+            "tracking_ratio": ratio(self.tracking_frames, self.frames),
+            "occluded_frames": self.occluded_frames,
+        }
+
+
+def columns_dir(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".columns"
+
+
+def summary_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".summary.json"
+
+
+def parquet_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def load_columns(
+    csv_path: str, names: Optional[Sequence[str]] = None
+) -> Optional[np.ndarray]:
+    """Concatenate the NumPy column chunks written next to a streamed CSV."""
+    chunks = sorted(glob.glob(os.path.join(columns_dir(csv_path), "chunk_*.npy")))
+    if not chunks:
+        return None
+    arrays = [np.load(chunk, mmap_mode="r") for chunk in chunks]
+    if names is not None:
+        arrays = [array[list(names)] for array in arrays]
+    return np.concatenate(arrays)
+
+
+def _column_dtype(stage_names: Sequence[str]) -> np.dtype:
+    return np.dtype(
+        [
+            ("frame_idx", np.int64),
+            ("status", f"U{STATUS_WIDTH}"),
+            ("quality", np.float64),
+            ("threshold", np.float64),
+            ("norm_area", np.float64),
+            ("iou", np.float64),
+            ("centroid_error", np.float64),
+            ("mask_passes_saved", np.int64),
+        ]
+        + [(f"time_{stage}_ms", np.float64) for stage in stage_names]
+    )
+
+
+class MetricsLogger:
+    """Accumulates per-frame metrics and exports plots for the report.
+
+    Without ``path`` records stay in memory until ``save_csv``. With ``path``
+    they stream to disk every ``chunk_size`` frames: rows are appended to the
+    CSV and to NumPy column chunks (plus a Parquet file with ``parquet=True``),
+    only the unflushed chunk stays in memory, and running aggregates are
+    rewritten to a ``.summary.json`` sidecar on each flush.
+
+    When ``await_completion`` is set a record is held back until
+    ``complete()`` attaches its stage timings, which may happen on another
+    thread.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        chunk_size: int = 256,
+        stage_names: Sequence[str] = (),
+        await_completion: bool = False,
+        parquet: bool = False,
+    ):
+        if parquet and pq is None:
+            raise ImportError("Parquet metrics output requires the 'pyarrow' package")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stage_names = tuple(stage_names)
+        self.await_completion = await_completion
+        self.parquet = parquet
+        self.summary = RunningSummary()
         self._records: List[FrameMetrics] = []
+        self._ready = 0
+        self._chunks = 0
+        self._parquet_writer = None
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.makedirs(columns_dir(path), exist_ok=True)
+            for stale in glob.glob(os.path.join(columns_dir(path), "chunk_*.npy")):
+                os.remove(stale)
+            with open(path, "w", newline="", encoding="utf-8") as handle:
+                csv.writer(handle).writerow(self._fieldnames(self.stage_names))
+
+    @property
+    def streaming(self) -> bool:
+        return self.path is not None
 
     def log(
         self,
@@ -33,11 +206,16 @@ class MetricsLogger:
         gt_mask: Optional[np.ndarray],
         predicted_pos: Tuple[int, int],
         gt_pos: Optional[Tuple[int, int]],
+        pred_stats: Optional[MaskStats] = None,
+        gt_stats: Optional[MaskStats] = None,
+        passes_saved: int = 0,
     ) -> None:
         iou = None
         centroid_error = None
         if gt_mask is not None:
-            iou = self._compute_iou(pred_mask, gt_mask)
+            iou = self._compute_iou(
+                pred_mask, gt_mask, pred_stats=pred_stats, gt_stats=gt_stats
+            )
         if gt_pos is not None:
             centroid_error = float(
                 np.linalg.norm(
@@ -52,38 +230,92 @@ class MetricsLogger:
             norm_area=float(quality_info.get("norm_area", 0.0)),
             iou=iou,
             centroid_error=centroid_error,
+            mask_passes_saved=passes_saved,
         )
-        self._records.append(record)
+        self._append(record, ready=not self.await_completion)
+
+    def complete(self, frame_idx: int, stage_ms: Optional[Dict[str, float]]) -> None:
+        """Attach stage timings to a held-back record and release it for flushing."""
+        with self._lock:
+            for record in self._records[self._ready :]:
+                if record.frame_idx == frame_idx:
+                    record.stage_ms = stage_ms
+                    break
+            # Frames complete in order, so everything up to frame_idx is ready
+            while self._ready < len(self._records) and (
+                self._records[self._ready].frame_idx <= frame_idx
+            ):
+                self._ready += 1
+            self._maybe_flush()
+
+    @property
+    def records(self) -> List[FrameMetrics]:
+        with self._lock:
+            pending = list(self._records)
+        if not self.streaming:
+            return pending
+        return read_csv_records(self.path) + pending
+
+    def extend(self, records: List[FrameMetrics]) -> None:
+        """Append records produced elsewhere (e.g. by shard workers)."""
+        for record in records:
+            self._append(record, ready=True)
+
+    def close(self) -> None:
+        """Flush every remaining record and finalise the summary sidecar."""
+        if not self.streaming:
+            return
+        with self._lock:
+            self._ready = len(self._records)
+            self._flush()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+            self._write_summary(final=True)
 
     def save_csv(self, path: str) -> None:
+        if self.streaming:
+            self.close()
+            if os.path.abspath(path) != os.path.abspath(self.path):
+                with open(self.path, encoding="utf-8") as src, open(
+                    path, "w", encoding="utf-8"
+                ) as dst:
+                    dst.write(src.read())
+            return
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        stage_names: List[str] = []
+        for record in self._records:
+            for stage in record.stage_ms or ():
+                if stage not in stage_names:
+                    stage_names.append(stage)
         with open(path, "w", newline="", encoding="utf-8") as handle:
-            writer = csv.DictWriter(
-                handle,
-                fieldnames=list(FrameMetrics.__annotations__.keys()),
-            )
-            writer.writeheader()
-            for record in self._records:
-                writer.writerow(asdict(record))
+            writer = csv.writer(handle)
+            writer.writerow(self._fieldnames(stage_names))
+            writer.writerows(self._row(record, stage_names) for record in self._records)
+
+    def plot_curves(self, path: str, max_points: int = 20000) -> None:
+        # Imported lazily: pyplot costs ~0.7s of startup that plot-free runs never need
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
 
-    def plot_curves(self, path: str) -> None:
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        frames = [r.frame_idx for r in self._records]
-        ious = [r.iou for r in self._records]
-        errors = [r.centroid_error for r in self._records]
-        quality = [r.quality for r in self._records]
-        threshold = [r.threshold for r in self._records]
+        columns = self._plot_columns()
+        if len(columns["frame_idx"]) > max_points:
+            # Long streams: decimate so the figure stays cheap to draw
+            step = -(-len(columns["frame_idx"]) // max_points)
+            columns = {name: values[::step] for name, values in columns.items()}
+        frames = columns["frame_idx"]
+        ious = columns["iou"]
+        errors = columns["centroid_error"]
         plt.figure(figsize=(10, 6))
-        if any(v is not None for v in ious):
-            plt.plot(frames, [v if v is not None else np.nan for v in ious], label="IoU")
-        if any(v is not None for v in errors):
-            plt.plot(
-                frames,
-                [v if v is not None else np.nan for v in errors],
-                label="Centroid Error",
-            )
-        plt.plot(frames, quality, label="Quality", linestyle="--")
-        plt.plot(frames, threshold, label="Adaptive Threshold", linestyle=":")
+        if not np.all(np.isnan(ious)):
+            plt.plot(frames, ious, label="IoU")
+        if not np.all(np.isnan(errors)):
+            plt.plot(frames, errors, label="Centroid Error")
+        plt.plot(frames, columns["quality"], label="Quality", linestyle="--")
+        plt.plot(frames, columns["threshold"], label="Adaptive Threshold", linestyle=":")
         plt.xlabel("Frame")
         plt.ylabel("Metric Value")
         plt.title("SAM2-Refine+ Tracking Metrics")
@@ -93,12 +325,144 @@ class MetricsLogger:
         plt.savefig(path, dpi=200)
         plt.close()
 
+    def _append(self, record: FrameMetrics, ready: bool) -> None:
+        with self._lock:
+            self._records.append(record)
+            self.summary.update(record)
+            if ready and self._ready == len(self._records) - 1:
+                self._ready += 1
+            self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if self.streaming and self._ready >= self.chunk_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Write the ready prefix of the buffer; caller holds the lock."""
+        chunk = self._records[: self._ready]
+        if not chunk:
+            return
+        with open(self.path, "a", newline="", encoding="utf-8") as handle:
+            csv.writer(handle).writerows(self._row(record, self.stage_names) for record in chunk)
+        table = self._to_columns(chunk)
+        np.save(os.path.join(columns_dir(self.path), f"chunk_{self._chunks:06d}.npy"), table)
+        if self.parquet:
+            arrow = pa.table({name: table[name] for name in table.dtype.names})
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(parquet_path(self.path), arrow.schema)
+            self._parquet_writer.write_table(arrow)
+        self._chunks += 1
+        del self._records[: self._ready]
+        self._ready = 0
+        self._write_summary(final=False)
+
+    def _write_summary(self, final: bool) -> None:
+        summary = self.summary.as_dict()
+        if final and self.stage_names:
+            summary.update(self._stage_summary())
+        summary["complete"] = final
+        temp_path = summary_path(self.path) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+        os.replace(temp_path, summary_path(self.path))
+
+    def _stage_summary(self) -> Dict[str, float]:
+        """Per-stage mean/p95 and effective FPS from the timing columns only."""
+        names = [f"time_{stage}_ms" for stage in self.stage_names]
+        table = load_columns(self.path, names)
+        stats: Dict[str, float] = {}
+        if table is None:
+            return stats
+        for stage in self.stage_names:
+            if stage == "wall":
+                continue
+            values = table[f"time_{stage}_ms"]
+            values = values[~np.isnan(values)]
+            if values.size:
+                stats[f"{stage}_mean_ms"] = float(values.mean())
+                stats[f"{stage}_p95_ms"] = float(np.percentile(values, 95))
+        if "wall" in self.stage_names:
+            finished = np.sort(table["time_wall_ms"][~np.isnan(table["time_wall_ms"])])
+            if finished.size > 1 and finished[-1] > finished[0]:
+                stats["effective_fps"] = (finished.size - 1) * 1e3 / (finished[-1] - finished[0])
+        return stats
+
+    def _plot_columns(self) -> Dict[str, np.ndarray]:
+        names = ("frame_idx", "iou", "centroid_error", "quality", "threshold")
+        with self._lock:
+            pending = self._to_columns(self._records)
+        table = pending
+        if self.streaming:
+            flushed = load_columns(self.path, names)
+            if flushed is not None:
+                table = np.concatenate([flushed, pending[list(names)]])
+        return {name: np.asarray(table[name]) for name in names}
+
+    def _to_columns(self, records: Sequence[FrameMetrics]) -> np.ndarray:
+        table = np.zeros(len(records), dtype=_column_dtype(self.stage_names))
+        for i, record in enumerate(records):
+            stage_ms = record.stage_ms or {}
+            table[i] = (
+                record.frame_idx,
+                record.status[:STATUS_WIDTH],
+                record.quality,
+                record.threshold,
+                record.norm_area,
+                np.nan if record.iou is None else record.iou,
+                np.nan if record.centroid_error is None else record.centroid_error,
+                record.mask_passes_saved,
+                *(stage_ms.get(stage, np.nan) for stage in self.stage_names),
+            )
+        return table
+
+    @staticmethod
+    def _fieldnames(stage_names: Sequence[str]) -> List[str]:
+        return list(FIELDS) + [f"time_{stage}_ms" for stage in stage_names]
+
+    @staticmethod
+    def _row(record: FrameMetrics, stage_names: Sequence[str]) -> list:
+        stage_ms = record.stage_ms or {}
+        return [getattr(record, name) for name in FIELDS] + [
+            stage_ms.get(stage) for stage in stage_names
+        ]
+
     @staticmethod
-    def _compute_iou(pred_mask: np.ndarray, gt_mask: np.ndarray) -> float:
-        pred = pred_mask.astype(bool)
-        gt = gt_mask.astype(bool)
+    def _compute_iou(
+        pred_mask: np.ndarray,
+        gt_mask: np.ndarray,
+        pred_stats: Optional[MaskStats] = None,
+        gt_stats: Optional[MaskStats] = None,
+    ) -> float:
+        if isinstance(pred_mask, PackedMask):
+            return pred_mask.iou(gt_mask)
+        if isinstance(gt_mask, PackedMask):
+            return gt_mask.iou(pred_mask)
+        pred = MaskStats.of(pred_mask, pred_stats).as_bool
+        gt = MaskStats.of(gt_mask, gt_stats).as_bool
         intersection = np.logical_and(pred, gt).sum()
         union = np.logical_or(pred, gt).sum()
         if union == 0:
             return 1.0 if intersection == 0 else 0.0
         return float(intersection / union)
+
+
+def read_csv_records(path: str) -> List[FrameMetrics]:
+    """Rebuild records from a metrics CSV (stage timings are not restored)."""
+
+    def optional(value: str) -> Optional[float]:
+        return float(value) if value else None
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        return [
+            FrameMetrics(
+                frame_idx=int(row["frame_idx"]),
+                status=row["status"],
+                quality=float(row["quality"]),
+                threshold=float(row["threshold"]),
+                norm_area=float(row["norm_area"]),
+                iou=optional(row["iou"]),
+                centroid_error=optional(row["centroid_error"]),
+                mask_passes_saved=int(row["mask_passes_saved"] or 0),
+            )
+            for row in csv.DictReader(handle)
+        ]
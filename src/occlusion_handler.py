@@ -1,8 +1,29 @@
 import numpy as np
 import cv2
 
+from mask_stats import MaskStats
+from packed_mask import PackedMask
+
+try:
+    from scipy.optimize import linear_sum_assignment as _linear_sum_assignment
+except ImportError:  # scipy is optional; only needed for Hungarian matching
+    _linear_sum_assignment = None
+
+def _shift_mask(mask, dx, dy, stats=None):
+    """Translate a mask by (dx, dy), copying only its bounding box."""
+    if isinstance(mask, PackedMask):
+        return mask.moved(dx, dy)
+    shifted = np.zeros_like(mask)
+    x, y, w, h = MaskStats.of(mask, stats).bbox
+    x0, y0 = max(0, x + dx), max(0, y + dy)
+    x1, y1 = min(mask.shape[1], x + w + dx), min(mask.shape[0], y + h + dy)
+    if x1 > x0 and y1 > y0:
+        shifted[y0:y1, x0:x1] = mask[y0 - dy : y1 - dy, x0 - dx : x1 - dx]
+    return shifted
+
+
 class KalmanTracker:
-    def __init__(self):
+    def __init__(self, process_noise=0.03, measurement_noise=1.0, propagator=None, packed=False):
         # Kalman Filter setup
         # State: [x, y, dx, dy] (Position and Velocity)
         self.kf = cv2.KalmanFilter(4, 2)
@@ -12,13 +33,28 @@ class KalmanTracker:
                                              [0, 1, 0, 1],
                                              [0, 0, 1, 0],
                                              [0, 0, 0, 1]], np.float32)
-        self.kf.processNoiseCov = np.eye(4, dtype=np.float32) * 0.03
+        self.kf.processNoiseCov = np.eye(4, dtype=np.float32) * process_noise
+        self.kf.measurementNoiseCov = np.eye(2, dtype=np.float32) * measurement_noise
         
         self.last_valid_pos = None
+        self.last_mask = None
+        self.last_mask_stats = None
+        self.innovation = None
         self.is_occluded = False
+        # Optional FlowPropagator used before memory/circle recovery
+        self.propagator = propagator
+        # Build fallback masks as PackedMask instead of full 0/255 frames
+        self.packed = packed
+
+    def update(
+        self, mask, score, quality_info, frame_idx, frame_shape, memory_manager=None, stats=None,
+        frame=None,
+    ):
+        """Fuse SAM2 predictions with Kalman estimates and memory-backed recovery.
 
-    def update(self, mask, score, quality_info, frame_idx, frame_shape, memory_manager=None):
-        """Fuse SAM2 predictions with Kalman estimates and memory-backed recovery."""
+        ``frame`` is only needed when a flow propagator is attached.
+        """
+        stats = MaskStats.of(mask, stats)
         # 1. Predict next state
         prediction = self.kf.predict()
         pred_x, pred_y = int(prediction[0]), int(prediction[1])
@@ -28,34 +64,299 @@ class KalmanTracker:
         
         is_reliable = quality_info.get("is_reliable", False)
 
-        if is_reliable and np.sum(mask) > 0:
+        if is_reliable and stats.area > 0:
             # Valid detection
-            M = cv2.moments(mask)
+            M = stats.moments
             if M["m00"] != 0:
                 measured_x = int(M["m10"] / M["m00"])
                 measured_y = int(M["m01"] / M["m00"])
                 
+                self.innovation = float(np.hypot(measured_x - pred_x, measured_y - pred_y))
                 # Correct the Kalman Filter
                 self.kf.correct(np.array([[np.float32(measured_x)], [np.float32(measured_y)]]))
                 self.last_valid_pos = (measured_x, measured_y)
+                self.last_mask = mask
+                self.last_mask_stats = stats
                 self.is_occluded = False
                 if memory_manager is not None:
-                    memory_manager.store(frame_idx, mask, quality_info.get("quality", score))
+                    memory_manager.store(
+                        frame_idx, mask, quality_info.get("quality", score), stats=stats
+                    )
+                if self.propagator is not None and frame is not None:
+                    self.propagator.remember(frame, mask, stats)
                 return mask, (measured_x, measured_y), "Tracking"
         
         # 3. Handle Occlusion
         # If score is low, use Prediction
         self.is_occluded = True
-        
-        # Create a synthetic mask at the predicted location
-        # In a real app, we might warp the previous mask using Optical Flow
-        # Here we just draw a circle at the predicted position
-        refined_mask = np.zeros_like(mask)
+        refined_mask = self._predicted_mask(pred_x, pred_y, frame_shape, memory_manager, frame)
+        return refined_mask, (pred_x, pred_y), "Occluded (KF Prediction)"
+
+    def coast(self, frame_idx, frame_shape, memory_manager=None, frame=None):
+        """Advance the filter without a measurement (e.g. the predictor was skipped).
+
+        Returns the same flow, memory or synthetic mask as the occlusion path.
+        """
+        prediction = self.kf.predict()
+        pred_x, pred_y = int(prediction[0]), int(prediction[1])
+        refined_mask = self._predicted_mask(pred_x, pred_y, frame_shape, memory_manager, frame)
+        return refined_mask, (pred_x, pred_y)
+
+    def propagate(self, frame_idx, frame_shape, memory_manager=None):
+        """Advance the filter without a measurement, moving the last measured mask along.
+
+        The mask is translated by the Kalman displacement since it was
+        measured; before any measurement this falls back to ``coast``.
+        """
+        if self.last_mask is None:
+            return self.coast(frame_idx, frame_shape, memory_manager)
+        prediction = self.kf.predict()
+        pred_x, pred_y = int(prediction[0]), int(prediction[1])
+        dx = pred_x - self.last_valid_pos[0]
+        dy = pred_y - self.last_valid_pos[1]
+        return _shift_mask(self.last_mask, dx, dy, self.last_mask_stats), (pred_x, pred_y)
+
+    def peek(self):
+        """Position the next ``predict`` will return, without advancing the filter."""
+        state = self.kf.transitionMatrix @ self.kf.statePost
+        return float(state[0, 0]), float(state[1, 0])
+
+    def predicted_position_std(self):
+        """Position standard deviation (px) the next ``predict`` will carry."""
+        F = self.kf.transitionMatrix
+        P = F @ self.kf.errorCovPost @ F.T + self.kf.processNoiseCov
+        return float(np.sqrt(max(0.0, (P[0, 0] + P[1, 1]) / 2.0)))
+
+    def velocity(self):
+        """Estimated (dx, dy) per frame."""
+        return float(self.kf.statePost[2, 0]), float(self.kf.statePost[3, 0])
+
+    def _predicted_mask(self, pred_x, pred_y, frame_shape, memory_manager=None, frame=None):
+        # Warp the last reliable mask with optical flow when a propagator is
+        # attached, else reuse a stored mask, else draw a circle at the
+        # predicted position
+        if self.propagator is not None and frame is not None:
+            flow_mask = self.propagator.propagate(frame, self.velocity(), (pred_x, pred_y))
+            if flow_mask is not None and self.packed:
+                flow_mask = PackedMask.from_mask(flow_mask)
+            if flow_mask is not None and MaskStats.of(flow_mask).area > 0:
+                return flow_mask
         if memory_manager is not None:
             memory_mask = memory_manager.retrieve((pred_x, pred_y), frame_shape)
-            if memory_mask is not None and np.count_nonzero(memory_mask) > 0:
-                refined_mask = memory_mask
-        if np.count_nonzero(refined_mask) == 0:
-            cv2.circle(refined_mask, (pred_x, pred_y), 20, 255, -1)
-        
-        return refined_mask, (pred_x, pred_y), "Occluded (KF Prediction)"
+            if memory_mask is not None and MaskStats.of(memory_mask).area > 0:
+                return memory_mask
+        if self.packed:
+            return PackedMask.circle((pred_x, pred_y), 20, frame_shape)
+        refined_mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+        cv2.circle(refined_mask, (pred_x, pred_y), 20, 255, -1)
+        return refined_mask
+
+
+class MultiObjectTracker:
+    """Constant-velocity Kalman tracks for many objects held in stacked arrays.
+
+    All track states (N, 4) and covariances (N, 4, 4) live in NumPy arrays so
+    predict/correct run as batched matrix ops instead of one
+    ``cv2.KalmanFilter`` per object. Detections are matched to predicted
+    positions by gated centroid distance; unmatched detections start new
+    tracks and tracks missing for more than ``max_misses`` frames are dropped.
+    """
+
+    def __init__(
+        self,
+        gate_distance=50.0,
+        max_misses=10,
+        max_tracks=512,
+        process_noise=0.03,
+        measurement_noise=1.0,
+        initial_covariance=10.0,
+        assignment="greedy",
+    ):
+        if assignment not in ("greedy", "hungarian"):
+            raise ValueError(f"Unknown assignment strategy: {assignment}")
+        if assignment == "hungarian" and _linear_sum_assignment is None:
+            raise ImportError("Hungarian assignment requires scipy")
+        self.gate_distance = float(gate_distance)
+        self.max_misses = int(max_misses)
+        self.max_tracks = int(max_tracks)
+        self.assignment = assignment
+
+        self.F = np.array([[1, 0, 1, 0],
+                           [0, 1, 0, 1],
+                           [0, 0, 1, 0],
+                           [0, 0, 0, 1]], np.float64)
+        self.Q = np.eye(4) * process_noise
+        self.R = np.eye(2) * measurement_noise
+        self.P0 = np.eye(4) * initial_covariance
+
+        self.states = np.zeros((0, 4), np.float64)
+        self.covariances = np.zeros((0, 4, 4), np.float64)
+        self.track_ids = np.zeros(0, np.int64)
+        self.misses = np.zeros(0, np.int64)
+        self._next_id = 0
+
+    def __len__(self):
+        return self.states.shape[0]
+
+    @property
+    def positions(self):
+        return self.states[:, :2]
+
+    def predict(self):
+        """Advance every track one frame; returns predicted positions (N, 2)."""
+        if len(self):
+            self.states = self.states @ self.F.T
+            self.covariances = self.F @ self.covariances @ self.F.T + self.Q
+        return self.states[:, :2]
+
+    def correct(self, track_rows, measurements):
+        """Batched Kalman correction of ``track_rows`` with (M, 2) measurements."""
+        if len(track_rows) == 0:
+            return
+        x = self.states[track_rows]
+        P = self.covariances[track_rows]
+        innovation = measurements - x[:, :2]
+        S = P[:, :2, :2] + self.R
+        gain = P[:, :, :2] @ np.linalg.inv(S)
+        self.states[track_rows] = x + np.einsum("nij,nj->ni", gain, innovation)
+        self.covariances[track_rows] = P - gain @ P[:, :2, :]
+
+    def update(self, detections):
+        """Predict, associate ``detections`` (M, 2 centroids), correct and prune.
+
+        Returns a dict with the matched ``(track_id, detection_index)`` pairs and
+        the ids of tracks born and removed this frame.
+        """
+        detections = np.asarray(detections, np.float64).reshape(-1, 2)
+        predicted = self.predict()
+        rows, cols = self._associate(predicted, detections)
+
+        self.correct(rows, detections[cols])
+        matched_ids = self.track_ids[rows]
+        self.misses += 1
+        self.misses[rows] = 0
+
+        unmatched = np.ones(len(detections), bool)
+        unmatched[cols] = False
+        born = self._birth(detections[unmatched])
+
+        alive = self.misses <= self.max_misses
+        removed = self.track_ids[~alive]
+        if not alive.all():
+            self._keep(alive)
+        return {
+            "matches": list(zip(matched_ids.tolist(), cols.tolist())),
+            "born": born.tolist(),
+            "removed": removed.tolist(),
+        }
+
+    def _associate(self, predicted, detections):
+        empty = np.zeros(0, np.int64)
+        if len(predicted) == 0 or len(detections) == 0:
+            return empty, empty
+        rows, cols, dist = self._candidate_pairs(predicted, detections)
+        if rows.size == 0:
+            return empty, empty
+        if self.assignment == "hungarian":
+            cost = np.full((len(predicted), len(detections)), 1e9)
+            cost[rows, cols] = dist
+            hit_rows, hit_cols = _linear_sum_assignment(cost)
+            valid = cost[hit_rows, hit_cols] < 1e9
+            return hit_rows[valid].astype(np.int64), hit_cols[valid].astype(np.int64)
+        return self._greedy(rows, cols, dist)
+
+    def _candidate_pairs(self, predicted, detections):
+        """Track/detection pairs within the gate, found through a uniform grid.
+
+        Both point sets are bucketed into ``gate_distance``-sized cells and only
+        the 3x3 cell neighbourhood of each track is compared, so the cost grows
+        with the number of nearby pairs instead of N x M.
+        """
+        gate = self.gate_distance
+        det_cells = np.floor(detections / gate).astype(np.int64)
+        trk_cells = np.floor(predicted / gate).astype(np.int64)
+        y_min = min(det_cells[:, 1].min(), trk_cells[:, 1].min()) - 1
+        span = max(det_cells[:, 1].max(), trk_cells[:, 1].max()) - y_min + 2
+        det_keys = det_cells[:, 0] * span + (det_cells[:, 1] - y_min)
+        order = np.argsort(det_keys, kind="stable")
+        sorted_keys = det_keys[order]
+
+        row_parts, col_parts = [], []
+        track_rows = np.arange(len(predicted))
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                keys = (trk_cells[:, 0] + ox) * span + (trk_cells[:, 1] + oy - y_min)
+                lo = np.searchsorted(sorted_keys, keys, side="left")
+                hi = np.searchsorted(sorted_keys, keys, side="right")
+                counts = hi - lo
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                row_parts.append(np.repeat(track_rows, counts))
+                col_parts.append(order[np.repeat(lo, counts) + offsets])
+        if not row_parts:
+            empty = np.zeros(0, np.int64)
+            return empty, empty, np.zeros(0, np.float64)
+        rows = np.concatenate(row_parts)
+        cols = np.concatenate(col_parts)
+        delta = predicted[rows] - detections[cols]
+        dist = np.sqrt(np.einsum("pk,pk->p", delta, delta))
+        keep = dist <= gate
+        return rows[keep], cols[keep], dist[keep]
+
+    @staticmethod
+    def _greedy(rows, cols, dist):
+        """Nearest-first matching over sparse candidate pairs.
+
+        Pairs are ordered by (distance, track, detection). A pair that comes
+        first for both its track and its detection is one the sequential greedy
+        pass would pick, so all such pairs are accepted at once and the rest
+        re-examined (usually a single round).
+        """
+        matched_rows, matched_cols = [], []
+        while rows.size:
+            order = np.lexsort((cols, rows, dist))
+            rows, cols, dist = rows[order], cols[order], dist[order]
+            _, first_row = np.unique(rows, return_index=True)
+            _, first_col = np.unique(cols, return_index=True)
+            is_first_row = np.zeros(rows.size, bool)
+            is_first_row[first_row] = True
+            is_first_col = np.zeros(rows.size, bool)
+            is_first_col[first_col] = True
+            mutual = is_first_row & is_first_col
+            matched_rows.append(rows[mutual])
+            matched_cols.append(cols[mutual])
+            keep = ~(np.isin(rows, rows[mutual]) | np.isin(cols, cols[mutual]))
+            rows, cols, dist = rows[keep], cols[keep], dist[keep]
+        if not matched_rows:
+            empty = np.zeros(0, np.int64)
+            return empty, empty
+        return (
+            np.concatenate(matched_rows).astype(np.int64),
+            np.concatenate(matched_cols).astype(np.int64),
+        )
+
+    def _birth(self, detections):
+        room = max(0, self.max_tracks - len(self))
+        detections = detections[:room]
+        count = len(detections)
+        ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        if count == 0:
+            return ids
+        self._next_id += count
+        new_states = np.zeros((count, 4), np.float64)
+        new_states[:, :2] = detections
+        self.states = np.concatenate([self.states, new_states])
+        self.covariances = np.concatenate(
+            [self.covariances, np.broadcast_to(self.P0, (count, 4, 4))]
+        )
+        self.track_ids = np.concatenate([self.track_ids, ids])
+        self.misses = np.concatenate([self.misses, np.zeros(count, np.int64)])
+        return ids
+
+    def _keep(self, keep):
+        self.states = self.states[keep]
+        self.covariances = self.covariances[keep]
+        self.track_ids = self.track_ids[keep]
+        self.misses = self.misses[keep]
@@ -0,0 +1,220 @@
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from mask_stats import MaskStats
+
+# Popcount of every byte value; numpy<2 has no bitwise_count
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Sum of the in-byte pixel offsets (0 = most significant bit) of every set bit
+_BIT_OFFSETS = np.array(
+    [sum(k for k in range(8) if value & (0x80 >> k)) for value in range(256)], dtype=np.int64
+)
+
+
+class PackedMask(MaskStats):
+    """A binary mask held as ``np.packbits`` rows covering only its bounding box.
+
+    The packed window spans the mask's rows and the bytes of its columns in
+    the full-frame packed layout (``np.packbits(mask > 0, axis=-1)``), so
+    windows of two masks line up byte for byte: IoU is a bitwise and/or plus
+    popcount over their overlap. Area and the first-order moments come from
+    popcount tables without unpacking; ``window``/``crop`` unpack only the
+    pixels a consumer (e.g. the renderer) asks for.
+
+    A packed mask is its own ``MaskStats``, so every component taking
+    ``stats`` accepts it directly. Masks are binary: pixels unpack to 0/255.
+    """
+
+    __slots__ = ("bits", "y0", "c0", "_shape", "_tight")
+
+    def __init__(self, bits: np.ndarray, y0: int, c0: int, bbox, shape: Tuple[int, int]):
+        super().__init__(self)
+        self.bits = bits
+        self.y0 = y0
+        self.c0 = c0
+        self._shape = (int(shape[0]), int(shape[1]))
+        self._tight = bbox
+
+    @classmethod
+    def empty(cls, shape: Tuple[int, ...]) -> "PackedMask":
+        return cls(np.zeros((0, 0), np.uint8), 0, 0, (0, 0, 0, 0), shape[:2])
+
+    @classmethod
+    def from_mask(cls, mask: Union[np.ndarray, "PackedMask"]) -> "PackedMask":
+        """Pack a full-frame mask (non-zero pixels are set)."""
+        if isinstance(mask, PackedMask):
+            return mask
+        return cls.from_crop(mask, 0, 0, mask.shape)
+
+    @classmethod
+    def from_crop(cls, crop: np.ndarray, x: int, y: int, shape: Tuple[int, ...]) -> "PackedMask":
+        """Pack ``crop`` placed with its top-left pixel at (x, y), clipped to ``shape``."""
+        height, width = shape[:2]
+        crop_h, crop_w = crop.shape[:2]
+        sx0, sy0 = max(0, -x), max(0, -y)
+        sx1, sy1 = min(crop_w, width - x), min(crop_h, height - y)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return cls.empty(shape)
+        crop = np.ascontiguousarray(crop[sy0:sy1, sx0:sx1], dtype=np.uint8)
+        bx, by, bw, bh = cv2.boundingRect(crop)
+        if bw == 0:
+            return cls.empty(shape)
+        ax, ay = x + sx0 + bx, y + sy0 + by
+        c0 = ax // 8
+        pad = ax - 8 * c0
+        bits = np.zeros((bh, (pad + bw + 7) // 8 * 8), dtype=bool)
+        np.greater(crop[by : by + bh, bx : bx + bw], 0, out=bits[:, pad : pad + bw])
+        return cls(np.packbits(bits, axis=-1), ay, c0, (ax, ay, bw, bh), shape[:2])
+
+    @classmethod
+    def from_contour(cls, contour: np.ndarray, shape: Tuple[int, ...]) -> "PackedMask":
+        """Fill ``contour`` as ``cv2.drawContours(..., 255, -1)`` would on a full frame."""
+        x, y, w, h = cv2.boundingRect(contour)
+        crop = np.zeros((h, w), np.uint8)
+        cv2.drawContours(crop, [contour], -1, 255, -1, offset=(-x, -y))
+        return cls.from_crop(crop, x, y, shape)
+
+    @classmethod
+    def circle(cls, center: Tuple[int, int], radius: int, shape: Tuple[int, ...]) -> "PackedMask":
+        """Filled circle, as ``cv2.circle(mask, center, radius, 255, -1)`` would draw it."""
+        side = 2 * radius + 1
+        crop = np.zeros((side, side), np.uint8)
+        cv2.circle(crop, (radius, radius), radius, 255, -1)
+        return cls.from_crop(crop, center[0] - radius, center[1] - radius, shape)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._shape
+
+    @property
+    def size(self) -> int:
+        return self._shape[0] * self._shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    @property
+    def area(self) -> int:
+        if self._area is None:
+            self._area = int(POPCOUNT[self.bits].sum(dtype=np.int64))
+        else:
+            self.saved += 1
+        return self._area
+
+    @property
+    def moments(self) -> dict:
+        """``m00``, ``m10`` and ``m01`` exactly as ``cv2.moments`` gives them for 0/255 pixels."""
+        if self._moments is None:
+            counts = POPCOUNT[self.bits].astype(np.int64)
+            rows = self.y0 + np.arange(counts.shape[0], dtype=np.int64)
+            cols = 8 * (self.c0 + np.arange(counts.shape[1], dtype=np.int64))
+            area = int(counts.sum())
+            sum_x = int(cols @ counts.sum(axis=0)) + int(_BIT_OFFSETS[self.bits].sum())
+            sum_y = int(rows @ counts.sum(axis=1))
+            self._moments = {
+                "m00": float(255 * area),
+                "m10": float(255 * sum_x),
+                "m01": float(255 * sum_y),
+            }
+        else:
+            self.saved += 1
+        return self._moments
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        # Known from packing; counted like MaskStats so pass statistics match
+        if self._bbox is None:
+            self._bbox = self._tight
+        else:
+            self.saved += 1
+        return self._bbox
+
+    @property
+    def as_bool(self) -> np.ndarray:
+        if self._bool is None:
+            self._bool = self.unpack() > 0
+        else:
+            self.saved += 1
+        return self._bool
+
+    def any(self) -> bool:
+        return self._tight[2] > 0
+
+    def window(
+        self, x: int, y: int, w: int, h: int, out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Unpack the (x, y, w, h) rectangle as 0/255 ``uint8``."""
+        if out is None:
+            out = np.zeros((h, w), np.uint8)
+        else:
+            out[...] = 0
+        rows, nbytes = self.bits.shape
+        r0, r1 = max(y, self.y0), min(y + h, self.y0 + rows)
+        p0, p1 = max(x, 8 * self.c0), min(x + w, 8 * (self.c0 + nbytes))
+        if r1 > r0 and p1 > p0:
+            b0 = p0 // 8 - self.c0
+            b1 = (p1 + 7) // 8 - self.c0
+            bits = np.unpackbits(self.bits[r0 - self.y0 : r1 - self.y0, b0:b1], axis=-1)
+            offset = p0 - 8 * (self.c0 + b0)
+            np.multiply(
+                bits[:, offset : offset + p1 - p0],
+                np.uint8(255),
+                out=out[r0 - y : r1 - y, p0 - x : p1 - x],
+            )
+        return out
+
+    def crop(self) -> np.ndarray:
+        """The tight bounding-box crop as 0/255 ``uint8``."""
+        return self.window(*self._tight)
+
+    def unpack(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """The full-frame 0/255 ``uint8`` mask."""
+        height, width = self._shape
+        return self.window(0, 0, width, height, out=out)
+
+    def packed_rows(self) -> np.ndarray:
+        """The full-frame ``np.packbits(mask > 0, axis=-1)`` array."""
+        height, width = self._shape
+        rows = np.zeros((height, (width + 7) // 8), np.uint8)
+        count, nbytes = self.bits.shape
+        rows[self.y0 : self.y0 + count, self.c0 : self.c0 + nbytes] = self.bits
+        return rows
+
+    def moved(self, dx: int, dy: int, shape: Optional[Tuple[int, ...]] = None) -> "PackedMask":
+        """Translate by integer (dx, dy), into a frame of ``shape`` (default: the same)."""
+        x, y, w, h = self._tight
+        shape = self._shape if shape is None else shape
+        if w == 0:
+            return PackedMask.empty(shape)
+        return PackedMask.from_crop(self.crop(), x + dx, y + dy, shape)
+
+    def iou(self, other: Union[np.ndarray, "PackedMask"]) -> float:
+        other = PackedMask.from_mask(other)
+        intersection = 0
+        rows, nbytes = self.bits.shape
+        other_rows, other_bytes = other.bits.shape
+        r0, r1 = max(self.y0, other.y0), min(self.y0 + rows, other.y0 + other_rows)
+        c0, c1 = max(self.c0, other.c0), min(self.c0 + nbytes, other.c0 + other_bytes)
+        if r1 > r0 and c1 > c0:
+            mine = self.bits[r0 - self.y0 : r1 - self.y0, c0 - self.c0 : c1 - self.c0]
+            theirs = other.bits[r0 - other.y0 : r1 - other.y0, c0 - other.c0 : c1 - other.c0]
+            intersection = POPCOUNT[mine & theirs].sum(dtype=np.int64)
+        union = self.area + other.area - intersection
+        if union == 0:
+            return 1.0
+        return float(intersection / union)
+
+
+def mask_window(mask: Union[np.ndarray, PackedMask], x: int, y: int, w: int, h: int) -> np.ndarray:
+    """The (x, y, w, h) pixels of a dense or packed mask (a view for dense masks)."""
+    if isinstance(mask, PackedMask):
+        return mask.window(x, y, w, h)
+    return mask[y : y + h, x : x + w]
+
+
+def dense(mask: Union[np.ndarray, PackedMask]) -> np.ndarray:
+    """A full-frame ``uint8`` array for either representation."""
+    return mask.unpack() if isinstance(mask, PackedMask) else mask
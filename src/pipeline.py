@@ -1,6 +1,8 @@
 import argparse
+import json
 import os
-from typing import Optional, Tuple
+import time
+from typing import Callable, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -11,17 +13,74 @@ from occlusion_handler import KalmanTracker
 from quality_controller import QualityController
 from memory_manager import MemoryManager
 from metrics import MetricsLogger
+from mask_stats import MaskStats
+from packed_mask import PackedMask
+from stages import run_staged
+from profiling import PROFILE_STAGES, StageProfiler, TimedMemory
+from prediction_cache import CachedPredictor, write_cache_report
+from renderer import OverlayRenderer
+from scheduler import KeyframeScheduler
+from roi import RoiPredictor
+from flow_propagation import FlowPropagator
+from frame_store import FrameStore
+from video_io import BACKENDS, CODECS, MaskStreamWriter, open_writer
+from evaluation import (
+    MaskStack,
+    MaskStackWriter,
+    evaluate_stacks,
+    merge_into_metrics,
+    save_evaluation,
+    summarize_evaluation,
+)
 
 
-def _centroid_from_mask(mask: Optional[np.ndarray]) -> Optional[Tuple[int, int]]:
-    if mask is None or np.count_nonzero(mask) == 0:
+def _centroid_from_mask(
+    mask: Optional[np.ndarray], stats: Optional[MaskStats] = None
+) -> Optional[Tuple[int, int]]:
+    stats = MaskStats.of(mask, stats)
+    if stats is None:
         return None
-    moments = cv2.moments(mask)
-    if moments["m00"] == 0:
-        return None
-    cx = int(moments["m10"] / moments["m00"])
-    cy = int(moments["m01"] / moments["m00"])
-    return cx, cy
+    return stats.centroid_int
+
+
+_NO_PROFILE = StageProfiler(enabled=False)
+# Set once main() has run in this process (warm worker jobs after the first)
+_WARM = False
+OUTPUT_FPS = 20.0
+OUTPUT_SIZE = (640, 480)
+# Settings that change tracking results and so name a run's config. Output,
+# profiling, caching and throughput options (and equivalent representations
+# such as --packed-masks or --memory-index) are left out
+RESULT_SETTINGS = (
+    "disable_quality",
+    "disable_memory",
+    "robust_quality",
+    "predictor",
+    "checkpoint",
+    "model_config",
+    "roi",
+    "roi_margin",
+    "flow_propagation",
+    "flow_model",
+    "memory_capacity",
+    "memory_max_bytes",
+    "schedule",
+    "target_rate",
+    "accuracy_floor",
+    "max_gap",
+    "shards",
+    "shard_warmup",
+    "live",
+    "deadline_ms",
+    "max_coast",
+    "keep_source_size",
+)
+
+
+def _passes_saved(*stats: Optional[MaskStats]) -> int:
+    """Full-frame mask scans avoided this frame by sharing MaskStats."""
+    unique = {id(item): item for item in stats if item is not None}
+    return sum(item.saved for item in unique.values())
 
 
 def _save_frame(directory: str, label: str, frame_idx: int, frame: np.ndarray) -> None:
@@ -31,12 +90,16 @@ def _save_frame(directory: str, label: str, frame_idx: int, frame: np.ndarray) -
 
 
 def _evaluate_quality(
-    controller: Optional[QualityController], mask: np.ndarray, score: float
+    controller: Optional[QualityController],
+    mask: np.ndarray,
+    score: float,
+    stats: Optional[MaskStats] = None,
 ) -> dict:
+    stats = MaskStats.of(mask, stats)
     if controller is not None:
-        return controller.evaluate(mask, score)
-    mask_area = float(np.count_nonzero(mask))
-    norm_area = mask_area / float(mask.size)
+        return controller.evaluate(mask, score, stats=stats)
+    mask_area = float(stats.area)
+    norm_area = mask_area / float(stats.size)
     quality = 0.6 * score + 0.4 * norm_area
     is_reliable = (score > 0.5) and (mask_area > 0)
     return {
@@ -47,7 +110,317 @@ def _evaluate_quality(
     }
 
 
-def main() -> None:
+def _track_frame(
+    frame: np.ndarray,
+    idx: int,
+    gt_mask: Optional[np.ndarray],
+    predictor: SAM2Predictor,
+    quality_controller: Optional[QualityController],
+    tracker: KalmanTracker,
+    memory_manager: Optional[MemoryManager],
+    metrics_logger: MetricsLogger,
+    profiler: Optional[StageProfiler] = None,
+    prediction: Optional[Tuple[list, list]] = None,
+) -> Tuple[np.ndarray, int, np.ndarray, Tuple[int, int], str, dict]:
+    profiler = profiler or _NO_PROFILE
+    if prediction is not None:
+        # Shared predictor output (e.g. one prediction fanned out to many configs)
+        masks, scores = prediction
+    else:
+        with profiler.stage(idx, "predict"):
+            masks, scores = predictor.predict(frame, idx)
+    primary_mask = masks[0]
+    primary_score = scores[0]
+    primary_stats = MaskStats.of(primary_mask)
+
+    with profiler.stage(idx, "quality"):
+        quality_info = _evaluate_quality(
+            controller=quality_controller,
+            mask=primary_mask,
+            score=primary_score,
+            stats=primary_stats,
+        )
+
+    if profiler.enabled and memory_manager is not None:
+        memory_manager = TimedMemory(memory_manager, profiler, idx)
+    with profiler.stage(idx, "track"):
+        refined_mask, position, status = tracker.update(
+            mask=primary_mask,
+            score=primary_score,
+            quality_info=quality_info,
+            frame_idx=idx,
+            frame_shape=primary_mask.shape,
+            memory_manager=memory_manager,
+            stats=primary_stats,
+            frame=frame,
+        )
+    profiler.exclude(idx, "track", "memory")
+
+    refined_stats = MaskStats.of(refined_mask, primary_stats)
+    _log_frame(
+        metrics_logger, idx, status, quality_info, refined_mask, position, gt_mask,
+        refined_stats, primary_stats,
+    )
+    return frame, idx, refined_mask, position, status, quality_info
+
+
+def _coast_frame(
+    frame: np.ndarray,
+    idx: int,
+    gt_mask: Optional[np.ndarray],
+    quality_controller: Optional[QualityController],
+    tracker: KalmanTracker,
+    memory_manager: Optional[MemoryManager],
+    metrics_logger: MetricsLogger,
+    profiler: Optional[StageProfiler] = None,
+    propagated_quality: Optional[dict] = None,
+) -> Tuple[np.ndarray, int, np.ndarray, Tuple[int, int], str, dict]:
+    """Track a frame without running the predictor.
+
+    With ``propagated_quality`` (a keyframe scheduler skip) the last measured
+    mask is moved by the Kalman displacement and logged with that quality;
+    otherwise (a live-mode deadline miss) the tracker coasts as in occlusion.
+    """
+    profiler = profiler or _NO_PROFILE
+    if profiler.enabled and memory_manager is not None:
+        memory_manager = TimedMemory(memory_manager, profiler, idx)
+    with profiler.stage(idx, "track"):
+        if propagated_quality is not None:
+            refined_mask, position = tracker.propagate(idx, frame.shape[:2], memory_manager)
+        else:
+            refined_mask, position = tracker.coast(
+                idx, frame.shape[:2], memory_manager, frame=frame
+            )
+    profiler.exclude(idx, "track", "memory")
+    if propagated_quality is not None:
+        status = "Propagated (KF)"
+        quality_info = propagated_quality
+    else:
+        status = "Coasting (Deadline)"
+        quality_info = {
+            "is_reliable": False,
+            "quality": 0.0,
+            "threshold": 0.5 if quality_controller is None else quality_controller.threshold,
+            "norm_area": 0.0,
+        }
+    _log_frame(
+        metrics_logger, idx, status, quality_info, refined_mask, position, gt_mask,
+        MaskStats.of(refined_mask),
+    )
+    return frame, idx, refined_mask, position, status, quality_info
+
+
+def _log_frame(
+    metrics_logger: MetricsLogger,
+    idx: int,
+    status: str,
+    quality_info: dict,
+    refined_mask: np.ndarray,
+    position: Tuple[int, int],
+    gt_mask: Optional[np.ndarray],
+    refined_stats: MaskStats,
+    primary_stats: Optional[MaskStats] = None,
+) -> None:
+    if gt_mask is not None and isinstance(refined_mask, PackedMask):
+        # One pack of the GT box replaces the bool copies and full-frame IoU passes
+        gt_mask = PackedMask.from_mask(gt_mask)
+    gt_stats = MaskStats.of(gt_mask)
+    gt_position = _centroid_from_mask(gt_mask, gt_stats)
+    metrics_logger.log(
+        frame_idx=idx,
+        status=status,
+        quality_info=quality_info,
+        pred_mask=refined_mask,
+        gt_mask=gt_mask,
+        predicted_pos=position,
+        gt_pos=gt_position,
+        pred_stats=refined_stats,
+        gt_stats=gt_stats,
+        passes_saved=_passes_saved(primary_stats, refined_stats, gt_stats),
+    )
+
+
+def _build_components(
+    args: argparse.Namespace,
+    video_path: Optional[str] = None,
+    verbose: bool = True,
+) -> Tuple[
+    SAM2Predictor, KalmanTracker, Optional[QualityController], Optional[MemoryManager]
+]:
+    tracking = _build_tracking(args)
+    predictor = SAM2Predictor(
+        model_path=args.checkpoint,
+        mock=args.predictor == "mock",
+        config=args.model_config,
+        threads=args.threads,
+        verbose=verbose,
+        packed=args.packed_masks,
+    )
+    if args.prediction_cache and video_path is not None:
+        with VideoLoader(video_path) as video:
+            fingerprint = video.fingerprint()
+        predictor = CachedPredictor(
+            predictor,
+            args.prediction_cache,
+            fingerprint,
+            max_bytes=int(args.prediction_cache_mb * 1024 * 1024),
+        )
+    if args.roi:
+        # Outside the cache: the window depends on the trajectory, so it is part of the key
+        predictor = RoiPredictor(predictor, tracking[0], min_margin=args.roi_margin)
+    return (predictor,) + tracking
+
+
+def _cache_stats(predictor) -> Optional[dict]:
+    """Counters of the prediction cache in the predictor stack, if there is one."""
+    if isinstance(predictor, RoiPredictor):
+        predictor = predictor.predictor
+    return predictor.stats() if isinstance(predictor, CachedPredictor) else None
+
+
+def _build_tracking(
+    args: argparse.Namespace,
+) -> Tuple[KalmanTracker, Optional[QualityController], Optional[MemoryManager]]:
+    tracker = KalmanTracker(
+        propagator=FlowPropagator(model=args.flow_model) if args.flow_propagation else None,
+        packed=args.packed_masks,
+    )
+    quality_controller = (
+        None if args.disable_quality else QualityController(robust=args.robust_quality)
+    )
+    memory_manager = (
+        None
+        if args.disable_memory
+        else MemoryManager(
+            capacity=args.memory_capacity,
+            max_bytes=args.memory_max_bytes,
+            spatial_index="grid" if args.memory_index == "grid" else None,
+        )
+    )
+    return tracker, quality_controller, memory_manager
+
+
+def _write_run_config(path: str, args: argparse.Namespace, defaults: dict) -> None:
+    """Record the video and settings behind a run (grouped on by the results index).
+
+    ``config`` names the run by its non-default ``RESULT_SETTINGS``, e.g.
+    ``disable_memory=True,disable_quality=True``, or ``default``; every
+    option is kept under ``settings``.
+    """
+    settings = {key: value for key, value in vars(args).items() if key not in ("tag", "video")}
+    changed = [
+        f"{key}={settings[key]}"
+        for key in sorted(RESULT_SETTINGS)
+        if key in settings and settings[key] != defaults.get(key)
+    ]
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(
+            {
+                "video": os.path.basename(os.path.normpath(args.video)),
+                "config": ",".join(changed) or "default",
+                "settings": settings,
+            },
+            handle,
+            indent=2,
+            default=str,
+        )
+
+
+def _open_writer(
+    path: str,
+    fps: float = OUTPUT_FPS,
+    size: Tuple[int, int] = OUTPUT_SIZE,
+    codec: str = "xvid",
+    backend: str = "opencv",
+):
+    return open_writer(path, fps, size, codec=codec, backend=backend)
+
+
+def _release(*writers) -> None:
+    for writer in writers:
+        if writer is not None:
+            writer.release()
+
+
+def _evaluate_after_run(
+    metrics_dir: str,
+    metrics_path: str,
+    pred_stack: MaskStackWriter,
+    gt_stack: Optional[MaskStackWriter],
+    positions: list,
+    gt_path: Optional[str] = None,
+) -> None:
+    """Batch-evaluate the stored masks and fold IoU/centroid error into the run."""
+    pred_stack.close()
+    np.save(os.path.join(metrics_dir, "positions.npy"), np.asarray(positions, dtype=np.int64))
+    if gt_stack is not None:
+        gt_stack.close()
+        if not gt_stack.frame_indices:
+            print("Evaluate-after: no ground truth available, skipping evaluation")
+            return
+        gt_path = gt_stack.path
+    result = evaluate_stacks(
+        MaskStack.open(pred_stack.path),
+        MaskStack.open(gt_path),
+        positions=np.asarray(positions, dtype=np.int64),
+    )
+    merge_into_metrics(metrics_path, result)
+    eval_path = os.path.join(metrics_dir, "run_eval.csv")
+    save_evaluation(eval_path, result)
+    summary = summarize_evaluation(result)
+    print(
+        f"Evaluated {summary['frames']} frames after the run: IoU {summary['mean_iou']:.4f}, "
+        f"centroid error {summary['mean_centroid_error']:.2f}px, "
+        f"boundary F {summary['mean_boundary_f']:.4f}"
+    )
+    print(f"Per-frame evaluation saved to {eval_path}")
+
+
+class _KeyframeRecorder:
+    """Saves the first tracking, occlusion and recovery frames of a run."""
+
+    def __init__(self, frames_dir: str):
+        self.frames_dir = frames_dir
+        self.keyframes = {"tracking": None, "occlusion": None, "recovery": None}
+        self.previous_status = ""
+
+    def observe(
+        self, idx: int, status: str, quality_info: dict, render: Callable[[], np.ndarray]
+    ) -> None:
+        """Save ``idx`` under every keyframe it is the first of; ``render`` runs only then."""
+        keyframes = self.keyframes
+        names = []
+        if quality_info["is_reliable"] and keyframes["tracking"] is None:
+            names.append("tracking")
+        if status.startswith("Occluded") and keyframes["occlusion"] is None:
+            names.append("occlusion")
+        if (
+            status == "Tracking"
+            and self.previous_status.startswith("Occluded")
+            and keyframes["recovery"] is None
+        ):
+            names.append("recovery")
+        self.previous_status = status
+        if not names:
+            return
+        output_frame = render()
+        for name in names:
+            _save_frame(self.frames_dir, name, idx, output_frame)
+            keyframes[name] = idx
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    """Run the pipeline CLI; returns the run's startup report.
+
+    ``argv`` defaults to ``sys.argv[1:]``; the warm worker passes each job's
+    arguments here so repeated runs skip interpreter start and imports.
+    """
+    global _WARM
+    started = time.perf_counter()
+    # CPU time since the process started: interpreter start-up plus imports.
+    # A warm worker's later jobs have already paid it.
+    import_seconds = 0.0 if _WARM else time.process_time()
+    warm, _WARM = _WARM, True
     parser = argparse.ArgumentParser(
         description="SAM2-Refine+ video segmentation pipeline"
     )
@@ -67,31 +440,328 @@ def main() -> None:
     parser.add_argument(
         "--video",
         default="input_video.mp4",
-        help="Override input video relative to project root",
+        help="Override input video (or frame store directory) relative to project root",
+    )
+    parser.add_argument(
+        "--predictor",
+        choices=["mock", "sam2"],
+        default="mock",
+        help="Mask predictor: HSV mock or the real SAM 2 backend on CPU",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="SAM 2 checkpoint (with --predictor sam2; tiny random model if omitted)",
+    )
+    parser.add_argument(
+        "--model-config",
+        default=None,
+        help="SAM 2 model config name used with --checkpoint",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="CPU threads for the SAM 2 backend",
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        default=None,
+        help="Directory for the on-disk predictor output cache (off when omitted)",
+    )
+    parser.add_argument(
+        "--prediction-cache-mb",
+        type=float,
+        default=512.0,
+        help="Prediction cache size cap in MiB (least recently used entries evicted)",
+    )
+    parser.add_argument(
+        "--roi",
+        action="store_true",
+        help="Segment only a window around the Kalman-predicted position (full-frame fallback)",
+    )
+    parser.add_argument(
+        "--roi-margin",
+        type=int,
+        default=16,
+        help="Minimum ROI margin in pixels around the last mask's extent",
+    )
+    parser.add_argument(
+        "--flow-propagation",
+        action="store_true",
+        help="During occlusion, warp the last reliable mask with Lucas-Kanade flow",
+    )
+    parser.add_argument(
+        "--flow-model",
+        choices=["similarity", "affine"],
+        default="similarity",
+        help="Transform fitted to the tracked flow points",
+    )
+    parser.add_argument(
+        "--memory-capacity",
+        type=int,
+        default=25,
+        help="Maximum number of masks kept for occlusion recovery",
+    )
+    parser.add_argument(
+        "--memory-index",
+        choices=["flat", "grid"],
+        default="flat",
+        help="Memory lookup index (grid suits capacities in the tens of thousands)",
+    )
+    parser.add_argument(
+        "--memory-max-bytes",
+        type=int,
+        default=None,
+        help="Byte budget for stored memory masks (quality-aware eviction)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record per-stage wall time per frame into the metrics CSV",
+    )
+    parser.add_argument(
+        "--trace-json",
+        default=None,
+        help="Also export stage intervals as Chrome-trace JSON to this path (implies --profile)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the video into this many time shards processed in parallel",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Process-pool size for --shards (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--shard-warmup",
+        type=int,
+        default=30,
+        help="Frames replayed before each shard so tracker state converges",
+    )
+    parser.add_argument(
+        "--compare-serial",
+        action="store_true",
+        help="With --shards, also run serially to report speedup and boundary divergence",
+    )
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="Metrics-only run: skip overlay rendering, video encoding and keyframes",
+    )
+    parser.add_argument(
+        "--metrics-chunk",
+        type=int,
+        default=256,
+        help="Frames buffered before metrics are appended to disk",
+    )
+    parser.add_argument(
+        "--metrics-parquet",
+        action="store_true",
+        help="Also stream metrics to run_metrics.parquet (requires pyarrow)",
+    )
+    parser.add_argument(
+        "--evaluate-after",
+        action="store_true",
+        help="Skip per-frame IoU/centroid work; store packed masks and batch-evaluate at the end",
+    )
+    parser.add_argument(
+        "--gt-stack",
+        default=None,
+        help="Ground-truth mask stack (.npy) for --evaluate-after instead of loader GT",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Overlap decode, predict/track and render/encode in separate stages",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=8,
+        help="Frames buffered between pipelined stages (backpressure bound)",
+    )
+    parser.add_argument(
+        "--live",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="SOURCE",
+        help="Real-time mode: camera index, stream URL, or file (default --video) at native FPS",
+    )
+    parser.add_argument(
+        "--deadline-ms",
+        type=float,
+        default=None,
+        help="Live per-frame latency budget from capture (default: one frame interval)",
+    )
+    parser.add_argument(
+        "--live-buffer",
+        type=int,
+        default=1,
+        help="Live frames buffered before the oldest is dropped",
+    )
+    parser.add_argument(
+        "--live-seconds",
+        type=float,
+        default=None,
+        help="Stop a live run after this many seconds",
+    )
+    parser.add_argument(
+        "--max-coast",
+        type=int,
+        default=10,
+        help="Live mode: consecutive frames that may skip the predictor before one is forced",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["off", "rate", "floor"],
+        default="off",
+        help="Keyframe scheduling: run the segmenter only when propagation is uncertain",
+    )
+    parser.add_argument(
+        "--target-rate",
+        type=float,
+        default=0.5,
+        help="--schedule rate: long-run fraction of frames sent to the segmenter",
+    )
+    parser.add_argument(
+        "--accuracy-floor",
+        type=float,
+        default=0.85,
+        help="Estimated propagation IoU below which a frame is inferred",
+    )
+    parser.add_argument(
+        "--max-gap",
+        type=int,
+        default=30,
+        help="Longest run of propagated frames before inference is forced",
+    )
+    parser.add_argument(
+        "--compare-every-frame",
+        action="store_true",
+        help="With --schedule, also track every frame on a shadow tracker to report the IoU cost",
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        help="Skip the metrics plot (and the matplotlib import it needs)",
+    )
+    parser.add_argument(
+        "--robust-quality",
+        action="store_true",
+        help="Adaptive threshold from the sliding-window median instead of the mean",
+    )
+    parser.add_argument(
+        "--decoder",
+        choices=BACKENDS,
+        default="opencv",
+        help="Video decode backend ('pyav' needs the optional av package)",
+    )
+    parser.add_argument(
+        "--decode-threads",
+        type=int,
+        default=None,
+        help="Decoder threads (default: the backend's own choice)",
+    )
+    parser.add_argument(
+        "--keep-source-size",
+        action="store_true",
+        help=f"Process and write at the source resolution instead of {OUTPUT_SIZE[0]}x{OUTPUT_SIZE[1]}",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        default="xvid",
+        help="Output video codec",
+    )
+    parser.add_argument(
+        "--encoder",
+        choices=BACKENDS,
+        default="opencv",
+        help="Video encode backend ('pyav' needs the optional av package)",
+    )
+    parser.add_argument(
+        "--mask-stream",
+        action="store_true",
+        help="Write clean frames plus masks as a separate lossless video instead of burning overlays in",
+    )
+    parser.add_argument(
+        "--packed-masks",
+        action="store_true",
+        help="Carry masks bit-packed inside their bounding box; unpacked only where drawn",
+    )
+    args = parser.parse_args(argv)
+    defaults = vars(parser.parse_args([]))
+    if args.evaluate_after and args.shards > 1:
+        parser.error("--evaluate-after is not supported with --shards")
+    if args.live is not None and (args.shards > 1 or args.pipelined):
+        parser.error("--live is not supported with --shards or --pipelined")
+    if args.schedule != "off" and args.shards > 1:
+        parser.error("--schedule is not supported with --shards")
+    if args.compare_every_frame and (args.schedule == "off" or args.evaluate_after):
+        parser.error("--compare-every-frame needs --schedule and per-frame ground truth")
+    if args.live is not None and args.prediction_cache:
+        # Which frames reach the predictor depends on timing, so cached runs are not comparable
+        parser.error("--live is not supported with --prediction-cache")
+    if args.shards > 1 and (args.keep_source_size or args.mask_stream):
+        parser.error("--keep-source-size and --mask-stream are not supported with --shards")
+    if args.mask_stream and args.no_render:
+        parser.error("--mask-stream writes video; it cannot be combined with --no-render")
 
     base_dir = os.path.dirname(os.path.abspath(__file__))
     project_dir = os.path.dirname(base_dir)
     video_path = os.path.join(project_dir, args.video)
     output_filename = f"output_video_{args.tag}.avi"
     output_path = os.path.join(project_dir, output_filename)
+    mask_stream_path = os.path.join(project_dir, f"output_video_{args.tag}_masks.mkv")
+    if args.shards > 1:
+        with VideoLoader(video_path, backend=args.decoder) as probe:
+            total_frames = probe.frame_count()
+        if not total_frames or total_frames <= 0:
+            # Shards are planned from the frame count; without one, stream the video serially
+            print("Warning: video frame count is unknown or zero; running without --shards")
+            args.shards = 1
 
-    loader = VideoLoader(video_path)
-    predictor = SAM2Predictor(mock=True)
-    tracker = KalmanTracker()
-    quality_controller = None if args.disable_quality else QualityController()
-    memory_manager = None if args.disable_memory else MemoryManager(capacity=25)
-    metrics_logger = MetricsLogger()
+    # The renderer draws on decoded frames in place, so each ring buffer must
+    # outlive every frame still queued between the pipelined stages
+    loader = VideoLoader(
+        video_path,
+        resize_dim=None if args.keep_source_size else OUTPUT_SIZE,
+        backend=args.decoder,
+        threads=args.decode_threads,
+        buffers=2 * args.queue_size + 4 if args.pipelined else 2,
+        # Frame stores hand out read-only views unless the frames get drawn on
+        writable=not args.no_render,
+    )
+    predictor, tracker, quality_controller, memory_manager = _build_components(args, video_path)
+    profiler = StageProfiler(
+        enabled=args.profile or args.trace_json is not None,
+        trace=args.trace_json is not None,
+    )
 
     artifacts_dir = os.path.join(project_dir, "artifacts", args.tag)
     frames_dir = os.path.join(artifacts_dir, "frames")
     metrics_dir = os.path.join(artifacts_dir, "metrics")
     os.makedirs(frames_dir, exist_ok=True)
     os.makedirs(metrics_dir, exist_ok=True)
-
-    fourcc = cv2.VideoWriter_fourcc(*"XVID")
-    out = cv2.VideoWriter(output_path, fourcc, 20.0, (640, 480))
+    metrics_path = os.path.join(metrics_dir, "run_metrics.csv")
+    plot_path = os.path.join(metrics_dir, "run_metrics.png")
+    _write_run_config(os.path.join(metrics_dir, "run_config.json"), args, defaults)
+    # Rows stream to disk as frames finish; with profiling each row waits for
+    # its render/encode timings (shard workers are not profiled)
+    timed = profiler.enabled and args.shards <= 1
+    metrics_logger = MetricsLogger(
+        path=metrics_path,
+        chunk_size=args.metrics_chunk,
+        stage_names=PROFILE_STAGES + ("wall",) if timed else (),
+        await_completion=timed,
+        parquet=args.metrics_parquet,
+    )
 
     print("Starting Video Segmentation Pipeline...")
     if args.disable_quality:
@@ -102,111 +772,297 @@ def main() -> None:
         print("Memory-based recovery: OFF")
     else:
         print("Memory-based recovery: ON")
+    if args.pipelined:
+        print(f"Pipelined stages: ON (queue size {args.queue_size})")
+    if args.no_render:
+        print("Rendering: OFF (metrics only)")
+    if args.live is not None:
+        print(f"Live mode: ON (source {args.live or args.video})")
+    scheduler = shadow = None
+    if args.schedule != "off":
+        scheduler = KeyframeScheduler(
+            mode=args.schedule,
+            target_rate=args.target_rate,
+            accuracy_floor=args.accuracy_floor,
+            max_gap=args.max_gap,
+        )
+        print(f"Keyframe scheduling: {args.schedule}")
+        if args.compare_every_frame:
+            shadow = _build_tracking(args) + (MetricsLogger(),)
 
-    keyframes = {"tracking": None, "occlusion": None, "recovery": None}
-    previous_status = ""
+    recorder = _KeyframeRecorder(frames_dir)
+    renderer = OverlayRenderer()
+    setup_seconds = time.perf_counter() - started
+    first_frame_at = None
 
-    with loader as video:
-        for frame, idx, gt_mask in video.stream_frames():
-            masks, scores = predictor.predict(frame, idx)
-            primary_mask = masks[0]
-            primary_score = scores[0]
+    pred_stack = gt_stack = None
+    positions = []
+    if args.evaluate_after:
+        pred_stack = MaskStackWriter(os.path.join(metrics_dir, "pred_masks.npy"))
+        if args.gt_stack is None:
+            # A frame store already holds the packed GT; evaluate against it directly
+            args.gt_stack = FrameStore.gt_stack_path(video_path)
+        if args.gt_stack is None:
+            gt_stack = MaskStackWriter(os.path.join(metrics_dir, "gt_masks.npy"))
 
-            quality_info = _evaluate_quality(
-                controller=quality_controller,
-                mask=primary_mask,
-                score=primary_score,
+    def process(item, coast=False):
+        frame, idx, gt_mask = item
+        components = dict(
+            frame=frame,
+            idx=idx,
+            gt_mask=None if args.evaluate_after else gt_mask,
+            quality_controller=quality_controller,
+            tracker=tracker,
+            memory_manager=memory_manager,
+            metrics_logger=metrics_logger,
+            profiler=profiler,
+        )
+        prediction = None
+        if shadow is not None and not coast:
+            # The shadow tracker needs every frame's prediction, shared with the main one
+            with profiler.stage(idx, "predict"):
+                prediction = predictor.predict(frame, idx)
+            shadow_tracker, shadow_quality, shadow_memory, shadow_logger = shadow
+            _track_frame(
+                frame=frame,
+                idx=idx,
+                gt_mask=gt_mask,
+                predictor=predictor,
+                quality_controller=shadow_quality,
+                tracker=shadow_tracker,
+                memory_manager=shadow_memory,
+                metrics_logger=shadow_logger,
+                prediction=prediction,
             )
-
-            refined_mask, position, status = tracker.update(
-                mask=primary_mask,
-                score=primary_score,
-                quality_info=quality_info,
-                frame_idx=idx,
-                frame_shape=primary_mask.shape,
-                memory_manager=memory_manager,
+        infer = not coast and (scheduler is None or scheduler.should_infer(tracker))
+        if infer:
+            result = _track_frame(predictor=predictor, prediction=prediction, **components)
+        elif coast:
+            result = _coast_frame(**components)
+        else:
+            result = _coast_frame(
+                propagated_quality=scheduler.propagated_quality_info(), **components
             )
+        if scheduler is not None:
+            scheduler.observe(infer, result[4], result[5], tracker)
+        if pred_stack is not None:
+            pred_stack.append(idx, result[2])
+            positions.append(result[3])
+            if gt_stack is not None and gt_mask is not None:
+                gt_stack.append(idx, gt_mask)
+        return result
 
-            gt_position = _centroid_from_mask(gt_mask)
+    def sink(result):
+        nonlocal first_frame_at
+        frame, idx, refined_mask, position, status, quality_info = result
+        if args.mask_stream:
+            with profiler.stage(idx, "encode"):
+                out.write(frame)
+                masks_out.write(refined_mask)
 
-            metrics_logger.log(
-                frame_idx=idx,
-                status=status,
-                quality_info=quality_info,
-                pred_mask=refined_mask,
-                gt_mask=gt_mask,
-                predicted_pos=position,
-                gt_pos=gt_position,
-            )
+            def render_keyframe() -> np.ndarray:
+                # Overlays are drawn (after encoding) only for the saved keyframes
+                with profiler.stage(idx, "render"):
+                    return renderer.render(
+                        frame, idx, refined_mask, position, status, quality_info
+                    )
 
-            colored_mask = np.zeros_like(frame)
-            colored_mask[:, :, 1] = refined_mask
+            recorder.observe(idx, status, quality_info, render_keyframe)
+        elif not args.no_render:
+            # Decoded frames are not reused until this frame is written, so draw on them in place
+            with profiler.stage(idx, "render"):
+                output_frame = renderer.render(
+                    frame, idx, refined_mask, position, status, quality_info
+                )
+            with profiler.stage(idx, "encode"):
+                out.write(output_frame)
+            recorder.observe(idx, status, quality_info, lambda: output_frame)
+        profiler.finish(idx)
+        if profiler.enabled:
+            metrics_logger.complete(idx, profiler.frame_ms(idx))
 
-            alpha = 0.5
-            if status.startswith("Occluded"):
-                colored_mask[:, :, 1] = 0
-                colored_mask[:, :, 2] = refined_mask
+        if first_frame_at is None:
+            first_frame_at = time.perf_counter()
+        if idx % 20 == 0:
+            print(f"Processed Frame {idx}: {status}")
 
-            output_frame = cv2.addWeighted(frame, 1, colored_mask, alpha, 0)
+    if args.shards > 1:
+        # Imported lazily: sharding imports this module for its workers
+        from sharding import run_sharded
 
-            cv2.putText(
-                output_frame,
-                f"Frame: {idx}",
-                (10, 30),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (255, 255, 255),
-                2,
-            )
-            cv2.putText(
-                output_frame,
-                f"Status: {status}",
-                (10, 60),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (255, 255, 255),
-                2,
-            )
-            cv2.putText(
-                output_frame,
-                f"Quality: {quality_info['quality']:.2f} / {quality_info['threshold']:.2f}",
-                (10, 90),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (255, 255, 255),
-                2,
-            )
-            cv2.circle(output_frame, position, 5, (0, 0, 255), -1)
-
-            out.write(output_frame)
-
-            if quality_info["is_reliable"] and keyframes["tracking"] is None:
-                _save_frame(frames_dir, "tracking", idx, output_frame)
-                keyframes["tracking"] = idx
-            if status.startswith("Occluded") and keyframes["occlusion"] is None:
-                _save_frame(frames_dir, "occlusion", idx, output_frame)
-                keyframes["occlusion"] = idx
-            if (
-                status == "Tracking"
-                and previous_status.startswith("Occluded")
-                and keyframes["recovery"] is None
-            ):
-                _save_frame(frames_dir, "recovery", idx, output_frame)
-                keyframes["recovery"] = idx
-
-            previous_status = status
-
-            if idx % 20 == 0:
-                print(f"Processed Frame {idx}: {status}")
-
-    out.release()
-    metrics_path = os.path.join(metrics_dir, "run_metrics.csv")
-    plot_path = os.path.join(metrics_dir, "run_metrics.png")
-    metrics_logger.save_csv(metrics_path)
-    metrics_logger.plot_curves(plot_path)
-    print(f"Processing Complete. Output saved to {output_path}")
+        out = masks_out = None
+
+        memory_reports, cache_report = run_sharded(
+            args, video_path, output_path, frames_dir, metrics_dir, metrics_logger
+        )
+        memory_manager = None
+    elif args.live is not None:
+        # Imported lazily: only live runs need the capture thread
+        from live import LiveSource, run_live
+
+        out = masks_out = None
+        if not args.no_render:
+            out = _open_writer(output_path, codec=args.codec, backend=args.encoder)
+        if args.mask_stream:
+            masks_out = MaskStreamWriter(mask_stream_path, OUTPUT_FPS, OUTPUT_SIZE, args.encoder)
+        source = LiveSource(
+            args.live or video_path,
+            resize_dim=OUTPUT_SIZE,
+            fallback_fps=OUTPUT_FPS,
+            buffer_size=args.live_buffer,
+            max_seconds=args.live_seconds,
+        )
+        try:
+            with source:
+                deadline_ms = args.deadline_ms or 1000.0 / source.fps
+                live_report = run_live(
+                    source,
+                    process,
+                    lambda item: process(item, coast=True),
+                    sink,
+                    deadline_ms,
+                    max_coast=args.max_coast,
+                )
+        finally:
+            _release(out, masks_out)
+        cache_report = _cache_stats(predictor)
+    else:
+        out = masks_out = None
+        try:
+            with loader as video:
+                # Output keeps the source frame rate; the synthetic clip has none
+                fps = video.fps() or OUTPUT_FPS
+                size = video.output_size()
+                if not args.no_render:
+                    out = _open_writer(output_path, fps, size, args.codec, args.encoder)
+                if args.mask_stream:
+                    masks_out = MaskStreamWriter(mask_stream_path, fps, size, args.encoder)
+                frames = profiler.timed_source(video.stream_frames())
+                if args.pipelined:
+                    run_staged(frames, process, sink, queue_size=args.queue_size)
+                else:
+                    for item in frames:
+                        sink(process(item))
+        finally:
+            _release(out, masks_out)
+        cache_report = _cache_stats(predictor)
+    metrics_logger.close()
+    if pred_stack is not None:
+        _evaluate_after_run(
+            metrics_dir, metrics_path, pred_stack, gt_stack, positions, args.gt_stack
+        )
+    if not args.no_plot:
+        metrics_logger.plot_curves(plot_path)
+    if args.no_render:
+        print("Processing Complete. No output video written (--no-render)")
+    else:
+        print(f"Processing Complete. Output saved to {output_path}")
+    if args.mask_stream:
+        print(f"Mask stream saved to {mask_stream_path}")
     print(f"Metrics saved to {metrics_path}")
-    print(f"Plot saved to {plot_path}")
+    if not args.no_plot:
+        print(f"Plot saved to {plot_path}")
+    if args.trace_json:
+        profiler.export_chrome_trace(args.trace_json)
+        print(f"Chrome trace saved to {args.trace_json}")
+    if args.shards > 1 and any(memory_reports):
+        report_path = os.path.join(metrics_dir, "memory_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump({"shards": memory_reports}, handle, indent=2)
+        print(f"Memory report saved to {report_path}")
+    if memory_manager is not None:
+        report = memory_manager.footprint()
+        report_path = os.path.join(metrics_dir, "memory_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(
+            f"Memory buffer: {report['entries']} masks, "
+            f"{report['stored_bytes'] / 1024:.1f} KiB stored "
+            f"(peak {report['peak_bytes'] / 1024:.1f} KiB, "
+            f"full-frame equivalent {report['full_frame_equivalent_bytes'] / 1024:.1f} KiB)"
+        )
+        print(f"Memory report saved to {report_path}")
+    if args.live is not None:
+        report_path = os.path.join(metrics_dir, "live_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump(live_report, handle, indent=2)
+        latency = live_report["latency_ms"]
+        print(
+            f"Live: {live_report['frames_processed']}/{live_report['frames_captured']} frames "
+            f"processed at {live_report['source_fps']:.1f} FPS source, "
+            f"{live_report['drop_rate']:.1%} dropped, {live_report['coast_rate']:.1%} coasted; "
+            f"latency p50 {latency['p50']:.1f}ms p95 {latency['p95']:.1f}ms; "
+            f"{live_report['misses_per_second']:.2f} deadline misses/s "
+            f"({live_report['deadline_ms']:.1f}ms budget)"
+        )
+        print(f"Live report saved to {report_path}")
+    if args.flow_propagation and args.shards <= 1:
+        flow_report = tracker.propagator.stats()
+        print(
+            f"Flow propagation: {flow_report['frames']} occluded frames warped "
+            f"({flow_report['failures']} fell back), {flow_report['mean_ms']:.2f} ms/frame"
+        )
+    if args.roi and args.shards <= 1:
+        roi_report = predictor.roi_stats()
+        report_path = os.path.join(metrics_dir, "roi_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump(roi_report, handle, indent=2)
+        print(
+            f"ROI prediction: {roi_report['roi_frames']} windowed / "
+            f"{roi_report['full_frames']} full-frame searches "
+            f"({roi_report['fallbacks']} fallbacks), "
+            f"{roi_report['pixel_fraction']:.1%} of full-frame pixels"
+        )
+        print(f"ROI report saved to {report_path}")
+    if scheduler is not None:
+        schedule_report = scheduler.report()
+        schedule_report["mean_iou"] = metrics_logger.summary.as_dict()["mean_iou"]
+        if shadow is not None:
+            reference = shadow[-1].summary.as_dict()["mean_iou"]
+            schedule_report["every_frame_mean_iou"] = reference
+            schedule_report["iou_cost"] = reference - schedule_report["mean_iou"]
+        report_path = os.path.join(metrics_dir, "schedule_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump(schedule_report, handle, indent=2)
+        cost = (
+            f", IoU cost {schedule_report['iou_cost']:+.4f} vs every frame "
+            f"({schedule_report['every_frame_mean_iou']:.4f})"
+            if shadow is not None
+            else ""
+        )
+        print(
+            f"Keyframe schedule: inferred {schedule_report['inferred']}/{schedule_report['frames']} "
+            f"frames ({schedule_report['inferred_fraction']:.1%}), "
+            f"mean IoU {schedule_report['mean_iou']:.4f}{cost}"
+        )
+        print(f"Schedule report saved to {report_path}")
+    if cache_report is not None:
+        report_path = os.path.join(metrics_dir, "cache_report.json")
+        write_cache_report(report_path, cache_report)
+        print(
+            f"Prediction cache: {cache_report['hits']} hits, {cache_report['misses']} misses "
+            f"({cache_report['hit_rate']:.0%} hit rate), {cache_report['evictions']} evictions, "
+            f"{cache_report['cache_bytes'] / 1024:.1f} KiB on disk"
+        )
+        print(f"Cache report saved to {report_path}")
+
+    first_frame_seconds = None if first_frame_at is None else first_frame_at - started
+    startup = {
+        "warm": warm,
+        "import_seconds": import_seconds,
+        "setup_seconds": setup_seconds,
+        "first_frame_seconds": first_frame_seconds,
+        "cold_start_seconds": import_seconds + (first_frame_seconds or setup_seconds),
+        "total_seconds": time.perf_counter() - started,
+    }
+    report_path = os.path.join(metrics_dir, "startup_report.json")
+    with open(report_path, "w", encoding="utf-8") as handle:
+        json.dump(startup, handle, indent=2)
+    print(
+        f"{'Warm' if warm else 'Cold'} start: {startup['cold_start_seconds']:.3f}s to first frame "
+        f"(imports {import_seconds:.3f}s CPU, setup {setup_seconds:.3f}s)"
+    )
+    return startup
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from packed_mask import PackedMask
+
+Prediction = Tuple[List[np.ndarray], List[float]]
+
+
+class CachedPredictor:
+    """Disk-backed memo of ``SAM2Predictor`` outputs.
+
+    Entries are keyed by video fingerprint, predictor version and frame index
+    (plus the point prompt and the ``roi`` search window when given, so a
+    windowed prediction is only replayed for the same window) and stored as
+    bit-packed, zlib-compressed ``.npz`` files. File mtimes double as the LRU clock: a hit
+    touches its entry, and once the cache exceeds ``max_bytes`` the oldest
+    entries are evicted down to ``low_water`` of the cap. Writes are atomic
+    renames, so shard worker processes can share one cache directory.
+    """
+
+    def __init__(
+        self,
+        predictor,
+        cache_dir: str,
+        video_fingerprint: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        low_water: float = 0.9,
+    ):
+        self.predictor = predictor
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        namespace = hashlib.sha1(
+            f"{video_fingerprint}:{predictor.version}".encode()
+        ).hexdigest()[:16]
+        self.entry_dir = os.path.join(cache_dir, namespace)
+        os.makedirs(self.entry_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_written = 0
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def __getattr__(self, name):
+        # Everything else (version, mock, reprompt, ...) is the wrapped predictor's
+        if name == "predictor":
+            raise AttributeError(name)
+        return getattr(self.predictor, name)
+
+    def predict(self, frame, frame_idx, point=None, roi=None) -> Prediction:
+        return self.predict_batch([frame], [frame_idx], [point], [roi])[0]
+
+    def predict_batch(self, frames, frame_indices, points=None, rois=None) -> List[Prediction]:
+        points = list(points) if points is not None else [None] * len(frames)
+        rois = list(rois) if rois is not None else [None] * len(frames)
+        results: List[Optional[Prediction]] = []
+        missing = []
+        for slot, (frame_idx, point, roi) in enumerate(zip(frame_indices, points, rois)):
+            cached = self._load(self._path(frame_idx, point, roi))
+            if cached is None:
+                missing.append(slot)
+            else:
+                # Keep the predictor's default prompt where inference would have left it
+                self.predictor.update_prompt(cached[0])
+            results.append(cached)
+        self.hits += len(frames) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Full-frame misses share one encoder batch; windowed ones run one by one
+            batched = [slot for slot in missing if rois[slot] is None]
+            computed = {}
+            if batched:
+                predictions = self.predictor.predict_batch(
+                    [frames[slot] for slot in batched],
+                    [frame_indices[slot] for slot in batched],
+                    [points[slot] for slot in batched],
+                )
+                computed = dict(zip(batched, predictions))
+            for slot in missing:
+                if slot not in computed:
+                    computed[slot] = self.predictor.predict(
+                        frames[slot], frame_indices[slot], points[slot], roi=rois[slot]
+                    )
+            for slot in missing:
+                masks, scores = computed[slot]
+                results[slot] = (masks, scores)
+                self._store(
+                    self._path(frame_indices[slot], points[slot], rois[slot]),
+                    masks,
+                    scores,
+                    frames[slot].shape[:2],
+                )
+            self._evict()
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes_written": self.bytes_written,
+            "cache_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _path(
+        self,
+        frame_idx: int,
+        point: Optional[Tuple[float, float]],
+        roi: Optional[Tuple[int, int, int, int]] = None,
+    ) -> str:
+        name = f"{frame_idx:08d}"
+        if point is not None:
+            name += "_" + hashlib.sha1(repr(tuple(point)).encode()).hexdigest()[:8]
+        if roi is not None:
+            name += "_roi{}x{}+{}+{}".format(roi[2], roi[3], roi[0], roi[1])
+        return os.path.join(self.entry_dir, name + ".npz")
+
+    def _load(self, path: str) -> Optional[Prediction]:
+        try:
+            with np.load(path) as entry:
+                packed = entry["packed"]
+                width = int(entry["shape"][-1])
+                scores = [float(v) for v in entry["scores"]]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            # Truncated or foreign file: drop it and recompute
+            self._remove(path)
+            return None
+        os.utime(path)
+        bits = np.unpackbits(packed, axis=-1, count=width)
+        if getattr(self.predictor, "packed", False):
+            return [PackedMask.from_mask(plane) for plane in bits], scores
+        masks = [plane * np.uint8(255) for plane in bits]
+        return masks, scores
+
+    def _store(
+        self,
+        path: str,
+        masks: Sequence[np.ndarray],
+        scores: Sequence[float],
+        shape: Tuple[int, int],
+    ) -> None:
+        packed = (
+            np.stack([_packed_rows(mask) for mask in masks])
+            if masks
+            else np.zeros((0, shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        )
+        handle, temp_path = tempfile.mkstemp(dir=self.entry_dir, suffix=".tmp")
+        with os.fdopen(handle, "wb") as stream:
+            np.savez_compressed(
+                stream,
+                packed=packed,
+                shape=np.asarray(masks[0].shape if masks else tuple(shape)),
+                scores=np.asarray(scores, dtype=np.float64),
+            )
+        size = os.path.getsize(temp_path)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(temp_path, path)
+        self.bytes_written += size
+        self._total_bytes += size - previous
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        """(mtime, path, size) for every entry across all cached videos/models."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".npz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, path, info.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Re-scan: other processes may have added or evicted entries
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, _, size in entries)
+        target = self.max_bytes * self.low_water
+        for _, path, size in entries:
+            if self._total_bytes <= target:
+                break
+            if self._remove(path):
+                self._total_bytes -= size
+                self.evictions += 1
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def _packed_rows(mask) -> np.ndarray:
+    if isinstance(mask, PackedMask):
+        return mask.packed_rows()
+    return np.packbits(np.asarray(mask) > 0, axis=-1)
+
+
+def write_cache_report(path: str, stats: Dict[str, float]) -> None:
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(stats, handle, indent=2)
+
+
+def merge_cache_stats(reports: List[Optional[Dict[str, float]]]) -> Optional[Dict[str, float]]:
+    """Sum per-process cache counters (e.g. from shard workers)."""
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+    merged = {
+        key: sum(report[key] for report in reports)
+        for key in ("hits", "misses", "evictions", "bytes_written")
+    }
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = merged["hits"] / lookups if lookups else 0.0
+    merged["cache_bytes"] = max(report["cache_bytes"] for report in reports)
+    merged["max_bytes"] = reports[0]["max_bytes"]
+    return merged
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional
+
+PROFILE_STAGES = ("decode", "predict", "quality", "track", "memory", "render", "encode")
+
+
+class StageProfiler:
+    """Records per-frame wall time of each pipeline stage.
+
+    Durations accumulate per ``(frame_idx, stage)`` so a stage entered several
+    times for one frame (memory store + retrieve) is summed. Stages may run on
+    different threads; every write goes through one lock. A frame's entries
+    are dropped once ``frame_ms`` has read them, unless ``trace=True``, which
+    keeps them and also each interval as an event for Chrome-trace export.
+    """
+
+    def __init__(self, enabled: bool = True, trace: bool = False):
+        self.enabled = enabled
+        self.trace = trace
+        self._durations: Dict[int, Dict[str, float]] = {}
+        self._finished: Dict[int, float] = {}
+        self._events: List[tuple] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def stage(self, frame_idx: int, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(frame_idx, name)
+
+    @contextmanager
+    def _timed(self, frame_idx: int, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(frame_idx, name, start, time.perf_counter())
+
+    def record(self, frame_idx: int, name: str, start: float, end: float) -> None:
+        with self._lock:
+            stages = self._durations.setdefault(frame_idx, {})
+            stages[name] = stages.get(name, 0.0) + (end - start)
+            if self.trace:
+                self._events.append((name, frame_idx, threading.current_thread().name, start, end))
+
+    def exclude(self, frame_idx: int, outer: str, inner: str) -> None:
+        """Remove time spent in ``inner`` from an ``outer`` stage that wrapped it."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stages = self._durations.get(frame_idx, {})
+            if outer in stages and inner in stages:
+                stages[outer] = max(0.0, stages[outer] - stages[inner])
+
+    def finish(self, frame_idx: int) -> None:
+        """Mark the moment a frame left the pipeline (used for effective FPS)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._finished[frame_idx] = time.perf_counter() - self._origin
+
+    def timed_source(self, source: Iterable[tuple]) -> Iterator[tuple]:
+        """Wrap a ``(frame, idx, gt)`` iterator and time each decode step."""
+        iterator = iter(source)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            if self.enabled:
+                self.record(item[1], "decode", start, time.perf_counter())
+            yield item
+
+    def frame_ms(self, frame_idx: int) -> Optional[Dict[str, float]]:
+        """Stage times in milliseconds for one frame plus its finish timestamp.
+
+        Without ``trace`` the frame's entries are released here, so long
+        (e.g. live) runs hold only the frames still in flight; call it once
+        per finished frame.
+        """
+        with self._lock:
+            if self.trace:
+                stages = self._durations.get(frame_idx)
+                finished = self._finished.get(frame_idx)
+            else:
+                stages = self._durations.pop(frame_idx, None)
+                finished = self._finished.pop(frame_idx, None)
+            if stages is None:
+                return None
+            result = {stage: stages.get(stage, 0.0) * 1e3 for stage in PROFILE_STAGES}
+            if finished is not None:
+                result["wall"] = finished * 1e3
+            return result
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write recorded intervals as Chrome trace-event JSON (chrome://tracing)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+        threads = sorted({thread for _, _, thread, _, _ in events})
+        tids = {thread: tid for tid, thread in enumerate(threads, start=1)}
+        trace = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tids[thread],
+                "args": {"name": thread},
+            }
+            for thread in threads
+        ]
+        for name, frame_idx, thread, start, end in events:
+            trace.append(
+                {
+                    "name": name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": tids[thread],
+                    "args": {"frame": frame_idx},
+                }
+            )
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, handle)
+
+
+class TimedMemory:
+    """Memory-manager proxy that books store/retrieve time to the memory stage."""
+
+    def __init__(self, manager, profiler: StageProfiler, frame_idx: int):
+        self._manager = manager
+        self._profiler = profiler
+        self._frame_idx = frame_idx
+
+    def store(self, *args, **kwargs):
+        with self._profiler.stage(self._frame_idx, "memory"):
+            return self._manager.store(*args, **kwargs)
+
+    def retrieve(self, *args, **kwargs):
+        with self._profiler.stage(self._frame_idx, "memory"):
+            return self._manager.retrieve(*args, **kwargs)
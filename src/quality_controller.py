@@ -1,20 +1,93 @@
+import math
 import numpy as np
+from bisect import bisect_left, insort
 from collections import deque
 
+from mask_stats import MaskStats
+
+MIN_THRESHOLD = 0.35
+MAX_THRESHOLD = 0.85
+
+
+def _clamp_threshold(avg_score, avg_area):
+    dynamic = 0.5 * avg_score + 0.4 * avg_area
+    return max(MIN_THRESHOLD, min(MAX_THRESHOLD, dynamic))
+
+
+class _RunningWindow:
+    """Fixed-length window with an O(1) running mean and an optional sorted copy.
+
+    The running sum is rebuilt exactly (``math.fsum``) once per ``size``
+    evictions, so rounding drift, or a NaN that has left the window, cannot
+    persist. The sorted copy is maintained with bisection for sliding
+    quantiles.
+    """
+
+    def __init__(self, size, keep_sorted=False):
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.sorted = [] if keep_sorted else None
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        values = self.values
+        if len(values) == values.maxlen:
+            evicted = values[0]
+            self.total -= evicted
+            if self.sorted is not None:
+                del self.sorted[bisect_left(self.sorted, evicted)]
+            self._evictions += 1
+        values.append(value)
+        self.total += value
+        if self._evictions >= values.maxlen:
+            self.total = math.fsum(values)
+            self._evictions = 0
+        if self.sorted is not None:
+            insort(self.sorted, value)
+
+    def mean(self):
+        return self.total / len(self.values)
+
+    def quantile(self, q):
+        """Linearly interpolated quantile, matching ``np.quantile``'s default."""
+        ordered = self.sorted
+        position = q * (len(ordered) - 1)
+        lower = int(position)
+        low = ordered[lower]
+        high = ordered[min(lower + 1, len(ordered) - 1)]
+        fraction = position - lower
+        # numpy's lerp: interpolate from the nearer end
+        if fraction >= 0.5:
+            return high - (high - low) * (1 - fraction)
+        return low + (high - low) * fraction
+
 
 class QualityController:
-    """Tracks recent predictions to build an adaptive reliability threshold."""
+    """Tracks recent predictions to build an adaptive reliability threshold.
 
-    def __init__(self, window_size=15, min_samples=5):
-        self.scores = deque(maxlen=window_size)
-        self.areas = deque(maxlen=window_size)
+    Window means come from running sums, so each frame costs O(1) whatever
+    the window length. ``robust=True`` uses a sliding ``quantile`` of the
+    window instead (the median by default), which outlier scores cannot drag.
+    """
+
+    def __init__(self, window_size=15, min_samples=5, robust=False, quantile=0.5):
+        self._scores = _RunningWindow(window_size, keep_sorted=robust)
+        self._areas = _RunningWindow(window_size, keep_sorted=robust)
+        self.scores = self._scores.values
+        self.areas = self._areas.values
         self.min_samples = min_samples
+        self.robust = robust
+        self.quantile = quantile
 
-    def evaluate(self, mask, score):
-        mask_area = float(np.count_nonzero(mask))
-        norm_area = mask_area / float(mask.size)
-        self.scores.append(score)
-        self.areas.append(norm_area)
+    def evaluate(self, mask, score, stats=None):
+        stats = MaskStats.of(mask, stats)
+        mask_area = float(stats.area)
+        norm_area = mask_area / float(stats.size)
+        self._scores.append(score)
+        self._areas.append(norm_area)
         adaptive_threshold = self._adaptive_threshold()
         quality = 0.6 * score + 0.4 * norm_area
         is_reliable = quality >= adaptive_threshold
@@ -25,10 +98,115 @@ class QualityController:
             "norm_area": norm_area,
         }
 
+    @property
+    def threshold(self):
+        """Current adaptive threshold, without recording a new sample."""
+        return self._adaptive_threshold()
+
     def _adaptive_threshold(self):
-        if len(self.scores) < self.min_samples:
-            return 0.35
-        avg_score = float(np.mean(self.scores))
-        avg_area = float(np.mean(self.areas))
-        dynamic = 0.5 * avg_score + 0.4 * avg_area
-        return max(0.35, min(0.85, dynamic))
+        if len(self._scores) < self.min_samples:
+            return MIN_THRESHOLD
+        if self.robust:
+            return _clamp_threshold(
+                self._scores.quantile(self.quantile), self._areas.quantile(self.quantile)
+            )
+        return _clamp_threshold(self._scores.mean(), self._areas.mean())
+
+
+class MultiQualityController:
+    """Per-track adaptive thresholds for many objects, held in stacked arrays.
+
+    Each track row keeps a ring of its last ``window_size`` scores and
+    normalized areas plus their running sums, so ``evaluate_many`` scores
+    every track in one vectorized call. Row ``i`` behaves exactly like its
+    own ``QualityController`` fed the same samples.
+    """
+
+    def __init__(self, tracks, window_size=15, min_samples=5, robust=False, quantile=0.5):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.robust = robust
+        self.quantile = quantile
+        self.scores = np.full((tracks, window_size), np.nan)
+        self.areas = np.full((tracks, window_size), np.nan)
+        self.score_sums = np.zeros(tracks)
+        self.area_sums = np.zeros(tracks)
+        self.counts = np.zeros(tracks, np.int64)
+        self.cursors = np.zeros(tracks, np.int64)
+        self._evictions = np.zeros(tracks, np.int64)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def reset(self, rows):
+        """Forget the history of ``rows`` (e.g. a track that was re-assigned)."""
+        self.scores[rows] = np.nan
+        self.areas[rows] = np.nan
+        self.score_sums[rows] = 0.0
+        self.area_sums[rows] = 0.0
+        self.counts[rows] = 0
+        self.cursors[rows] = 0
+        self._evictions[rows] = 0
+
+    def evaluate_many(self, masks, scores, rows=None):
+        """Record one mask/score per track and return per-track quality arrays.
+
+        ``masks`` is ``(N, H, W)`` (or a sequence of equally shaped masks) and
+        ``scores`` has length N; ``rows`` names the tracks they belong to
+        (default: tracks ``0..N-1``) and must be unique. Returns the same keys as
+        ``QualityController.evaluate`` with arrays of length N.
+        """
+        masks = np.asarray(masks)
+        scores = np.asarray(scores, dtype=np.float64)
+        rows = np.arange(len(scores)) if rows is None else np.asarray(rows, dtype=np.int64)
+        flat = masks.reshape(len(masks), -1)
+        norm_area = np.count_nonzero(flat, axis=1) / float(flat.shape[1])
+
+        cursors = self.cursors[rows]
+        full = self.counts[rows] == self.window_size
+        # Same operation order as _RunningWindow, so results match bit for bit
+        self.score_sums[rows] -= np.where(full, self.scores[rows, cursors], 0.0)
+        self.area_sums[rows] -= np.where(full, self.areas[rows, cursors], 0.0)
+        self.scores[rows, cursors] = scores
+        self.areas[rows, cursors] = norm_area
+        self.score_sums[rows] += scores
+        self.area_sums[rows] += norm_area
+        self.counts[rows] = np.minimum(self.counts[rows] + 1, self.window_size)
+        self.cursors[rows] = (cursors + 1) % self.window_size
+        self._evictions[rows] += full
+        for row in rows[self._evictions[rows] >= self.window_size]:
+            self.score_sums[row] = math.fsum(self.scores[row])
+            self.area_sums[row] = math.fsum(self.areas[row])
+            self._evictions[row] = 0
+
+        threshold = self._thresholds(rows)
+        quality = 0.6 * scores + 0.4 * norm_area
+        return {
+            "is_reliable": quality >= threshold,
+            "quality": quality,
+            "threshold": threshold,
+            "norm_area": norm_area,
+        }
+
+    def thresholds(self):
+        """Current adaptive threshold of every track."""
+        return self._thresholds(np.arange(len(self)))
+
+    def _thresholds(self, rows):
+        counts = self.counts[rows]
+        thresholds = np.full(len(rows), MIN_THRESHOLD)
+        ready = counts >= max(self.min_samples, 1)
+        if not ready.any():
+            return thresholds
+        ready_rows = rows[ready]
+        if self.robust:
+            # Unfilled ring slots are NaN, so nanquantile sees only the window
+            avg_score = np.nanquantile(self.scores[ready_rows], self.quantile, axis=1)
+            avg_area = np.nanquantile(self.areas[ready_rows], self.quantile, axis=1)
+        else:
+            avg_score = self.score_sums[ready_rows] / counts[ready]
+            avg_area = self.area_sums[ready_rows] / counts[ready]
+        thresholds[ready] = np.clip(
+            0.5 * avg_score + 0.4 * avg_area, MIN_THRESHOLD, MAX_THRESHOLD
+        )
+        return thresholds
@@ -0,0 +1,139 @@
+from typing import List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from mask_stats import MaskStats
+from packed_mask import mask_window
+
+Color = Tuple[int, int, int]
+
+TRACKING_COLOR: Color = (0, 255, 0)
+OCCLUDED_COLOR: Color = (0, 0, 255)
+# BGR colours for additional objects; the primary object keeps the status colour
+PALETTE: Tuple[Color, ...] = (
+    (255, 0, 0),
+    (0, 255, 255),
+    (255, 0, 255),
+    (255, 255, 0),
+    (0, 128, 255),
+    (255, 128, 0),
+    (128, 0, 255),
+    (0, 255, 128),
+)
+
+
+class OverlayRenderer:
+    """Draws mask overlays and the status HUD without full-frame temporaries.
+
+    Each mask is blended only inside its bounding box, directly into the
+    output image, using a colour scratch buffer that is allocated once and
+    grown on demand. Outside the box the old full-frame blend added zero, so
+    the result is pixel-identical to ``cv2.addWeighted(frame, 1, colored, a, 0)``.
+    """
+
+    def __init__(self, alpha: float = 0.5, palette: Sequence[Color] = PALETTE):
+        self.alpha = alpha
+        self.palette = tuple(palette)
+        self._scratch = np.zeros((0, 0, 3), dtype=np.uint8)
+        self._scaled = np.zeros((0, 0), dtype=np.uint16)
+
+    def blend(
+        self,
+        image: np.ndarray,
+        mask: np.ndarray,
+        color: Color,
+        stats: Optional[MaskStats] = None,
+    ) -> None:
+        """Add ``alpha * mask * color / 255`` to ``image`` in place."""
+        x, y, w, h = MaskStats.of(mask, stats).bbox
+        if w == 0 or h == 0:
+            return
+        roi = image[y : y + h, x : x + w]
+        # Packed masks are unpacked here, and only inside their box
+        mask_roi = mask_window(mask, x, y, w, h)
+        colored = self._colored(mask_roi, color)
+        cv2.addWeighted(roi, 1, colored, self.alpha, 0, dst=roi)
+
+    def blend_objects(
+        self,
+        image: np.ndarray,
+        masks: Sequence[np.ndarray],
+        colors: Optional[Sequence[Color]] = None,
+    ) -> None:
+        """Blend several object masks in one pass, one palette colour each."""
+        for i, mask in enumerate(masks):
+            color = colors[i] if colors is not None else self.palette[i % len(self.palette)]
+            self.blend(image, mask, color)
+
+    def render(
+        self,
+        frame: np.ndarray,
+        idx: int,
+        masks: Union[np.ndarray, Sequence[np.ndarray]],
+        position: Tuple[int, int],
+        status: str,
+        quality_info: dict,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Overlay masks and the HUD on ``frame`` (in place unless ``out`` is given).
+
+        ``masks`` is the refined mask or a list whose first entry is the
+        tracked object; extra entries get palette colours.
+        """
+        if out is None:
+            image = frame
+        else:
+            np.copyto(out, frame)
+            image = out
+        if isinstance(masks, (np.ndarray, MaskStats)):
+            masks = [masks]
+        predicted = status.startswith(("Occluded", "Coasting"))
+        primary = OCCLUDED_COLOR if predicted else TRACKING_COLOR
+        if masks:
+            self.blend(image, masks[0], primary)
+            self.blend_objects(image, masks[1:])
+        self._draw_hud(image, idx, position, status, quality_info)
+        return image
+
+    def _colored(self, mask_roi: np.ndarray, color: Color) -> np.ndarray:
+        h, w = mask_roi.shape
+        if self._scratch.shape[0] < h or self._scratch.shape[1] < w:
+            grown = (max(h, self._scratch.shape[0]), max(w, self._scratch.shape[1]))
+            self._scratch = np.zeros(grown + (3,), dtype=np.uint8)
+            self._scaled = np.zeros(grown, dtype=np.uint16)
+        colored = self._scratch[:h, :w]
+        for channel, value in enumerate(color):
+            if value == 0:
+                colored[:, :, channel] = 0
+            elif value == 255:
+                colored[:, :, channel] = mask_roi
+            else:
+                scaled = self._scaled[:h, :w]
+                np.multiply(mask_roi, value, out=scaled)
+                scaled //= 255
+                colored[:, :, channel] = scaled
+        return colored
+
+    @staticmethod
+    def _draw_hud(
+        image: np.ndarray,
+        idx: int,
+        position: Tuple[int, int],
+        status: str,
+        quality_info: dict,
+    ) -> None:
+        lines: List[Tuple[str, int, float]] = [
+            (f"Frame: {idx}", 30, 0.7),
+            (f"Status: {status}", 60, 0.7),
+            (
+                f"Quality: {quality_info['quality']:.2f} / {quality_info['threshold']:.2f}",
+                90,
+                0.6,
+            ),
+        ]
+        for text, y, scale in lines:
+            cv2.putText(
+                image, text, (10, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), 2
+            )
+        cv2.circle(image, position, 5, (0, 0, 255), -1)
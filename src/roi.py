@@ -0,0 +1,140 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from occlusion_handler import KalmanTracker
+from packed_mask import mask_window
+from sam2_model import SAM2Predictor
+
+Roi = Tuple[int, int, int, int]
+
+
+class RoiPredictor:
+    """Segments only a window around the tracker's predicted position.
+
+    The window is centred on ``KalmanTracker.peek()``, which does not advance
+    the filter, and sized to the last measured mask plus a margin. The
+    margin grows with the estimated speed and the predicted position
+    standard deviation. Full-frame search is used until the tracker has a
+    measured mask, and again after a miss: when the window yields no
+    confident mask, or the mask touches a window edge that is not a frame
+    edge, the same frame is re-run on the full frame. Full-frame mode then
+    stays on until a full-frame prediction is confident again.
+
+    Attribute access is delegated to the wrapped predictor, so this drops in
+    wherever a ``SAM2Predictor`` is expected. The wrapped predictor may be a
+    ``CachedPredictor``; it then caches each window under its own key.
+    """
+
+    def __init__(
+        self,
+        predictor: SAM2Predictor,
+        tracker: KalmanTracker,
+        min_margin: int = 16,
+        velocity_gain: float = 2.0,
+        sigma_gain: float = 3.0,
+        min_score: float = 0.5,
+    ):
+        self.predictor = predictor
+        self.tracker = tracker
+        self.min_margin = min_margin
+        self.velocity_gain = velocity_gain
+        self.sigma_gain = sigma_gain
+        self.min_score = min_score
+        self.full_frame = True
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.fallbacks = 0
+        self.pixels = 0
+        self.frame_pixels = 0
+
+    def __getattr__(self, name):
+        if name == "predictor":
+            raise AttributeError(name)
+        return getattr(self.predictor, name)
+
+    @property
+    def version(self) -> str:
+        return f"{self.predictor.version}+roi"
+
+    def window(self, frame_shape: Tuple[int, ...]) -> Optional[Roi]:
+        """Search window for the next frame, or None for a full-frame search."""
+        stats = self.tracker.last_mask_stats
+        if self.full_frame or stats is None:
+            return None
+        height, width = frame_shape[:2]
+        cx, cy = self.tracker.peek()
+        vx, vy = self.tracker.velocity()
+        margin = (
+            self.min_margin
+            + self.velocity_gain * math.hypot(vx, vy)
+            + self.sigma_gain * self.tracker.predicted_position_std()
+        )
+        _, _, obj_w, obj_h = stats.bbox
+        half_w = obj_w / 2.0 + margin
+        half_h = obj_h / 2.0 + margin
+        x0 = max(0, int(math.floor(cx - half_w)))
+        y0 = max(0, int(math.floor(cy - half_h)))
+        x1 = min(width, int(math.ceil(cx + half_w)) + 1)
+        y1 = min(height, int(math.ceil(cy + half_h)) + 1)
+        if x1 - x0 >= width and y1 - y0 >= height:
+            return None
+        if x1 <= x0 or y1 <= y0:
+            # Predicted position left the frame
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+
+    def predict(self, frame: np.ndarray, frame_idx: int, point=None) -> Tuple[List, List]:
+        frame_pixels = frame.shape[0] * frame.shape[1]
+        self.frame_pixels += frame_pixels
+        roi = self.window(frame.shape)
+        if roi is not None:
+            self.roi_frames += 1
+            self.pixels += roi[2] * roi[3]
+            masks, scores = self.predictor.predict(frame, frame_idx, point, roi=roi)
+            x, y, w, h = roi
+            if self._confident(mask_window(masks[0], x, y, w, h), scores) and not self._clipped(
+                masks[0], roi, frame.shape
+            ):
+                return masks, scores
+            self.fallbacks += 1
+        self.full_frames += 1
+        self.pixels += frame_pixels
+        masks, scores = self.predictor.predict(frame, frame_idx, point)
+        self.full_frame = not self._confident(masks[0], scores)
+        return masks, scores
+
+    def predict_batch(self, frames, frame_indices, points=None) -> List[Tuple[List, List]]:
+        """Predict each frame in turn, each through its own search window."""
+        points = list(points) if points is not None else [None] * len(frames)
+        return [
+            self.predict(frame, frame_idx, point)
+            for frame, frame_idx, point in zip(frames, frame_indices, points)
+        ]
+
+    def _confident(self, mask: np.ndarray, scores: List[float]) -> bool:
+        return scores[0] >= self.min_score and bool(mask.any())
+
+    @staticmethod
+    def _clipped(mask: np.ndarray, roi: Roi, frame_shape: Tuple[int, ...]) -> bool:
+        """True if the mask touches a window edge that is not a frame edge."""
+        x, y, w, h = roi
+        height, width = frame_shape[:2]
+        crop = mask_window(mask, x, y, w, h)
+        return bool(
+            (x > 0 and crop[:, 0].any())
+            or (y > 0 and crop[0, :].any())
+            or (x + w < width and crop[:, -1].any())
+            or (y + h < height and crop[-1, :].any())
+        )
+
+    def roi_stats(self) -> dict:
+        return {
+            "roi_frames": self.roi_frames,
+            "full_frames": self.full_frames,
+            "fallbacks": self.fallbacks,
+            "pixels": self.pixels,
+            "frame_pixels": self.frame_pixels,
+            "pixel_fraction": self.pixels / self.frame_pixels if self.frame_pixels else 0.0,
+        }
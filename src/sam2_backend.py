@@ -0,0 +1,173 @@
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+Point = Tuple[float, float]
+
+
+class TinySAM2(nn.Module):
+    """Miniature SAM layout: strided conv encoder, Fourier point prompts, hypernetwork decoder."""
+
+    def __init__(self, embed_dim=32, image_size=256):
+        super().__init__()
+        self.image_size = image_size
+        self.image_encoder = nn.Sequential(
+            nn.Conv2d(3, 16, 3, stride=2, padding=1),
+            nn.GELU(),
+            nn.Conv2d(16, 32, 3, stride=2, padding=1),
+            nn.GELU(),
+            nn.Conv2d(32, embed_dim, 3, stride=2, padding=1),
+            nn.GELU(),
+            nn.Conv2d(embed_dim, embed_dim, 3, stride=2, padding=1),
+        )
+        self.register_buffer("fourier", torch.randn(2, embed_dim // 2))
+        self.point_embed = nn.Parameter(torch.randn(embed_dim) * 0.1)
+        self.upscale = nn.Sequential(
+            nn.ConvTranspose2d(embed_dim, embed_dim // 2, 2, stride=2),
+            nn.GELU(),
+            nn.ConvTranspose2d(embed_dim // 2, embed_dim // 4, 2, stride=2),
+        )
+        self.hypernet = nn.Sequential(
+            nn.Linear(embed_dim, embed_dim),
+            nn.GELU(),
+            nn.Linear(embed_dim, embed_dim // 4),
+        )
+        self.iou_head = nn.Sequential(nn.Linear(embed_dim, 16), nn.GELU(), nn.Linear(16, 1))
+
+    def _positional(self, coords):
+        projected = 2 * np.pi * (2 * coords - 1) @ self.fourier
+        return torch.cat([projected.sin(), projected.cos()], dim=-1)
+
+    def encode(self, images):
+        return self.image_encoder(images)
+
+    def decode(self, embeddings, points):
+        """``embeddings`` (B, C, h, w) and normalised ``points`` (B, 2) -> logits, iou."""
+        _, _, h, w = embeddings.shape
+        ys = (torch.arange(h, dtype=embeddings.dtype) + 0.5) / h
+        xs = (torch.arange(w, dtype=embeddings.dtype) + 0.5) / w
+        grid = torch.stack(torch.meshgrid(xs, ys, indexing="xy"), dim=-1)
+        dense = embeddings + self._positional(grid).permute(2, 0, 1).unsqueeze(0)
+        token = self._positional(points) + self.point_embed
+        upscaled = self.upscale(dense)
+        logits = torch.einsum("bchw,bc->bhw", upscaled, self.hypernet(token))
+        pooled = dense.mean(dim=(2, 3))
+        iou = torch.sigmoid(self.iou_head(token + pooled)).squeeze(-1)
+        return logits, iou
+
+
+class TinySAM2Backend:
+    """Offline backend built on a seeded, randomly initialised ``TinySAM2``."""
+
+    def __init__(self, image_size=256, embed_dim=32, seed=0, device="cpu", threads=None):
+        if threads is not None:
+            torch.set_num_threads(threads)
+        torch.manual_seed(seed)
+        self.device = torch.device(device)
+        self.model = TinySAM2(embed_dim=embed_dim, image_size=image_size).to(self.device).eval()
+        self.version = f"tiny-sam2-d{embed_dim}-s{image_size}-seed{seed}"
+        self._mean = torch.tensor([123.675, 116.28, 103.53], device=self.device).view(1, 3, 1, 1)
+        self._std = torch.tensor([58.395, 57.12, 57.375], device=self.device).view(1, 3, 1, 1)
+
+    def _preprocess(self, frames: Sequence[np.ndarray]):
+        size = self.model.image_size
+        batch = np.stack(
+            [cv2.cvtColor(cv2.resize(frame, (size, size)), cv2.COLOR_BGR2RGB) for frame in frames]
+        )
+        images = torch.from_numpy(batch).to(self.device).permute(0, 3, 1, 2).float()
+        return (images - self._mean) / self._std
+
+    @torch.inference_mode()
+    def encode(self, frames: Sequence[np.ndarray]) -> List[dict]:
+        embeddings = self.model.encode(self._preprocess(frames))
+        return [
+            {"embedding": embeddings[i : i + 1], "shape": frame.shape[:2]}
+            for i, frame in enumerate(frames)
+        ]
+
+    @torch.inference_mode()
+    def decode(self, encoded: dict, points: Sequence[Point]) -> Tuple[List[np.ndarray], List[float]]:
+        height, width = encoded["shape"]
+        coords = torch.tensor(
+            [[x / width, y / height] for x, y in points], dtype=torch.float32, device=self.device
+        )
+        embeddings = encoded["embedding"].expand(len(points), -1, -1, -1)
+        logits, iou = self.model.decode(embeddings, coords)
+        logits = F.interpolate(
+            logits.unsqueeze(1), size=(height, width), mode="bilinear", align_corners=False
+        )
+        masks = (logits[:, 0] > 0).to(torch.uint8).mul_(255).cpu().numpy()
+        return list(masks), [float(v) for v in iou.cpu()]
+
+
+class OfficialSAM2Backend:
+    """Adapter around ``SAM2ImagePredictor`` that caches per-frame features.
+
+    The predictor keeps features for the most recent ``set_image_batch`` call;
+    they are split per frame here and swapped back in before decoding so a
+    re-prompt never re-runs the image encoder.
+    """
+
+    def __init__(self, checkpoint, config, device="cpu", threads=None):
+        try:
+            from sam2.build_sam import build_sam2
+            from sam2.sam2_image_predictor import SAM2ImagePredictor
+        except ImportError as exc:
+            raise ImportError(
+                "The official SAM 2 backend requires the 'sam2' package; "
+                "omit model_path to use the offline tiny model"
+            ) from exc
+        if threads is not None:
+            torch.set_num_threads(threads)
+        self.predictor = SAM2ImagePredictor(build_sam2(config, checkpoint, device=device))
+        self.version = f"sam2:{config}:{checkpoint}"
+
+    @torch.inference_mode()
+    def encode(self, frames: Sequence[np.ndarray]) -> List[dict]:
+        images = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        self.predictor.set_image_batch(images)
+        features = self.predictor._features
+        return [
+            {
+                "image_embed": features["image_embed"][i : i + 1],
+                "high_res_feats": [level[i : i + 1] for level in features["high_res_feats"]],
+                "shape": frame.shape[:2],
+            }
+            for i, frame in enumerate(frames)
+        ]
+
+    @torch.inference_mode()
+    def decode(self, encoded: dict, points: Sequence[Point]) -> Tuple[List[np.ndarray], List[float]]:
+        predictor = self.predictor
+        predictor._features = {
+            "image_embed": encoded["image_embed"],
+            "high_res_feats": encoded["high_res_feats"],
+        }
+        predictor._orig_hw = [tuple(encoded["shape"])]
+        predictor._is_image_set = True
+        predictor._is_batch = False
+        masks, scores = [], []
+        for x, y in points:
+            mask, score, _ = predictor.predict(
+                point_coords=np.array([[x, y]], np.float32),
+                point_labels=np.array([1], np.int32),
+                multimask_output=False,
+            )
+            masks.append((mask[0] > 0).astype(np.uint8) * 255)
+            scores.append(float(score[0]))
+        return masks, scores
+
+
+def build_backend(model_path=None, config=None, device="cpu", threads=None, **tiny_kwargs):
+    """Official SAM 2 when a checkpoint is given, otherwise the offline tiny model.
+
+    Both backends expose ``encode(frames)`` (heavy image encoder, batched) and
+    ``decode(encoded, points)`` (lightweight mask decoder only).
+    """
+    if model_path is None:
+        return TinySAM2Backend(device=device, threads=threads, **tiny_kwargs)
+    return OfficialSAM2Backend(model_path, config, device=device, threads=threads)
@@ -1,29 +1,160 @@
 import numpy as np
 import cv2
+from collections import OrderedDict
+from functools import lru_cache
+
+from mask_stats import MaskStats
+from packed_mask import PackedMask
+
+
+@lru_cache(maxsize=2)
+def _load_backend(model_path, config, device, threads):
+    """Build (once per process) the torch backend for these settings.
+
+    Backends hold only weights, so predictors built for successive jobs in a
+    warm worker share one instead of reloading the checkpoint.
+    """
+    # Imported lazily so mock runs never pay for torch
+    from sam2_backend import build_backend
+
+    return build_backend(model_path, config, device=device, threads=threads)
+
 
 class SAM2Predictor:
-    def __init__(self, model_path=None, mock=True):
+    def __init__(
+        self,
+        model_path=None,
+        mock=True,
+        max_objects=1,
+        config=None,
+        device="cpu",
+        threads=None,
+        embedding_cache=16,
+        verbose=True,
+        packed=False,
+    ):
         self.mock = mock
-        if not self.mock:
-            # In a real scenario, we would load the SAM 2 model here
-            # from sam2.build_sam import build_sam2_video_predictor
-            # self.predictor = build_sam2_video_predictor(config, checkpoint)
-            pass
-        print("SAM 2 Predictor Initialized (Mock Mode: {})".format(mock))
+        # Emit PackedMask (bit-packed, bbox-cropped) masks instead of 0/255 frames
+        self.packed = packed
+        self.max_objects = max_objects
+        self.embedding_cache = embedding_cache
+        self._embeddings = OrderedDict()
+        self._backend_args = (model_path, config, device, threads)
+        self._backend = None
+        self.last_point = None
+        self.encoder_calls = 0
+        self.decoder_calls = 0
+        if verbose:
+            print("SAM 2 Predictor Initialized (Mock Mode: {})".format(mock))
 
-    def predict(self, frame, frame_idx):
+    @property
+    def backend(self):
+        """The torch backend, loaded on first use (None in mock mode)."""
+        if self._backend is None and not self.mock:
+            self._backend = _load_backend(*self._backend_args)
+        return self._backend
+
+    @property
+    def version(self):
+        return "mock-hsv-v1" if self.mock else self.backend.version
+
+    def predict(self, frame, frame_idx, point=None, roi=None):
         """
-        Simulates SAM 2 prediction.
+        Runs SAM 2 (or the mock) on one frame.
+        With ``roi=(x, y, w, h)`` only that window is segmented (and encoded)
+        and the masks are pasted back into full-frame coordinates.
         Returns:
             masks: List of binary masks (H, W)
             scores: List of confidence scores
-            logits: Low-level logits
         """
+        if roi is not None:
+            return self._predict_roi(frame, frame_idx, point, roi)
         if self.mock:
             return self._mock_predict(frame, frame_idx)
+        return self.predict_batch([frame], [frame_idx], [point])[0]
+
+    def _predict_roi(self, frame, frame_idx, point, roi):
+        x, y, w, h = roi
+        crop = frame[y : y + h, x : x + w]
+        if self.mock:
+            masks, scores = self._mock_predict(crop, frame_idx)
         else:
-            # Real SAM 2 inference would go here
-            pass
+            point = point or self.last_point or (x + w / 2.0, y + h / 2.0)
+            # Embeddings of a crop are cached separately from the full frame
+            masks, scores = self.predict_batch(
+                [crop], [(frame_idx, tuple(roi))], [(point[0] - x, point[1] - y)]
+            )[0]
+        full = []
+        for mask in masks:
+            if self.packed:
+                # Moving a packed mask only offsets its window
+                full.append(mask.moved(x, y, frame.shape[:2]))
+                continue
+            pasted = np.zeros(frame.shape[:2], dtype=mask.dtype)
+            pasted[y : y + h, x : x + w] = mask
+            full.append(pasted)
+        if not self.mock:
+            self.update_prompt(full)
+        return full, scores
+
+    def predict_batch(self, frames, frame_indices, points=None):
+        """Predict several frames with one image-encoder batch.
+
+        ``points`` holds one point prompt per frame (None re-uses the last
+        prompted centroid, falling back to the frame centre). Returns a list of
+        ``(masks, scores)`` tuples in input order.
+        """
+        if self.mock:
+            return [self._mock_predict(f, i) for f, i in zip(frames, frame_indices)]
+        points = list(points) if points is not None else [None] * len(frames)
+        self._encode(frames, frame_indices)
+        results = []
+        for frame, frame_idx, point in zip(frames, frame_indices, points):
+            if point is None:
+                point = self.last_point or (frame.shape[1] / 2.0, frame.shape[0] / 2.0)
+            masks, scores = self.reprompt(frame_idx, [point])
+            if self.packed:
+                masks = [PackedMask.from_mask(mask) for mask in masks]
+            results.append((masks, scores))
+            self.update_prompt(masks)
+        return results
+
+    def update_prompt(self, masks):
+        """Remember the primary mask centroid as the next default point prompt."""
+        if not masks:
+            return
+        centroid = MaskStats.of(masks[0]).centroid
+        if centroid is not None:
+            self.last_point = centroid
+
+    def reprompt(self, frame_idx, points):
+        """Re-run only the mask decoder on a cached frame embedding.
+
+        Used after an occlusion or to segment several objects in one frame.
+        Raises KeyError if the frame's embedding is no longer cached.
+        """
+        if self.mock:
+            raise RuntimeError("reprompt requires a real SAM 2 backend")
+        encoded = self._embeddings[frame_idx]
+        self._embeddings.move_to_end(frame_idx)
+        self.decoder_calls += 1
+        return self.backend.decode(encoded, points)
+
+    def _encode(self, frames, frame_indices):
+        missing = [
+            (frame, idx)
+            for frame, idx in zip(frames, frame_indices)
+            if idx not in self._embeddings
+        ]
+        if missing:
+            self.encoder_calls += 1
+            encoded = self.backend.encode([frame for frame, _ in missing])
+            for (_, idx), item in zip(missing, encoded):
+                self._embeddings[idx] = item
+        for idx in frame_indices:
+            self._embeddings.move_to_end(idx)
+        while len(self._embeddings) > self.embedding_cache:
+            self._embeddings.popitem(last=False)
 
     def _mock_predict(self, frame, frame_idx):
         # Simple color-based segmentation to simulate "detecting" the green circle
@@ -42,22 +173,41 @@ class SAM2Predictor:
         masks = []
         scores = []
         
-        if contours:
+        if contours and self.max_objects > 1:
+            # Multi-object mode: one mask per sufficiently large contour
+            for c in sorted(contours, key=cv2.contourArea, reverse=True):
+                if len(masks) == self.max_objects or cv2.contourArea(c) <= 100:
+                    break
+                masks.append(self._filled_mask(c, mask.shape))
+                scores.append(0.95)
+            if not masks:
+                masks.append(self._empty_mask(mask.shape))
+                scores.append(0.1)
+        elif contours:
             # Assume the largest contour is our object
             c = max(contours, key=cv2.contourArea)
             if cv2.contourArea(c) > 100:
                 # Create a clean mask
-                obj_mask = np.zeros_like(mask)
-                cv2.drawContours(obj_mask, [c], -1, 255, -1)
-                masks.append(obj_mask)
+                masks.append(self._filled_mask(c, mask.shape))
                 scores.append(0.95) # High confidence
             else:
                 # Object too small or noise
-                masks.append(np.zeros_like(mask))
+                masks.append(self._empty_mask(mask.shape))
                 scores.append(0.1)
         else:
             # No object found (Occlusion simulated)
-            masks.append(np.zeros_like(mask))
+            masks.append(self._empty_mask(mask.shape))
             scores.append(0.05) # Low confidence
             
         return masks, scores
+
+    def _filled_mask(self, contour, shape):
+        if self.packed:
+            # Drawn inside the contour's box only, never a full frame
+            return PackedMask.from_contour(contour, shape)
+        mask = np.zeros(shape, dtype=np.uint8)
+        cv2.drawContours(mask, [contour], -1, 255, -1)
+        return mask
+
+    def _empty_mask(self, shape):
+        return PackedMask.empty(shape) if self.packed else np.zeros(shape, dtype=np.uint8)
@@ -0,0 +1,175 @@
+import math
+from collections import Counter, deque
+from typing import Dict, Optional
+
+import numpy as np
+
+from occlusion_handler import KalmanTracker
+
+SCHEDULE_MODES = ("rate", "floor")
+
+
+def shifted_box_iou(width: float, height: float, dx: float, dy: float) -> float:
+    """IoU of a ``width`` x ``height`` box with itself shifted by (dx, dy)."""
+    if width <= 0 or height <= 0:
+        return 0.0
+    overlap = max(0.0, width - abs(dx)) * max(0.0, height - abs(dy))
+    return overlap / (2.0 * width * height - overlap)
+
+
+class KeyframeScheduler:
+    """Decides per frame whether to run the segmenter or propagate the last mask.
+
+    Skipped frames reuse the last measured mask, translated by the Kalman
+    displacement. Their accuracy is estimated as the IoU of the object's
+    bounding box with itself shifted by the expected position error, which
+    combines three terms:
+
+    * the filter's predicted position covariance;
+    * the smoothed innovation (predicted vs. measured centroid on inferred
+      frames), scaled by the frames since the last inference, which catches
+      a filter that is still converging or a covariance that is too small;
+    * ``velocity_error * speed * frames_since_inference``, for motion the
+      constant-velocity model misses.
+
+    A frame is inferred when:
+
+    * the tracker has no measured mask yet, or the last frame was not tracked
+      (the segmenter is the only way to see the object reappear);
+    * the estimated IoU falls below ``accuracy_floor``;
+    * quality over the last ``trend_window`` inferred frames fell by more
+      than ``quality_drop``;
+    * ``max_gap`` frames have passed since the last inference.
+
+    In ``rate`` mode inference is also budgeted by a token bucket refilled by
+    ``target_rate`` per frame. Uncertain frames are inferred only while a
+    token is available, and a full bucket spends a token even when not
+    required. The forced cases above may borrow up to ``burst`` tokens, so
+    the long-run inferred fraction tracks ``target_rate``.
+    """
+
+    def __init__(
+        self,
+        mode: str = "floor",
+        target_rate: float = 0.5,
+        accuracy_floor: float = 0.85,
+        max_gap: int = 30,
+        velocity_error: float = 0.1,
+        quality_drop: float = 0.05,
+        trend_window: int = 5,
+        burst: float = 3.0,
+        innovation_smoothing: float = 0.5,
+    ):
+        if mode not in SCHEDULE_MODES:
+            raise ValueError(f"mode must be one of {SCHEDULE_MODES}")
+        if not 0.0 < target_rate <= 1.0:
+            raise ValueError("target_rate must be in (0, 1]")
+        self.mode = mode
+        self.target_rate = target_rate
+        self.accuracy_floor = accuracy_floor
+        self.max_gap = max_gap
+        self.velocity_error = velocity_error
+        self.quality_drop = quality_drop
+        self.burst = max(1.0, burst)
+        self.innovation_smoothing = innovation_smoothing
+        self.innovation: Optional[float] = None
+        self.tokens = self.burst
+        self.since_inference = 0
+        self.last_status = ""
+        self.last_quality_info: Optional[dict] = None
+        self.qualities: deque = deque(maxlen=max(2, trend_window))
+        self.frames = 0
+        self.inferred = 0
+        self.reasons: Counter = Counter()
+        self._estimated_iou_sum = 0.0
+
+    def should_infer(self, tracker: KalmanTracker) -> bool:
+        """Decide for the next frame; call ``observe`` with its outcome afterwards."""
+        reason = self._forced_reason(tracker)
+        estimated_iou = None
+        if reason is None:
+            estimated_iou = self.estimated_iou(tracker)
+            if estimated_iou < self.accuracy_floor:
+                reason = "uncertainty"
+        if self.mode == "rate":
+            self.tokens = min(self.burst, self.tokens + self.target_rate)
+            if reason == "uncertainty" and self.tokens < 1.0:
+                reason = None
+            elif reason is None and self.tokens >= self.burst:
+                reason = "budget"
+            if reason is not None:
+                self.tokens = max(-self.burst, self.tokens - 1.0)
+        if reason is None:
+            self._estimated_iou_sum += estimated_iou
+            return False
+        self.reasons[reason] += 1
+        return True
+
+    def observe(
+        self, inferred: bool, status: str, quality_info: dict, tracker: KalmanTracker
+    ) -> None:
+        self.frames += 1
+        self.last_status = status
+        if inferred:
+            self.inferred += 1
+            self.since_inference = 0
+            self.last_quality_info = quality_info
+            self.qualities.append(quality_info["quality"])
+            if status.startswith("Tracking") and tracker.innovation is not None:
+                self.innovation = (
+                    tracker.innovation
+                    if self.innovation is None
+                    else (1 - self.innovation_smoothing) * self.innovation
+                    + self.innovation_smoothing * tracker.innovation
+                )
+        else:
+            self.since_inference += 1
+
+    def estimated_iou(self, tracker: KalmanTracker) -> float:
+        """Expected IoU of propagating the last measured mask one more frame."""
+        _, _, width, height = tracker.last_mask_stats.bbox
+        vx, vy = tracker.velocity()
+        steps = self.since_inference + 1
+        drift = (self.innovation + self.velocity_error * math.hypot(vx, vy)) * steps
+        error = math.hypot(tracker.predicted_position_std(), drift)
+        axis_error = error / math.sqrt(2.0)
+        return shifted_box_iou(width, height, axis_error, axis_error)
+
+    def quality_trend(self) -> float:
+        """Least-squares quality change across the recent inferred frames."""
+        if len(self.qualities) < self.qualities.maxlen:
+            return 0.0
+        values = np.asarray(self.qualities, dtype=np.float64)
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+        return float(slope * (len(values) - 1))
+
+    def _forced_reason(self, tracker: KalmanTracker) -> Optional[str]:
+        if tracker.last_mask is None or self.innovation is None:
+            return "warmup"
+        if not self.last_status.startswith(("Tracking", "Propagated", "Coasting")):
+            return "untracked"
+        if self.since_inference >= self.max_gap:
+            return "max_gap"
+        if self.quality_trend() < -self.quality_drop:
+            return "quality_trend"
+        return None
+
+    def propagated_quality_info(self) -> dict:
+        """Quality fields logged for a propagated frame (those of the last inference)."""
+        return dict(self.last_quality_info)
+
+    def report(self) -> Dict[str, object]:
+        skipped = self.frames - self.inferred
+        return {
+            "mode": self.mode,
+            "target_rate": self.target_rate if self.mode == "rate" else None,
+            "accuracy_floor": self.accuracy_floor,
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "inferred_fraction": self.inferred / self.frames if self.frames else 0.0,
+            "reasons": dict(self.reasons),
+            "mean_estimated_iou_skipped": (
+                self._estimated_iou_sum / skipped if skipped else None
+            ),
+        }
+
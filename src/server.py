@@ -0,0 +1,365 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from live import LiveItem, LiveSource, _percentile
+from memory_manager import MemoryManager
+from metrics import MetricsLogger
+from occlusion_handler import KalmanTracker
+from pipeline import OUTPUT_FPS, OUTPUT_SIZE, _coast_frame, _track_frame
+from quality_controller import QualityController
+from sam2_model import SAM2Predictor
+
+
+class StreamSession:
+    """One camera feed and its private tracking state.
+
+    The predictor is shared by the server; everything that carries history
+    (Kalman filter, adaptive threshold, memory bank, metrics, prompt point)
+    is per stream.
+    """
+
+    def __init__(self, stream_id: str, source: LiveSource, metrics_path: Optional[str] = None):
+        self.stream_id = stream_id
+        self.source = source
+        self.tracker = KalmanTracker()
+        self.quality_controller = QualityController()
+        self.memory_manager = MemoryManager(capacity=25)
+        self.metrics_logger = MetricsLogger(path=metrics_path)
+        self.pending: Optional[LiveItem] = None
+        self.prompt_point: Optional[Tuple[float, float]] = None
+        self.deadline = 1.0 / OUTPUT_FPS
+        self.coasting = 0
+        self.inferred = 0
+        self.shed = 0
+        self.latencies: List[float] = []
+
+    def components(self, item: LiveItem) -> dict:
+        frame, idx, gt_mask, _ = item
+        return dict(
+            frame=frame,
+            idx=idx,
+            gt_mask=gt_mask,
+            quality_controller=self.quality_controller,
+            tracker=self.tracker,
+            memory_manager=self.memory_manager,
+            metrics_logger=self.metrics_logger,
+        )
+
+    def finish(self, item: LiveItem, result) -> None:
+        self.latencies.append((time.perf_counter() - item[3]) * 1000.0)
+        position = result[3]
+        self.prompt_point = (float(position[0]), float(position[1]))
+
+    def report(self) -> dict:
+        source = self.source
+        processed = len(self.latencies)
+        summary = self.metrics_logger.summary.as_dict()
+        return {
+            "source": str(source.source),
+            "source_fps": source.fps,
+            "deadline_ms": self.deadline * 1000.0,
+            "frames_captured": source.captured,
+            "frames_dropped": source.dropped,
+            "frames_processed": processed,
+            "frames_inferred": self.inferred,
+            "frames_shed": self.shed,
+            "inferred_fraction": self.inferred / source.captured if source.captured else 0.0,
+            "mean_iou": summary.get("mean_iou"),
+            "latency_ms": {
+                "mean": float(np.mean(self.latencies)) if self.latencies else 0.0,
+                "p50": _percentile(self.latencies, 50),
+                "p95": _percentile(self.latencies, 95),
+                "p99": _percentile(self.latencies, 99),
+                "max": max(self.latencies) if self.latencies else 0.0,
+            },
+        }
+
+
+class StreamServer:
+    """Tracks many live streams with one shared predictor and a micro-batcher.
+
+    Each stream's capture thread wakes the event loop when a frame arrives.
+    The batcher then gathers at most one frame per stream, visiting streams
+    round-robin from where the previous batch stopped, so a busy stream
+    cannot starve the others. It waits at most ``max_wait_ms`` for a batch to
+    fill to ``max_batch`` before sending it to ``predict_batch`` on a single
+    inference thread. While inference runs, newer frames replace older ones in
+    each stream's capture buffer (counted as dropped).
+
+    Load shedding follows live mode. A frame that has already waited so long
+    that the expected batch cost would push it past its stream's deadline is
+    coasted on that stream's tracker instead of being batched. After
+    ``max_coast`` consecutive shed frames, the next frame is inferred anyway.
+    """
+
+    def __init__(
+        self,
+        predictor: SAM2Predictor,
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        max_coast: int = 10,
+        cost_smoothing: float = 0.2,
+    ):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_coast = max_coast
+        self.cost_smoothing = cost_smoothing
+        self.sessions: List[StreamSession] = []
+        self.expected_cost: Optional[float] = None
+        self.batch_sizes: List[int] = []
+        self._cursor = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def add_stream(self, session: StreamSession) -> None:
+        self.sessions.append(session)
+
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        wakeup = self._wakeup.set
+        # One inference thread: the shared predictor runs one batch at a time
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        try:
+            for session in self.sessions:
+                session.source.notify = lambda: loop.call_soon_threadsafe(wakeup)
+            # Opening blocks until each capture reports its frame rate; do it off the loop
+            await asyncio.gather(
+                *(loop.run_in_executor(None, session.source.__enter__) for session in self.sessions)
+            )
+            for session in self.sessions:
+                session.deadline = 1.0 / session.source.fps
+            started = time.perf_counter()
+            while True:
+                batch = await self._gather()
+                if batch is None:
+                    break
+                if batch:
+                    await self._infer(batch, loop, executor)
+        finally:
+            for session in self.sessions:
+                session.source.stop()
+                session.metrics_logger.close()
+            executor.shutdown()
+        return self.report(time.perf_counter() - started)
+
+    def _collect(self) -> None:
+        for session in self.sessions:
+            if session.pending is None:
+                session.pending = session.source.poll()
+
+    def _shed(self, now: float) -> None:
+        if self.expected_cost is None:
+            return
+        for session in self.sessions:
+            item = session.pending
+            if item is None or session.coasting >= self.max_coast:
+                continue
+            if now - item[3] + self.expected_cost > session.deadline:
+                result = _coast_frame(**session.components(item))
+                session.finish(item, result)
+                session.pending = None
+                session.coasting += 1
+                session.shed += 1
+
+    def _take_batch(self) -> List[Tuple[StreamSession, LiveItem]]:
+        count = len(self.sessions)
+        batch = []
+        for offset in range(count):
+            session = self.sessions[(self._cursor + offset) % count]
+            if session.pending is None:
+                continue
+            batch.append((session, session.pending))
+            session.pending = None
+            if len(batch) == self.max_batch:
+                self._cursor = (self._cursor + offset + 1) % count
+                return batch
+        self._cursor = (self._cursor + 1) % max(count, 1)
+        return batch
+
+    async def _gather(self) -> Optional[List[Tuple[StreamSession, LiveItem]]]:
+        """Next batch to infer; [] when only shedding happened, None when all streams ended."""
+        first_seen = None
+        while True:
+            self._wakeup.clear()
+            self._collect()
+            now = time.perf_counter()
+            self._shed(now)
+            waiting = [session.pending for session in self.sessions if session.pending is not None]
+            if not waiting:
+                if all(session.source.finished for session in self.sessions):
+                    return None
+                await self._sleep(0.1)
+                continue
+            first_seen = first_seen or min(item[3] for item in waiting)
+            remaining = self.max_wait - (now - first_seen)
+            live = any(not session.source.finished for session in self.sessions)
+            if len(waiting) >= self.max_batch or remaining <= 0 or not live:
+                return self._take_batch()
+            await self._sleep(remaining)
+
+    async def _sleep(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _infer(self, batch, loop, executor) -> None:
+        start = time.perf_counter()
+        frames = [item[0] for _, item in batch]
+        # Keys stay distinct across streams in the shared embedding cache
+        keys = [(session.stream_id, item[1]) for session, item in batch]
+        points = [
+            session.prompt_point or (item[0].shape[1] / 2.0, item[0].shape[0] / 2.0)
+            for session, item in batch
+        ]
+        predictions = await loop.run_in_executor(
+            executor, self.predictor.predict_batch, frames, keys, points
+        )
+        for (session, item), prediction in zip(batch, predictions):
+            result = _track_frame(
+                predictor=self.predictor, prediction=prediction, **session.components(item)
+            )
+            session.finish(item, result)
+            session.coasting = 0
+            session.inferred += 1
+        cost = time.perf_counter() - start
+        self.expected_cost = (
+            cost
+            if self.expected_cost is None
+            else (1 - self.cost_smoothing) * self.expected_cost + self.cost_smoothing * cost
+        )
+        self.batch_sizes.append(len(batch))
+
+    def report(self, duration: float) -> dict:
+        streams = {session.stream_id: session.report() for session in self.sessions}
+        rates = np.array([stream["inferred_fraction"] for stream in streams.values()])
+        processed = sum(stream["frames_processed"] for stream in streams.values())
+        latencies = [value for session in self.sessions for value in session.latencies]
+        return {
+            "streams": streams,
+            "duration_s": duration,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": len(self.batch_sizes),
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "batch_size_counts": np.bincount(self.batch_sizes, minlength=self.max_batch + 1)[1:].tolist()
+            if self.batch_sizes
+            else [],
+            "expected_batch_ms": (self.expected_cost or 0.0) * 1000.0,
+            "throughput_fps": processed / duration if duration else 0.0,
+            # Jain's index over per-stream inferred fractions: 1.0 is perfectly fair
+            "fairness": float(rates.sum() ** 2 / (len(rates) * (rates**2).sum()))
+            if rates.size and rates.any()
+            else 1.0,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+            },
+            "frames_shed": sum(stream["frames_shed"] for stream in streams.values()),
+            "frames_dropped": sum(stream["frames_dropped"] for stream in streams.values()),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Track many live streams with one shared, micro-batched SAM 2 predictor"
+    )
+    parser.add_argument("--tag", default="server", help="Results go to artifacts/<tag>")
+    parser.add_argument(
+        "--streams",
+        nargs="*",
+        default=[],
+        help="Sources: camera indices, stream URLs, or files replayed at native FPS",
+    )
+    parser.add_argument(
+        "--fake",
+        type=int,
+        default=0,
+        help="Add N file-backed fake streams replaying --video (the synthetic clip if missing)",
+    )
+    parser.add_argument("--video", default="input_video.mp4", help="Video for --fake streams")
+    parser.add_argument("--seconds", type=float, default=None, help="Stop each stream after this long")
+    parser.add_argument("--max-batch", type=int, default=8, help="Frames per predictor batch")
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=10.0, help="Longest wait for a batch to fill"
+    )
+    parser.add_argument(
+        "--max-coast",
+        type=int,
+        default=10,
+        help="Consecutive frames a stream may shed before one is inferred regardless",
+    )
+    parser.add_argument(
+        "--predictor", choices=["mock", "sam2"], default="mock", help="Segmentation backend"
+    )
+    parser.add_argument("--checkpoint", default=None, help="SAM 2 checkpoint (sam2 predictor)")
+    parser.add_argument("--model-config", default=None, help="SAM 2 model config (sam2 predictor)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch CPU threads")
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sources = list(args.streams) + [os.path.join(project_dir, args.video)] * args.fake
+    if not sources:
+        parser.error("give --streams and/or --fake")
+    artifacts_dir = os.path.join(project_dir, "artifacts", args.tag)
+
+    predictor = SAM2Predictor(
+        model_path=args.checkpoint,
+        mock=args.predictor == "mock",
+        config=args.model_config,
+        threads=args.threads,
+        # Batches hold one frame per stream, so keep every batch's embeddings
+        embedding_cache=max(16, 2 * args.max_batch),
+    )
+    server = StreamServer(
+        predictor,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        max_coast=args.max_coast,
+    )
+    for number, source in enumerate(sources):
+        stream_id = f"stream_{number:03d}"
+        metrics_path = os.path.join(artifacts_dir, stream_id, "metrics", "run_metrics.csv")
+        live = LiveSource(
+            source, resize_dim=OUTPUT_SIZE, fallback_fps=OUTPUT_FPS, max_seconds=args.seconds
+        )
+        server.add_stream(StreamSession(stream_id, live, metrics_path))
+
+    print(f"Serving {len(sources)} streams (batch <= {args.max_batch}, wait <= {args.max_wait_ms}ms)")
+    try:
+        report = asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("Server interrupted")
+        return
+    os.makedirs(artifacts_dir, exist_ok=True)
+    report_path = os.path.join(artifacts_dir, "server_report.json")
+    with open(report_path, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    latency = report["latency_ms"]
+    print(
+        f"{report['throughput_fps']:.1f} frames/s over {len(sources)} streams, "
+        f"mean batch {report['mean_batch_size']:.2f}, fairness {report['fairness']:.3f}, "
+        f"{report['frames_shed']} shed, {report['frames_dropped']} dropped; "
+        f"latency p50 {latency['p50']:.1f}ms p95 {latency['p95']:.1f}ms"
+    )
+    for stream_id, stream in report["streams"].items():
+        print(
+            f"  {stream_id}: {stream['frames_inferred']}/{stream['frames_captured']} inferred, "
+            f"{stream['frames_shed']} shed, {stream['frames_dropped']} dropped, "
+            f"p95 {stream['latency_ms']['p95']:.1f}ms"
+            + (f", IoU {stream['mean_iou']:.3f}" if stream["mean_iou"] == stream["mean_iou"] else "")
+        )
+    print(f"Server report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
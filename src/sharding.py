@@ -0,0 +1,292 @@
+import argparse
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from metrics import FrameMetrics, MetricsLogger
+from prediction_cache import merge_cache_stats
+from pipeline import (
+    OUTPUT_FPS,
+    OUTPUT_SIZE,
+    _build_components,
+    _cache_stats,
+    _KeyframeRecorder,
+    _open_writer,
+    _track_frame,
+)
+from renderer import OverlayRenderer
+from video_loader import VideoLoader
+
+# Lossless intermediate codec so stitching re-encodes each frame exactly once
+SEGMENT_FOURCC = "FFV1"
+BOUNDARY_FRAMES = 10
+
+
+def plan_shards(total_frames: int, num_shards: int, warmup: int) -> List[Tuple[int, int, int]]:
+    """Split [0, total_frames) into ``(warm_start, start, stop)`` shards.
+
+    Frames in [warm_start, start) are replayed only to converge tracker and
+    quality-controller state; they are neither logged nor written.
+    Raises ``ValueError`` when the frame count is unknown (0), as reported by
+    containers without ``CAP_PROP_FRAME_COUNT`` and by empty videos.
+    """
+    if not total_frames or total_frames <= 0:
+        raise ValueError("cannot shard a video whose frame count is unknown or zero")
+    size = max(1, math.ceil(total_frames / max(1, num_shards)))
+    shards = []
+    for start in range(0, total_frames, size):
+        stop = min(total_frames, start + size)
+        shards.append((max(0, start - warmup), start, stop))
+    return shards
+
+
+def process_shard(
+    args: argparse.Namespace,
+    video_path: str,
+    warm_start: int,
+    start: int,
+    stop: int,
+    workdir: str,
+    shard_id: int,
+) -> dict:
+    """Run the serial pipeline over one shard; executed inside a worker process."""
+    started = time.perf_counter()
+    predictor, tracker, quality_controller, memory_manager = _build_components(
+        args, video_path, verbose=False
+    )
+    frames_dir = os.path.join(workdir, f"frames_{shard_id:03d}")
+    os.makedirs(frames_dir, exist_ok=True)
+    recorder = _KeyframeRecorder(frames_dir)
+    logger = MetricsLogger()
+    warmup_logger = MetricsLogger()
+    positions: Dict[int, Tuple[int, int]] = {}
+    segment_path = os.path.join(workdir, f"segment_{shard_id:03d}.avi")
+    renderer = OverlayRenderer()
+    writer = None
+    if not args.no_render:
+        writer = cv2.VideoWriter(
+            segment_path, cv2.VideoWriter_fourcc(*SEGMENT_FOURCC), OUTPUT_FPS, OUTPUT_SIZE
+        )
+    try:
+        with VideoLoader(
+            video_path, backend=args.decoder, threads=args.decode_threads, buffers=2
+        ) as video:
+            for frame, idx, gt_mask in video.stream_frames(start=warm_start, stop=stop):
+                _, _, refined_mask, position, status, quality_info = _track_frame(
+                    frame=frame,
+                    idx=idx,
+                    gt_mask=gt_mask,
+                    predictor=predictor,
+                    quality_controller=quality_controller,
+                    tracker=tracker,
+                    memory_manager=memory_manager,
+                    metrics_logger=logger if idx >= start else warmup_logger,
+                )
+                if idx < start:
+                    recorder.previous_status = status
+                    continue
+                positions[idx] = (int(position[0]), int(position[1]))
+                if writer is None:
+                    continue
+                output_frame = renderer.render(
+                    frame, idx, refined_mask, position, status, quality_info
+                )
+                writer.write(output_frame)
+                recorder.observe(idx, status, quality_info, lambda: output_frame)
+    finally:
+        if writer is not None:
+            writer.release()
+    return {
+        "shard": shard_id,
+        "start": start,
+        "stop": stop,
+        "warm_start": warm_start,
+        "records": logger.records,
+        "positions": positions,
+        "segment": segment_path,
+        "frames_dir": frames_dir,
+        "keyframes": recorder.keyframes,
+        "seconds": time.perf_counter() - started,
+        "memory": memory_manager.footprint() if memory_manager is not None else None,
+        "cache": _cache_stats(predictor),
+    }
+
+
+def stitch_segments(
+    segments: List[str],
+    output_path: str,
+    fps: float = OUTPUT_FPS,
+    codec: str = "xvid",
+    backend: str = "opencv",
+) -> int:
+    """Concatenate lossless shard segments into one output video."""
+    out = _open_writer(output_path, fps, codec=codec, backend=backend)
+    written = 0
+    try:
+        for segment in segments:
+            capture = cv2.VideoCapture(segment)
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                out.write(frame)
+                written += 1
+            capture.release()
+    finally:
+        out.release()
+    return written
+
+
+def boundary_divergence(
+    sharded: List[FrameMetrics],
+    serial: List[FrameMetrics],
+    sharded_positions: Dict[int, Tuple[int, int]],
+    serial_positions: Dict[int, Tuple[int, int]],
+    boundaries: List[int],
+    frames: int = BOUNDARY_FRAMES,
+) -> List[Dict[str, float]]:
+    """How far the first frames after each shard boundary drift from a serial run.
+
+    Positions are compared as well because centroid error is only logged when
+    ground truth is visible, so metrics alone can hide tracker drift.
+    """
+    serial_by_idx = {record.frame_idx: record for record in serial}
+    sharded_by_idx = {record.frame_idx: record for record in sharded}
+    report = []
+    for boundary in boundaries:
+        diffs = {"quality": 0.0, "threshold": 0.0, "iou": 0.0, "centroid_error": 0.0}
+        status_mismatches = 0
+        compared = 0
+        position_error = 0.0
+        for idx in range(boundary, boundary + frames):
+            a, b = sharded_by_idx.get(idx), serial_by_idx.get(idx)
+            if a is None or b is None:
+                continue
+            compared += 1
+            status_mismatches += int(a.status != b.status)
+            pa, pb = sharded_positions.get(idx), serial_positions.get(idx)
+            if pa is not None and pb is not None:
+                position_error = max(
+                    position_error, math.hypot(pa[0] - pb[0], pa[1] - pb[1])
+                )
+            for field in diffs:
+                va, vb = getattr(a, field), getattr(b, field)
+                if va is not None and vb is not None:
+                    diffs[field] = max(diffs[field], abs(va - vb))
+        report.append(
+            {
+                "boundary": boundary,
+                "frames": compared,
+                "status_mismatches": status_mismatches,
+                "max_position_px": position_error,
+                **{f"max_abs_{field}": value for field, value in diffs.items()},
+            }
+        )
+    return report
+
+
+def run_sharded(
+    args: argparse.Namespace,
+    video_path: str,
+    output_path: str,
+    frames_dir: str,
+    metrics_dir: str,
+    metrics_logger: MetricsLogger,
+) -> Tuple[List[Optional[dict]], Optional[dict]]:
+    """Process the video in parallel shards and stitch video, keyframes and metrics.
+
+    Returns the per-shard memory footprint reports and the merged prediction
+    cache counters (None when caching is off).
+    """
+    with VideoLoader(video_path) as video:
+        total_frames = video.frame_count()
+        fps = video.fps() or OUTPUT_FPS
+    shards = plan_shards(total_frames, args.shards, args.shard_warmup)
+    workers = args.workers or os.cpu_count() or 1
+    print(
+        f"Sharded run: {len(shards)} shards of ~{shards[0][2] - shards[0][1]} frames, "
+        f"{workers} workers, {args.shard_warmup}-frame warm-up"
+    )
+
+    workdir = tempfile.mkdtemp(prefix=f"shards_{args.tag}_", dir=os.path.dirname(metrics_dir))
+    try:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(process_shard, args, video_path, warm, start, stop, workdir, i)
+                for i, (warm, start, stop) in enumerate(shards)
+            ]
+            results = [future.result() for future in futures]
+        written = 0
+        if not args.no_render:
+            written = stitch_segments(
+                [r["segment"] for r in results], output_path, fps, args.codec, args.encoder
+            )
+        sharded_seconds = time.perf_counter() - started
+
+        keyframes: Dict[str, Optional[int]] = {"tracking": None, "occlusion": None, "recovery": None}
+        for result in results:
+            metrics_logger.extend(result["records"])
+            for label, idx in result["keyframes"].items():
+                if idx is None or keyframes[label] is not None:
+                    continue
+                keyframes[label] = idx
+                name = f"{label}_frame_{idx:03d}.png"
+                shutil.copyfile(
+                    os.path.join(result["frames_dir"], name), os.path.join(frames_dir, name)
+                )
+        print(f"Stitched {written} frames from {len(results)} segments in {sharded_seconds:.2f}s")
+
+        report = {
+            "shards": len(shards),
+            "workers": workers,
+            "cpu_count": os.cpu_count(),
+            "warmup": args.shard_warmup,
+            "sharded_seconds": sharded_seconds,
+            "shard_seconds": [r["seconds"] for r in results],
+        }
+        if args.compare_serial:
+            serial = process_shard(args, video_path, 0, 0, total_frames, workdir, len(shards))
+            boundaries = [start for _, start, _ in shards[1:]]
+            report["serial_seconds"] = serial["seconds"]
+            report["speedup"] = serial["seconds"] / sharded_seconds
+            positions: Dict[int, Tuple[int, int]] = {}
+            for result in results:
+                positions.update(result["positions"])
+            report["boundaries"] = boundary_divergence(
+                metrics_logger.records,
+                serial["records"],
+                positions,
+                serial["positions"],
+                boundaries,
+                frames=args.shard_warmup or BOUNDARY_FRAMES,
+            )
+            print(
+                f"Speedup vs serial: {report['speedup']:.2f}x "
+                f"on {workers} workers ({os.cpu_count()} cores)"
+            )
+            for entry in report["boundaries"]:
+                print(
+                    f"  boundary {entry['boundary']}: "
+                    f"{entry['status_mismatches']}/{entry['frames']} status mismatches, "
+                    f"max position drift {entry['max_position_px']:.1f}px, "
+                    f"max |dIoU| {entry['max_abs_iou']:.4f}, "
+                    f"max |dQuality| {entry['max_abs_quality']:.4f}"
+                )
+        report_path = os.path.join(metrics_dir, "shard_report.json")
+        with open(report_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Shard report saved to {report_path}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return (
+        [result["memory"] for result in results],
+        merge_cache_stats([result["cache"] for result in results]),
+    )
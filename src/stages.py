@@ -0,0 +1,90 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, List
+
+_SENTINEL = object()
+
+
+def run_staged(
+    source: Iterable[Any],
+    process: Callable[[Any], Any],
+    sink: Callable[[Any], None],
+    queue_size: int = 8,
+    poll_interval: float = 0.1,
+) -> None:
+    """Run source -> process -> sink as three concurrent stages.
+
+    The source is drained by a background decode thread and the sink runs on
+    a background encode thread, while ``process`` stays on the calling thread
+    so tracker state is updated strictly in frame order. Bounded queues
+    between the stages provide backpressure. The first exception raised by
+    any stage stops the others and is re-raised here once all threads exit.
+    """
+    if queue_size < 1:
+        raise ValueError("queue_size must be >= 1")
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    decoded: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+    processed: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+
+    def _fail(exc: BaseException) -> None:
+        errors.append(exc)
+        stop.set()
+
+    def _put(channel: "queue.Queue[Any]", item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                channel.put(item, timeout=poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(channel: "queue.Queue[Any]") -> Any:
+        while not stop.is_set():
+            try:
+                return channel.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+        return _SENTINEL
+
+    def _decode() -> None:
+        try:
+            for item in source:
+                if not _put(decoded, item):
+                    return
+        except BaseException as exc:  # propagated to the caller
+            _fail(exc)
+        finally:
+            _put(decoded, _SENTINEL)
+
+    def _encode() -> None:
+        try:
+            while True:
+                item = _get(processed)
+                if item is _SENTINEL:
+                    return
+                sink(item)
+        except BaseException as exc:  # propagated to the caller
+            _fail(exc)
+
+    decode_thread = threading.Thread(target=_decode, name="decode", daemon=True)
+    encode_thread = threading.Thread(target=_encode, name="encode", daemon=True)
+    decode_thread.start()
+    encode_thread.start()
+    try:
+        while True:
+            item = _get(decoded)
+            if item is _SENTINEL:
+                break
+            if not _put(processed, process(item)):
+                break
+    except BaseException as exc:  # includes KeyboardInterrupt
+        _fail(exc)
+    finally:
+        _put(processed, _SENTINEL)
+        encode_thread.join()
+        stop.set()
+        decode_thread.join()
+    if errors:
+        raise errors[0]
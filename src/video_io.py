@@ -0,0 +1,244 @@
+from fractions import Fraction
+from typing import Iterator, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from packed_mask import PackedMask
+
+try:
+    import av
+except ImportError:  # PyAV is optional; OpenCV's FFmpeg build is the default backend
+    av = None
+
+Size = Tuple[int, int]
+
+# Codec names accepted by open_writer, mapped per backend
+OPENCV_FOURCC = {"xvid": "XVID", "mjpg": "MJPG", "mp4v": "mp4v", "ffv1": "FFV1", "h264": "avc1"}
+PYAV_CODEC = {"xvid": "mpeg4", "mjpg": "mjpeg", "mp4v": "mpeg4", "ffv1": "ffv1", "h264": "libx264"}
+CODECS = tuple(OPENCV_FOURCC)
+BACKENDS = ("opencv", "pyav")
+
+
+def _require_pyav() -> None:
+    if av is None:
+        raise ImportError("The 'pyav' video backend requires the 'av' package")
+
+
+class OpenCVReader:
+    """``cv2.VideoCapture`` reader that decodes into reused buffers."""
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        params = [cv2.CAP_PROP_N_THREADS, threads] if threads else []
+        self.path = path
+        self.threads = threads
+        self.cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG, params)
+        if not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else None
+        self.size = (
+            int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        )
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Presentation time (seconds) of the last frame read
+        self.timestamp: Optional[float] = None
+        self._decoded = None
+
+    def read(self, out: Optional[np.ndarray] = None, size: Optional[Size] = None) -> Optional[np.ndarray]:
+        """Next frame as BGR, resized to ``size`` (into ``out`` when given)."""
+        if size is None or size == self.size:
+            ok, frame = self.cap.read(out)
+            self.timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if ok else None
+            return frame if ok else None
+        ok, self._decoded = self.cap.read(self._decoded)
+        if not ok:
+            return None
+        self.timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if out is None:
+            return cv2.resize(self._decoded, size)
+        return cv2.resize(self._decoded, size, dst=out)
+
+    def seek(self, frame_idx: int) -> None:
+        """Position so the next ``read`` returns ``frame_idx``.
+
+        Falls back to decoding forward from the start when the container
+        does not report the requested position after a direct seek.
+        """
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_idx:
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_idx):
+            if not self.cap.grab():
+                break
+
+    def close(self) -> None:
+        self.cap.release()
+
+
+class PyAVReader:
+    """PyAV/FFmpeg reader with threaded decoding and resize-on-convert.
+
+    Scaling happens inside the swscale pixel-format conversion, so there is
+    no separate resize pass.
+    """
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        _require_pyav()
+        self.path = path
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        if threads:
+            self.stream.codec_context.thread_count = threads
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else None
+        self.size = (self.stream.codec_context.width, self.stream.codec_context.height)
+        self.frame_count = self.stream.frames
+        self.timestamp: Optional[float] = None
+        self._frames = self.container.decode(self.stream)
+        self._pending = None
+
+    def _next_frame(self):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+            return frame
+        return next(self._frames, None)
+
+    def read(self, out: Optional[np.ndarray] = None, size: Optional[Size] = None) -> Optional[np.ndarray]:
+        frame = self._next_frame()
+        if frame is None:
+            return None
+        self.timestamp = frame.time
+        width, height = size or self.size
+        image = frame.to_ndarray(width=width, height=height, format="bgr24")
+        if out is None:
+            return image
+        np.copyto(out, image)
+        return out
+
+    def seek(self, frame_idx: int) -> None:
+        """Seek to the keyframe before ``frame_idx`` and decode forward to it."""
+        if frame_idx <= 0 or not self.fps:
+            self.container.seek(0, stream=self.stream)
+            self._frames = self.container.decode(self.stream)
+            self._pending = None
+            return
+        time_base = self.stream.time_base
+        start = self.stream.start_time or 0
+        target = start + int(Fraction(frame_idx) / Fraction(self.fps).limit_denominator() / time_base)
+        self.container.seek(target, stream=self.stream, backward=True, any_frame=False)
+        self._frames = self.container.decode(self.stream)
+        self._pending = None
+        for frame in self._frames:
+            if frame.pts is not None and frame.pts >= target:
+                self._pending = frame
+                return
+
+    def close(self) -> None:
+        self.container.close()
+
+
+def open_reader(path: str, backend: str = "opencv", threads: Optional[int] = None):
+    if backend == "pyav":
+        return PyAVReader(path, threads)
+    if backend != "opencv":
+        raise ValueError(f"Unknown video backend {backend!r}; expected one of {BACKENDS}")
+    return OpenCVReader(path, threads)
+
+
+class PyAVWriter:
+    """PyAV encoder with the ``write``/``release`` surface of ``cv2.VideoWriter``."""
+
+    def __init__(
+        self, path: str, codec: str, fps: float, size: Size, is_color: bool = True,
+        threads: Optional[int] = None,
+    ):
+        _require_pyav()
+        self.container = av.open(path, "w")
+        self.stream = self.container.add_stream(
+            PYAV_CODEC[codec], rate=Fraction(fps).limit_denominator(1000)
+        )
+        self.stream.width, self.stream.height = size
+        self.stream.thread_type = "AUTO"
+        if threads:
+            self.stream.codec_context.thread_count = threads
+        if codec == "ffv1":
+            self.stream.pix_fmt = "bgr0" if is_color else "gray"
+        elif codec == "mjpg":
+            self.stream.pix_fmt = "yuvj420p"
+        else:
+            self.stream.pix_fmt = "yuv420p"
+        self.format = "bgr24" if is_color else "gray"
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoWriter
+        return True
+
+    def write(self, image: np.ndarray) -> None:
+        frame = av.VideoFrame.from_ndarray(image, format=self.format)
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def release(self) -> None:
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+
+def open_writer(
+    path: str,
+    fps: float,
+    size: Size,
+    codec: str = "xvid",
+    backend: str = "opencv",
+    is_color: bool = True,
+    threads: Optional[int] = None,
+):
+    """Video writer for ``codec`` on the chosen backend (``write``/``release`` API)."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}; expected one of {CODECS}")
+    if backend == "pyav":
+        return PyAVWriter(path, codec, fps, size, is_color, threads)
+    if backend != "opencv":
+        raise ValueError(f"Unknown video backend {backend!r}; expected one of {BACKENDS}")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*OPENCV_FOURCC[codec]), fps, size, is_color)
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV could not open a {codec} writer for {path}")
+    return writer
+
+
+class MaskStreamWriter:
+    """Writes binary masks as a lossless (FFV1) greyscale video beside the output."""
+
+    def __init__(self, path: str, fps: float, size: Size, backend: str = "opencv"):
+        self.path = path
+        self.writer = open_writer(path, fps, size, codec="ffv1", backend=backend, is_color=False)
+        self.frames = 0
+        self._unpacked = None
+
+    def write(self, mask: Union[np.ndarray, PackedMask]) -> None:
+        if isinstance(mask, PackedMask):
+            # Unpacked into one reused buffer; the encoder copies each frame
+            if self._unpacked is None:
+                self._unpacked = np.zeros(mask.shape, np.uint8)
+            mask = mask.unpack(out=self._unpacked)
+        self.writer.write(mask)
+        self.frames += 1
+
+    def release(self) -> None:
+        self.writer.release()
+
+
+def iter_mask_stream(path: str) -> Iterator[np.ndarray]:
+    """Read back a mask stream written by ``MaskStreamWriter``."""
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame[:, :, 0] if frame.ndim == 3 else frame
+    finally:
+        cap.release()
@@ -1,45 +1,165 @@
 import cv2
+import hashlib
 import os
 import numpy as np
 
+from frame_store import FrameStore
+from video_io import open_reader
+
 class VideoLoader:
-    def __init__(self, video_path, resize_dim=(640, 480)):
+    """Streams resized frames from a video file, or a synthetic clip when it is missing.
+
+    ``resize_dim=None`` keeps the source resolution. ``backend`` picks the
+    decoder (see ``video_io``). With ``buffers > 0`` frames are decoded and
+    resized into a ring of that many preallocated arrays instead of fresh
+    ones, so a yielded frame is overwritten ``buffers`` frames later and
+    consumers must not hold on to it longer than that.
+
+    A ``video_path`` that is a frame store directory (see ``frame_store``)
+    is read from its memory map instead of decoded. Frames are then
+    read-only zero-copy views unless ``writable`` is set, in which case they
+    are copied into the buffer ring (or fresh arrays) first.
+    """
+
+    DUMMY_FRAMES = 100
+    DUMMY_SIZE = (640, 480)
+
+    def __init__(
+        self, video_path, resize_dim=(640, 480), backend="opencv", threads=None, buffers=0,
+        writable=True,
+    ):
         self.video_path = video_path
         self.resize_dim = resize_dim
-        self.cap = None
+        self.backend = backend
+        self.threads = threads
+        self.buffers = buffers
+        self.writable = writable
+        self.reader = None
+        self.store = None
 
     def __enter__(self):
-        if not os.path.exists(self.video_path):
+        if FrameStore.is_store(self.video_path):
+            self.store = FrameStore(self.video_path)
+            self.reader = None
+        elif not os.path.exists(self.video_path):
             print(f"Warning: Video file {self.video_path} not found. Using dummy blank frames.")
-            self.cap = None
+            self.reader = None
         else:
-            self.cap = cv2.VideoCapture(self.video_path)
+            self.reader = open_reader(self.video_path, self.backend, self.threads)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.cap:
-            self.cap.release()
+        if self.reader:
+            self.reader.close()
+
+    @property
+    def cap(self):
+        """The underlying ``cv2.VideoCapture`` (OpenCV backend only)."""
+        return getattr(self.reader, "cap", None)
+
+    def frame_count(self):
+        if self.store is not None:
+            return len(self.store)
+        if self.reader is None:
+            return self.DUMMY_FRAMES
+        return self.reader.frame_count
+
+    def fps(self):
+        """Native frame rate reported by the container, or None if unknown."""
+        if self.store is not None:
+            return self.store.fps
+        if self.reader is None:
+            return None
+        return self.reader.fps
 
-    def stream_frames(self):
-        if self.cap is None:
+    def source_size(self):
+        """(width, height) of the decoded stream before resizing."""
+        if self.store is not None:
+            return self.store.size
+        if self.reader is None:
+            return self.resize_dim or self.DUMMY_SIZE
+        return self.reader.size
+
+    def output_size(self):
+        """(width, height) of the frames ``stream_frames`` yields."""
+        return self.resize_dim or self.source_size()
+
+    def timestamp(self):
+        """Presentation time in seconds of the last decoded frame, or None if unknown."""
+        return getattr(self.reader, "timestamp", None)
+
+    def fingerprint(self, sample_bytes=1 << 20):
+        """Content key for the decoded stream (file size + sampled bytes + resize).
+
+        Hashes the head, middle and tail of the file rather than all of it, so
+        fingerprinting a multi-gigabyte video stays cheap.
+        """
+        width, height = self.resize_dim or (0, 0)
+        digest = hashlib.sha1(f"{width}x{height}".encode())
+        if self.store is not None:
+            # The store's frames were already resized when it was built
+            digest.update(f"store:{self.store.fingerprint}".encode())
+            return digest.hexdigest()
+        if not os.path.exists(self.video_path):
+            digest.update(f"dummy:{self.DUMMY_FRAMES}".encode())
+            return digest.hexdigest()
+        size = os.path.getsize(self.video_path)
+        digest.update(str(size).encode())
+        offsets = {0, max(0, size // 2 - sample_bytes // 2), max(0, size - sample_bytes)}
+        with open(self.video_path, "rb") as handle:
+            for offset in sorted(offsets):
+                handle.seek(offset)
+                digest.update(handle.read(sample_bytes))
+        return digest.hexdigest()
+
+    def stream_frames(self, start=0, stop=None):
+        """Yield (frame, frame_idx, gt_mask) for frames in [start, stop)."""
+        if self.store is not None:
+            store = self.store
+            width, height = self.output_size()
+            resize = (width, height) != store.size
+            copies = self.writable or resize
+            buffers = self.buffers if copies else 0
+            ring = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(buffers)]
+            end = len(store) if stop is None else min(stop, len(store))
+            for i in range(start, end):
+                frame = store.frame(i)
+                out = ring[i % len(ring)] if ring else None
+                if resize:
+                    frame = cv2.resize(frame, (width, height), dst=out)
+                elif self.writable:
+                    frame = frame.copy() if out is None else _copy_into(out, frame)
+                yield frame, i, store.gt_mask(i)
+        elif self.reader is None:
+            width, height = self.resize_dim or self.DUMMY_SIZE
             # Generate dummy frames for demonstration
-            for i in range(100):
+            end = self.DUMMY_FRAMES if stop is None else min(stop, self.DUMMY_FRAMES)
+            for i in range(start, end):
                 # Create a moving circle to simulate an object
-                frame = np.zeros((self.resize_dim[1], self.resize_dim[0], 3), dtype=np.uint8)
+                frame = np.zeros((height, width, 3), dtype=np.uint8)
                 cx = 50 + i * 5
                 cy = 240
-                gt_mask = np.zeros((self.resize_dim[1], self.resize_dim[0]), dtype=np.uint8)
+                gt_mask = np.zeros((height, width), dtype=np.uint8)
                 # Simulate occlusion: Object disappears between frame 40 and 60
                 if not (40 < i < 60):
                     cv2.circle(frame, (cx, cy), 20, (0, 255, 0), -1)
                     cv2.circle(gt_mask, (cx, cy), 20, 255, -1)
                 yield frame, i, gt_mask
         else:
-            frame_idx = 0
-            while self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if not ret:
+            if start:
+                self.reader.seek(start)
+            width, height = self.output_size()
+            ring = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.buffers)]
+            frame_idx = start
+            while stop is None or frame_idx < stop:
+                out = ring[frame_idx % len(ring)] if ring else None
+                frame = self.reader.read(out, self.resize_dim)
+                if frame is None:
                     break
-                frame = cv2.resize(frame, self.resize_dim)
                 yield frame, frame_idx, None
                 frame_idx += 1
+
+
+def _copy_into(out, frame):
+    np.copyto(out, frame)
+    return out
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from typing import Iterable, List, Optional, TextIO
+
+import pipeline
+
+
+class WarmWorker:
+    """Runs pipeline jobs one after another in a single long-lived process.
+
+    Interpreter start-up, imports, and (with ``preload``) matplotlib and the
+    SAM 2 backend are paid once; every job then only builds its per-run
+    state. Jobs are JSON lines ``{"id": ..., "args": [...]}`` holding
+    ``pipeline.py`` arguments, answered with one JSON line carrying the
+    job's startup report and captured output. ``{"cmd": "ping"}`` and
+    ``{"cmd": "shutdown"}`` are also understood.
+    """
+
+    def __init__(self):
+        self.jobs = 0
+        self.started = time.perf_counter()
+
+    def preload(
+        self, plot: bool = False, sam2: bool = False, checkpoint=None, config=None, threads=None
+    ) -> None:
+        """Pay the optional heavy imports up front instead of in the first job."""
+        if plot:
+            import matplotlib
+
+            matplotlib.use("Agg")
+            import matplotlib.pyplot  # noqa: F401
+        if sam2:
+            from sam2_model import _load_backend
+
+            _load_backend(checkpoint, config, "cpu", threads)
+
+    def run_job(self, args: List[str]) -> dict:
+        log = io.StringIO()
+        started = time.perf_counter()
+        response = {"ok": True}
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                response["startup"] = pipeline.main(list(args))
+            except SystemExit as exc:  # argparse errors
+                response.update(ok=False, error=f"exit status {exc.code}")
+            except Exception:
+                response.update(ok=False, error=traceback.format_exc())
+        self.jobs += 1
+        response["seconds"] = time.perf_counter() - started
+        response["log"] = log.getvalue()
+        return response
+
+    def handle(self, line: str) -> Optional[dict]:
+        """Answer one request line; None means shut down."""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as exc:
+            return {"ok": False, "error": f"bad request: {exc}"}
+        if isinstance(request, list):
+            request = {"args": request}
+        command = request.get("cmd", "run")
+        if command == "shutdown":
+            return None
+        if command == "ping":
+            uptime = time.perf_counter() - self.started
+            response = {"ok": True, "jobs": self.jobs, "uptime": uptime}
+        elif command == "run":
+            response = self.run_job(request.get("args", []))
+        else:
+            response = {"ok": False, "error": f"unknown command {command!r}"}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def serve_lines(self, lines: Iterable[str], out: TextIO) -> None:
+        for line in lines:
+            if not line.strip():
+                continue
+            response = self.handle(line)
+            if response is None:
+                return
+            out.write(json.dumps(response) + "\n")
+            out.flush()
+
+    def serve_socket(self, host: str, port: int) -> None:
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    line = raw.decode("utf-8")
+                    if not line.strip():
+                        continue
+                    response = worker.handle(line)
+                    if response is None:
+                        # shutdown() waits for serve_forever, which is running this handler
+                        threading.Thread(target=self.server.shutdown).start()
+                        return
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+        # One job at a time: the pipeline keeps per-process state between runs
+        with socketserver.TCPServer((host, port), Handler) as server:
+            print(f"Warm worker listening on {host}:{server.server_address[1]}", flush=True)
+            server.serve_forever()
+
+
+def submit(args: List[str], port: int, host: str = "127.0.0.1") -> dict:
+    """Send one job to a socket worker and wait for its response."""
+    with socket.create_connection((host, port)) as conn:
+        conn.sendall((json.dumps({"args": args}) + "\n").encode("utf-8"))
+        with conn.makefile("r", encoding="utf-8") as reader:
+            return json.loads(reader.readline())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Long-lived pipeline worker: JSON-line jobs over stdin or a local socket"
+    )
+    parser.add_argument(
+        "--port", type=int, default=None, help="Serve on 127.0.0.1:PORT instead of stdin"
+    )
+    parser.add_argument(
+        "--submit",
+        nargs=argparse.REMAINDER,
+        default=None,
+        help="Client mode: send the remaining pipeline arguments to the worker on --port",
+    )
+    parser.add_argument(
+        "--preload",
+        nargs="*",
+        choices=["plot", "sam2"],
+        default=[],
+        help="Import matplotlib and/or load the SAM 2 backend before the first job",
+    )
+    parser.add_argument("--checkpoint", default=None, help="SAM 2 checkpoint for --preload sam2")
+    parser.add_argument("--model-config", default=None, help="SAM 2 config for --preload sam2")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads for --preload sam2")
+    args = parser.parse_args()
+
+    if args.submit is not None:
+        if args.port is None:
+            parser.error("--submit needs --port")
+        response = submit(args.submit, args.port)
+        sys.stdout.write(response.pop("log", ""))
+        print(json.dumps(response, indent=2))
+        sys.exit(0 if response.get("ok") else 1)
+
+    worker = WarmWorker()
+    worker.preload(
+        plot="plot" in args.preload,
+        sam2="sam2" in args.preload,
+        checkpoint=args.checkpoint,
+        config=args.model_config,
+        threads=args.threads,
+    )
+    if args.port is not None:
+        worker.serve_socket("127.0.0.1", args.port)
+    else:
+        worker.serve_lines(sys.stdin, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()